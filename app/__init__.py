@@ -3,7 +3,16 @@ from flask_pymongo import PyMongo
 from flask_cors import CORS
 import os
 import logging
+from importlib.util import find_spec
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
+from app.analytics import LedgerCache
+from app.assets import Assets
+from app.cache import ResponseCache
+from app.compression import Compression
+from app.passwords import PasswordHasher
+from app.indexes import ensure_indexes_in_background
+from app.monitoring import CommandMetrics, PoolMetrics, RequestTiming
+from app.serializers import JSONProvider
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,6 +20,38 @@ logger = logging.getLogger(__name__)
 
 # Initialize PyMongo without app
 mongo = PyMongo()
+# Per-user cache for the read-only API responses
+cache = ResponseCache()
+# Per-user numpy ledgers for /api/analytics/<metric>
+ledgers = LedgerCache()
+# Password hashing, run in a small process pool
+hasher = PasswordHasher()
+# Per-request timing and MongoDB time attribution
+request_timing = RequestTiming()
+# Fingerprinted static files, see `python -m app.assets`
+assets = Assets()
+# br/zstd/gzip compression of the app's responses
+compression = Compression()
+
+# Modules pymongo needs for each wire compressor (zlib is in the standard library)
+COMPRESSOR_MODULES = {'zstd': 'zstandard', 'snappy': 'snappy', 'zlib': 'zlib'}
+
+def available_compressors(names):
+    """Drop compressors whose optional package isn't installed"""
+    return ','.join(
+        name for name in (name.strip() for name in names.split(','))
+        if name in COMPRESSOR_MODULES and find_spec(COMPRESSOR_MODULES[name])
+    )
+
+def init_mongo(app):
+    """Create the MongoDB client from MONGO_CLIENT_OPTIONS.
+
+    Clients are not fork-safe, so a server that loads the app before forking
+    (gunicorn --preload) calls this again in every worker.
+    """
+    app.extensions['mongo_pool_metrics'].reset()
+    app.extensions['mongo_command_metrics'].reset()
+    mongo.init_app(app, **app.config['MONGO_CLIENT_OPTIONS'])
 
 def create_app(debug=True):
     # Initialize Flask app
@@ -18,26 +59,118 @@ def create_app(debug=True):
                 static_url_path='',
                 static_folder='static',
                 template_folder='templates')
+    # Compact JSON, with ObjectId and datetime support
+    app.json = JSONProvider(app)
     
-    # Enable debug mode and template auto-reload
+    # Debug mode and template auto-reload, development only
     app.config['DEBUG'] = debug
-    app.config['TEMPLATES_AUTO_RELOAD'] = True
+    app.config['TEMPLATES_AUTO_RELOAD'] = debug
     
     # Enable CORS
     CORS(app)
+    assets.init_app(app)
     
     # Configure MongoDB
     app.config["MONGO_URI"] = os.environ.get("MONGODB_URI", "mongodb://localhost:27017/student_finance")
+    # Connection pool per process: size it to the worker's thread count
+    app.config['MONGO_MAX_POOL_SIZE'] = int(os.environ.get("MONGO_MAX_POOL_SIZE", 20))
+    app.config['MONGO_MIN_POOL_SIZE'] = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+    app.config['MONGO_MAX_IDLE_TIME_MS'] = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+    # Fail fast instead of hanging a worker on an exhausted pool or a dead node
+    app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000))
+    app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+    app.config['MONGO_CONNECT_TIMEOUT_MS'] = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000))
+    app.config['MONGO_SOCKET_TIMEOUT_MS'] = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 30000))
+    # Wire compression, in order of preference; zstd needs zstandard (in requirements.txt),
+    # snappy needs python-snappy (optional)
+    app.config['MONGO_COMPRESSORS'] = os.environ.get("MONGO_COMPRESSORS", "zstd,zlib")
+    app.config['MONGO_READ_PREFERENCE'] = os.environ.get("MONGO_READ_PREFERENCE", "primary")
+    # Write concern, e.g. 1 or majority; unset keeps the server default
+    app.config['MONGO_WRITE_CONCERN'] = os.environ.get("MONGO_WRITE_CONCERN")
+    
+    # Page sizes for GET /api/transactions?limit=
+    app.config['TRANSACTIONS_PAGE_SIZE'] = int(os.environ.get("TRANSACTIONS_PAGE_SIZE", 50))
+    app.config['TRANSACTIONS_PAGE_MAX'] = int(os.environ.get("TRANSACTIONS_PAGE_MAX", 500))
+    # Cursor batch size (and rows per chunk) for streamed exports
+    app.config['EXPORT_BATCH_SIZE'] = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
+    # insert_many batch size and row cap for bulk imports
+    app.config['IMPORT_BATCH_SIZE'] = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+    app.config['IMPORT_MAX_ROWS'] = int(os.environ.get("IMPORT_MAX_ROWS", 100000))
+    # Categories drawn individually in the category chart; the rest are summed as "other"
+    app.config['CHART_TOP_CATEGORIES'] = int(os.environ.get("CHART_TOP_CATEGORIES", 6))
+    for key in ('TRANSACTIONS_PAGE_SIZE', 'TRANSACTIONS_PAGE_MAX', 'EXPORT_BATCH_SIZE',
+                'IMPORT_BATCH_SIZE', 'IMPORT_MAX_ROWS', 'CHART_TOP_CATEGORIES'):
+        if app.config[key] < 1:
+            raise ValueError(f"{key} must be a positive integer")
+    
+    # Response cache: memory (per process), redis (shared) or none
+    app.config['CACHE_BACKEND'] = os.environ.get("CACHE_BACKEND", "memory")
+    app.config['CACHE_TTL'] = int(os.environ.get("CACHE_TTL", 300))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+    app.config['CACHE_MAX_BYTES'] = int(os.environ.get("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+    app.config['CACHE_MAX_ITEM_BYTES'] = int(os.environ.get("CACHE_MAX_ITEM_BYTES", 1024 * 1024))
+    app.config['CACHE_REDIS_URL'] = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    cache.init_app(app)
+    
+    # Ledgers kept in memory per process for the numpy analytics, keyed by data version
+    app.config['ANALYTICS_CACHE_ENTRIES'] = int(os.environ.get("ANALYTICS_CACHE_ENTRIES", 256))
+    app.config['ANALYTICS_CACHE_BYTES'] = int(os.environ.get("ANALYTICS_CACHE_BYTES", 64 * 1024 * 1024))
+    ledgers.init_app(app)
+    
+    # Password hashing: Werkzeug method string, e.g. pbkdf2:sha256:600000 or scrypt:32768:8:1
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256:600000")
+    app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get("PASSWORD_SALT_LENGTH", 16))
+    # Processes verifying hashes (0 = on the request thread), and how many may wait
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get("PASSWORD_HASH_QUEUE", 64))
+    app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+    hasher.init_app(app)
     
     # Set secret key for session
     app.secret_key = os.environ.get("SECRET_KEY", "your-secret-key-here")
     
+    # Commands at or over this many ms, and requests over SLOW_REQUEST_MS, are logged
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get("SLOW_QUERY_MS", 100))
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+    request_timing.init_app(app)
+    
+    # Response encodings in order of preference (br and zstd need their packages installed),
+    # and the smallest body worth compressing
+    app.config['COMPRESS_ALGORITHMS'] = os.environ.get("COMPRESS_ALGORITHMS", "br,zstd,gzip")
+    app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+    # Registered after the timing hooks so that compression time is counted as well
+    compression.init_app(app)
+
+    pool_metrics = PoolMetrics()
+    command_metrics = CommandMetrics(app.config['SLOW_QUERY_MS'])
+    app.extensions['mongo_pool_metrics'] = pool_metrics
+    app.extensions['mongo_command_metrics'] = command_metrics
+    client_options = {
+        'maxPoolSize': app.config['MONGO_MAX_POOL_SIZE'],
+        'minPoolSize': app.config['MONGO_MIN_POOL_SIZE'],
+        'maxIdleTimeMS': app.config['MONGO_MAX_IDLE_TIME_MS'],
+        'waitQueueTimeoutMS': app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+        'serverSelectionTimeoutMS': app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+        'connectTimeoutMS': app.config['MONGO_CONNECT_TIMEOUT_MS'],
+        'socketTimeoutMS': app.config['MONGO_SOCKET_TIMEOUT_MS'],
+        'readPreference': app.config['MONGO_READ_PREFERENCE'],
+        'event_listeners': [pool_metrics, command_metrics],
+    }
+    compressors = available_compressors(app.config['MONGO_COMPRESSORS'])
+    if compressors:
+        client_options['compressors'] = compressors
+    if app.config['MONGO_WRITE_CONCERN']:
+        w = app.config['MONGO_WRITE_CONCERN']
+        client_options['w'] = int(w) if w.isdigit() else w
+    app.config['MONGO_CLIENT_OPTIONS'] = client_options
+    
     try:
         # Initialize mongo with app
-        mongo.init_app(app)
+        init_mongo(app)
         # Test the connection
         mongo.db.command('ping')
         logger.info(f"Successfully connected to MongoDB at {app.config['MONGO_URI']}")
+        app.extensions['index_bootstrap'] = ensure_indexes_in_background(mongo.db)
     except (ConnectionFailure, ServerSelectionTimeoutError) as e:
         logger.error(f"Failed to connect to MongoDB: {str(e)}")
         # Don't raise the error in development mode
@@ -52,5 +185,9 @@ def create_app(debug=True):
     from app.routes import main_bp
     app.register_blueprint(main_bp)
     
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
     return app
 
@@ -0,0 +1,299 @@
+"""Metrics computed in process over a user's whole ledger with numpy.
+
+The monthly and category analytics are MongoDB pipelines (see
+TransactionRollup). Metrics that need every transaction in order (rolling
+windows, percentiles, rates) are computed here instead:
+
+- a user's ledger is read once, with one indexed query returning four
+  fields per transaction, into parallel numpy arrays ordered by time
+- ledgers are kept in an in-process LRU keyed by the user's data version
+  (see app/cache.py), so any later metric or filter combination is answered
+  from memory until the user's transactions change
+- filters become boolean masks over those arrays, and every metric is a
+  handful of vectorized operations over the masked arrays
+
+GET /api/analytics/<metric> serves every function in METRICS. Dates are
+UTC days, like the stored timestamps. Without a response cache backend
+(CACHE_BACKEND=none) there is no data version to key on, and ledgers are
+read on every request.
+
+benchmarks/analytics_bench.py compares these metrics with equivalent
+aggregation pipelines.
+"""
+from datetime import date, datetime, timedelta, timezone
+import inspect
+import logging
+
+import numpy as np
+from flask import current_app, has_app_context
+
+from app.cache import MemoryBackend
+
+logger = logging.getLogger(__name__)
+
+MS_PER_DAY = 86400000
+EPOCH = date(1970, 1, 1)
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+# Most daily points one series may return
+MAX_POINTS = 400
+DEFAULT_PERCENTILES = (50, 75, 90, 95, 99)
+
+LEDGER_PROJECT_STAGE = {'$project': {
+    '_id': 0,
+    # Milliseconds since the epoch; legacy string dates are parsed, unreadable ones become null
+    'time': {'$toLong': {'$convert': {'input': '$date', 'to': 'date', 'onError': None, 'onNull': None}}},
+    'amount': 1,
+    'type': 1,
+    'category': 1,
+}}
+
+
+def ledger_pipeline(user_id):
+    """Every transaction of a user, reduced to what the metrics read (unsorted; numpy sorts)"""
+    return [{'$match': {'user_id': user_id}}, LEDGER_PROJECT_STAGE]
+
+
+def to_ms(value):
+    """A datetime as milliseconds since the epoch; naive ones are UTC, as stored"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1000)
+
+
+def last_day(filters, default):
+    """The last day a query covers: the day before an exclusive `to`, else default"""
+    if (filters or {}).get('date_to'):
+        return (to_ms(filters['date_to']) - 1) // MS_PER_DAY
+    return default
+
+
+def day_label(day):
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+class Ledger:
+    """A user's transactions as parallel arrays, oldest first.
+
+    times are ms since the epoch, amounts are signed (expenses negative),
+    income is a boolean mask and categories index category_names.
+    """
+
+    def __init__(self, times, amounts, income, categories, category_names):
+        self.times = times
+        self.amounts = amounts
+        self.income = income
+        self.categories = categories
+        self.category_names = category_names
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = [row for row in rows if row.get('time') is not None]
+        codes = {}
+        count = len(rows)
+        times = np.fromiter((row['time'] for row in rows), np.int64, count)
+        amounts = np.fromiter((row.get('amount') or 0.0 for row in rows), np.float64, count)
+        income = np.fromiter((row.get('type') == 'income' for row in rows), np.bool_, count)
+        # setdefault hands out codes in order of first appearance
+        categories = np.fromiter((codes.setdefault(row.get('category'), len(codes)) for row in rows), np.int32, count)
+        order = np.argsort(times, kind='stable')
+        return cls(times[order], amounts[order], income[order], categories[order], list(codes))
+
+    @property
+    def nbytes(self):
+        """Memory held by the arrays, for the cache's byte limit"""
+        return self.times.nbytes + self.amounts.nbytes + self.income.nbytes + self.categories.nbytes
+
+    @property
+    def days(self):
+        return self.times // MS_PER_DAY
+
+    def __len__(self):
+        return len(self.times)
+
+    def select(self, filters=None):
+        """The transactions matching API filters (see Transaction.build_query), as a new Ledger"""
+        filters = filters or {}
+        mask = np.ones(len(self), np.bool_)
+        if filters.get('date_from'):
+            mask &= self.times >= to_ms(filters['date_from'])
+        if filters.get('date_to'):
+            mask &= self.times < to_ms(filters['date_to'])
+        if filters.get('categories'):
+            codes = [i for i, name in enumerate(self.category_names) if name in filters['categories']]
+            mask &= np.isin(self.categories, codes)
+        if filters.get('type'):
+            mask &= self.income if filters['type'] == 'income' else ~self.income
+        magnitudes = np.abs(self.amounts)
+        if filters.get('min_amount') is not None:
+            mask &= magnitudes >= filters['min_amount']
+        if filters.get('max_amount') is not None:
+            mask &= magnitudes <= filters['max_amount']
+        return Ledger(self.times[mask], self.amounts[mask], self.income[mask], self.categories[mask],
+                      self.category_names)
+
+    def spending(self):
+        """(days, amounts) of the expenses, amounts as positive numbers"""
+        expense = ~self.income
+        return self.days[expense], -self.amounts[expense]
+
+
+def daily_totals(days, amounts, first, last):
+    """Sum of amounts for every day from first to last inclusive, zero-filled"""
+    inside = (days >= first) & (days <= last)
+    return np.bincount(days[inside] - first, weights=amounts[inside], minlength=last - first + 1)
+
+
+def rolling_average(ledger, window=30, filters=None):
+    """Daily spending and its trailing `window`-day average, through `to` or the last expense.
+
+    At most the last MAX_POINTS days are returned; selected days before
+    those still count towards their averages.
+    """
+    days, amounts = ledger.spending()
+    if not len(days):
+        return {"window": window, "points": []}
+    last = last_day(filters, int(days[-1]))
+    first = max(int(days[0]), last - MAX_POINTS + 1)
+    totals = daily_totals(days, amounts, first - window + 1, last)
+    # Window sums as differences of a running total, one per returned day
+    running = np.concatenate(([0.0], np.cumsum(totals)))
+    averages = (running[window:] - running[:-window]) / window
+    totals = totals[window - 1:]
+    return {
+        "window": window,
+        "points": [
+            {"date": day_label(first + i), "total": round(float(total), 2), "average": round(float(average), 2)}
+            for i, (total, average) in enumerate(zip(totals, averages))
+        ]
+    }
+
+
+def percentiles(ledger, p=DEFAULT_PERCENTILES, filters=None):
+    """Percentiles of expense sizes, overall and per category"""
+    _, amounts = ledger.spending()
+    categories = ledger.categories[~ledger.income]
+
+    def summary(values):
+        if not len(values):
+            return {"count": 0, "percentiles": {}}
+        return {
+            "count": int(len(values)),
+            "percentiles": {f"{q:g}": round(float(v), 2) for q, v in zip(p, np.percentile(values, p))}
+        }
+
+    # One group per category: sort by code, split where the code changes
+    order = np.argsort(categories, kind='stable')
+    codes = categories[order]
+    starts = np.flatnonzero(np.diff(codes, prepend=-1))
+    groups = np.split(amounts[order], starts[1:])
+    return {
+        "overall": summary(amounts),
+        "categories": {
+            ledger.category_names[codes[start]]: summary(group) for start, group in zip(starts, groups)
+        }
+    }
+
+
+def velocity(ledger, window=30, filters=None):
+    """Average daily spending over the last `window` days against the `window` days before.
+
+    The period ends with `to` when given, today otherwise.
+    """
+    days, amounts = ledger.spending()
+    last = last_day(filters, to_ms(datetime.utcnow()) // MS_PER_DAY)
+    current = (days > last - window) & (days <= last)
+    previous = (days > last - 2 * window) & (days <= last - window)
+    current_rate = float(amounts[current].sum()) / window
+    previous_rate = float(amounts[previous].sum()) / window
+    categories = ledger.categories[~ledger.income][current]
+    rates = np.bincount(categories, weights=amounts[current], minlength=len(ledger.category_names)) / window
+    return {
+        "window": window,
+        "through": day_label(last),
+        "current": round(current_rate, 2),
+        "previous": round(previous_rate, 2),
+        "change": round(current_rate / previous_rate - 1, 4) if previous_rate else None,
+        "categories": {
+            ledger.category_names[code]: round(float(rates[code]), 2)
+            for code in np.flatnonzero(rates)
+        }
+    }
+
+
+def weekday(ledger, filters=None):
+    """Spending by day of the week: totals, and the average per calendar day of that weekday"""
+    days, amounts = ledger.spending()
+    if not len(days):
+        return [{"weekday": name, "total": 0.0, "average": 0.0, "count": 0} for name in WEEKDAYS]
+    # 1970-01-01 was a Thursday
+    weekdays = (days + 3) % 7
+    totals = np.bincount(weekdays, weights=amounts, minlength=7)
+    counts = np.bincount(weekdays, minlength=7)
+    # How many of each weekday the spending history spans
+    span = np.arange(int(days[0]), int(days[-1]) + 1)
+    occurrences = np.bincount((span + 3) % 7, minlength=7)
+    return [
+        {
+            "weekday": name,
+            "total": round(float(totals[i]), 2),
+            "average": round(float(totals[i] / occurrences[i]), 2) if occurrences[i] else 0.0,
+            "count": int(counts[i]),
+        }
+        for i, name in enumerate(WEEKDAYS)
+    ]
+
+
+# /api/analytics/<metric>: function(ledger, filters=None, **params)
+METRICS = {
+    "rolling_average": rolling_average,
+    "percentiles": percentiles,
+    "velocity": velocity,
+    "weekday": weekday,
+}
+
+
+class LedgerCache:
+    """Per-process LRU of loaded ledgers, keyed by user and data version"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ANALYTICS_CACHE_ENTRIES', 256)
+        app.config.setdefault('ANALYTICS_CACHE_BYTES', 64 * 1024 * 1024)
+        app.extensions['analytics_ledgers'] = MemoryBackend(
+            app.config['ANALYTICS_CACHE_ENTRIES'], app.config['ANALYTICS_CACHE_BYTES']
+        )
+
+    @staticmethod
+    def load(user_id):
+        """The user's ledger, from memory when their data hasn't changed since it was read"""
+        from app import cache
+        from app.models import Transaction
+
+        backend = current_app.extensions.get('analytics_ledgers') if has_app_context() else None
+        key = None
+        if backend is not None and cache.backend is not None:
+            try:
+                key = f"{user_id}:{cache.data_version(user_id)}"
+            except Exception as e:
+                logger.error(f"Cache unavailable, reading ledger: {str(e)}")
+        ledger = backend.get(key) if key else None
+        if ledger is None:
+            ledger = Ledger.from_rows(Transaction.aggregate(ledger_pipeline(user_id)))
+            if key:
+                backend.set(key, ledger, current_app.config['CACHE_TTL'])
+        return ledger
+
+
+def compute(metric, user_id, filters=None, **params):
+    """Run a METRICS function over the user's ledger, narrowed by API filters.
+
+    Parameters the metric doesn't take (e.g. window for percentiles) are ignored.
+    """
+    function = METRICS[metric]
+    accepted = inspect.signature(function).parameters
+    params = {name: value for name, value in params.items() if name in accepted}
+    ledger = LedgerCache.load(user_id).select(filters)
+    return function(ledger, filters=filters, **params)
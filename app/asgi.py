@@ -0,0 +1,218 @@
+"""ASGI entry point serving the read-heavy API endpoints on Motor.
+
+The dashboard's reads (GET /api/dashboard, /api/transactions,
+/api/charts/*, /api/analytics/monthly, /api/analytics/categories,
+/api/analytics/balance and /api/health) are served here by coroutines
+running on an async MongoDB driver, so a request waiting on MongoDB costs a
+suspended coroutine rather than a pinned worker thread and one process can
+hold thousands of them open. Everything else (pages, login, writes, export,
+import) falls through to the regular Flask app, mounted underneath and run in
+a thread pool, so the async process is a drop-in replacement for the WSGI one:
+
+    uvicorn --factory app.asgi:create_asgi_app --host 0.0.0.0 --port 5000 --workers 4
+
+Queries, filters, cursors and response shapes are the ones app.models and
+app.routes use; only the driver differs. Sessions are the Flask session
+cookie, verified with the Flask app's secret key. Responses are not cached:
+the per-user response cache and ETags stay with the Flask endpoints.
+"""
+from contextlib import asynccontextmanager
+import asyncio
+import logging
+
+from a2wsgi import WSGIMiddleware
+from bson import ObjectId
+from bson.errors import InvalidId
+from itsdangerous import BadSignature
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse, RedirectResponse, Response
+from starlette.routing import Mount, Route
+
+from app import create_app
+from app.models import Transaction, TransactionRollup
+from app import charts, columnar
+from app.routes import (CHARTS, parse_bucket_args, parse_chart_top, parse_columnar_format, parse_page_args,
+                        parse_transaction_filters)
+from app.serializers import encode, transaction_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """Encoded like the Flask app's responses (app/serializers.py)"""
+
+    def render(self, content):
+        return encode(content)
+
+
+def create_asgi_app(flask_app=None):
+    flask_app = flask_app or create_app(debug=False)
+    options = dict(flask_app.config['MONGO_CLIENT_OPTIONS'])
+    client = AsyncIOMotorClient(flask_app.config['MONGO_URI'], **options)
+    db = client.get_default_database()
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+    max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    def session_user(request):
+        """The logged-in user's ObjectId from the Flask session cookie, or None"""
+        cookie = request.cookies.get(cookie_name)
+        if not cookie:
+            return None
+        try:
+            user_id = serializer.loads(cookie, max_age=max_age).get('user_id')
+            return ObjectId(user_id) if user_id else None
+        except (BadSignature, InvalidId, TypeError):
+            return None
+
+    def login_required(endpoint):
+        async def decorated(request):
+            user_id = session_user(request)
+            if user_id is None:
+                return RedirectResponse('/login', status_code=302)
+            return await endpoint(request, user_id)
+        return decorated
+
+    async def health_check(request):
+        try:
+            await db.command('ping')
+            database = "connected"
+        except Exception as e:
+            logger.error(f"Health check failed: {str(e)}")
+            database = "disconnected"
+        return JSONResponse({"status": "healthy", "database": database})
+
+    @login_required
+    async def list_transactions(request, user_id):
+        args = request.query_params
+        paged = 'limit' in args or 'after' in args
+        try:
+            if paged:
+                limit, after = parse_page_args(args, flask_app.config)
+            filters = parse_transaction_filters(args)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        try:
+            if not paged:
+                columnar_format = parse_columnar_format(request.headers.get('accept'))
+                if columnar_format:
+                    pipeline = columnar.columnar_pipeline(Transaction.build_query(user_id, filters))
+                    columns = columnar.to_columns(await db.transactions.aggregate(pipeline).to_list(None))
+                    return Response(columnar.ENCODERS[columnar_format](columns), media_type=columnar_format,
+                                    headers={'Vary': 'Accept'})
+                pipeline = transaction_pipeline(Transaction.build_query(user_id, filters))
+                return JSONResponse(await db.transactions.aggregate(pipeline).to_list(None), headers={'Vary': 'Accept'})
+            transactions, next_cursor = await run_page(user_id, limit, after, filters)
+            return JSONResponse({'transactions': transactions, 'next_cursor': next_cursor})
+        except Exception as e:
+            logger.error(f"Error fetching transactions: {str(e)}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    async def run_chart(chart, user_id, filters, top):
+        collection, pipeline = TransactionRollup.chart_pipeline(chart, user_id, filters, top)
+        return charts.shape(chart, await db[collection].aggregate(pipeline).to_list(None), filters, top)
+
+    async def run_page(user_id, limit, after, filters):
+        pipeline = transaction_pipeline(Transaction.page_query(user_id, after, filters), limit + 1)
+        return Transaction.split_page(await db.transactions.aggregate(pipeline).to_list(None), limit)
+
+    def analytics(metric):
+        @login_required
+        async def endpoint(request, user_id):
+            args = request.query_params
+            try:
+                bucket, tz = parse_bucket_args(args) if metric == 'monthly' else ('month', 'UTC')
+                filters = parse_transaction_filters(args, tz)
+                collection, pipeline = TransactionRollup.analytics_pipeline(metric, user_id, filters, bucket, tz)
+            except ValueError as e:
+                return JSONResponse({'error': str(e)}, status_code=400)
+            try:
+                return JSONResponse(await db[collection].aggregate(pipeline).to_list(None))
+            except Exception as e:
+                return JSONResponse({'error': str(e)}, status_code=500)
+        return endpoint
+
+    @login_required
+    async def balance(request, user_id):
+        try:
+            bucket, tz = parse_bucket_args(request.query_params, default='day')
+            filters = parse_transaction_filters(request.query_params, tz)
+            pipeline = Transaction.balance_pipeline(user_id, filters, bucket, tz)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        try:
+            return JSONResponse(Transaction.balance_rows(await db.transactions.aggregate(pipeline).to_list(None), bucket))
+        except Exception as e:
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @login_required
+    async def chart(request, user_id):
+        name = request.path_params['chart']
+        if name not in CHARTS:
+            return JSONResponse({'error': f'Unknown chart: {name}'}, status_code=404)
+        try:
+            top = parse_chart_top(request.query_params, flask_app.config)
+            filters = parse_transaction_filters(request.query_params)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        try:
+            return JSONResponse(await run_chart(name, user_id, filters, top))
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        except Exception as e:
+            return JSONResponse({'error': str(e)}, status_code=500)
+
+    @login_required
+    async def dashboard(request, user_id):
+        try:
+            limit, _ = parse_page_args(request.query_params, flask_app.config)
+            top = parse_chart_top(request.query_params, flask_app.config)
+            filters = parse_transaction_filters(request.query_params)
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        try:
+            # Read before the data, as Dashboard.load does, so no change is missed
+            user = await db.users.find_one({'_id': user_id}, {'sync_version': 1})
+            (transactions, next_cursor), monthly, categories = await asyncio.gather(
+                run_page(user_id, limit, None, filters),
+                run_chart('monthly', user_id, filters, top),
+                run_chart('categories', user_id, filters, top),
+            )
+        except ValueError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+        except Exception as e:
+            logger.error(f"Error loading dashboard: {str(e)}")
+            return JSONResponse({'error': str(e)}, status_code=500)
+        return JSONResponse({
+            'transactions': transactions,
+            'next_cursor': next_cursor,
+            'charts': {'monthly': monthly, 'categories': categories},
+            'version': (user or {}).get('sync_version', 0),
+        })
+
+    @asynccontextmanager
+    async def lifespan(app):
+        yield
+        client.close()
+
+    return Starlette(
+        routes=[
+            Route('/api/health', health_check),
+            Route('/api/dashboard', dashboard),
+            Route('/api/charts/{chart}', chart),
+            Route('/api/transactions', list_transactions, methods=['GET']),
+            Route('/api/analytics/monthly', analytics('monthly')),
+            Route('/api/analytics/categories', analytics('categories')),
+            Route('/api/analytics/balance', balance),
+            # Pages, auth and writes: the Flask app, run in a thread pool
+            Mount('/', WSGIMiddleware(flask_app)),
+        ],
+        # gzip only, for the routes above; Flask compresses its own responses
+        # and the middleware leaves anything already encoded alone
+        middleware=[Middleware(GZipMiddleware, minimum_size=flask_app.config['COMPRESS_MIN_BYTES'])],
+        lifespan=lifespan,
+    )
+
@@ -0,0 +1,160 @@
+"""Fingerprinted, pre-compressed static assets.
+
+`python -m app.assets` is the build step, run when the Docker image is built:
+
+- downloads the pinned third-party bundles in VENDOR into static/vendor
+  (their upstream minified builds, source map comments dropped)
+- copies every file under static/css, static/js and static/vendor to
+  static/dist/<name>.<content hash>.<ext>, next to .gz and, when the brotli
+  package is installed, .br variants compressed once at their highest level
+- writes static/dist/manifest.json mapping each name to its copy
+
+Templates link assets with asset_url('css/style.css'). With a manifest
+(and debug off) that is /assets/css/style.<hash>.css, served with an
+immutable one-year Cache-Control, so a repeat page load makes no request
+for it at all; a changed file gets a new name. Responses pick the .br or
+.gz variant the client accepts and keep ETag/Range handling from send_file.
+Without a build (development), asset_url points at the plain static file,
+revalidated by ETag on every load, or at the CDN for a vendored bundle that
+was never downloaded.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import urllib.request
+
+from flask import abort, current_app, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional: .br variants are skipped without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Third-party bundles, pinned to exact versions
+VENDOR = {
+    "vendor/bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css",
+    "vendor/bootstrap.bundle.min.js": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js",
+    "vendor/chart.umd.js": "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.js",
+}
+SOURCE_DIRS = ("css", "js", "vendor")
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".json", ".svg", ".map")
+# Fingerprinted names never change content, so caches may keep them for a year
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Maps are not vendored; drop the comments that would make devtools fetch them
+SOURCE_MAP_COMMENT = re.compile(rb"\n?(/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S*)\s*$")
+
+
+def _write(path, body):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "wb") as f:
+        f.write(body)
+    os.replace(path + ".tmp", path)
+
+
+def fetch_vendor(static_dir):
+    """Download any VENDOR bundle not already in static/vendor"""
+    for name, url in VENDOR.items():
+        target = os.path.join(static_dir, name)
+        if os.path.exists(target):
+            continue
+        logger.info(f"Vendoring {url}")
+        with urllib.request.urlopen(url, timeout=30) as response:
+            _write(target, SOURCE_MAP_COMMENT.sub(b"", response.read()))
+
+
+def build(static_dir, fetch=True):
+    """Fingerprint and pre-compress the static assets; returns the manifest"""
+    if fetch:
+        fetch_vendor(static_dir)
+    dist = os.path.join(static_dir, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    for directory in SOURCE_DIRS:
+        for root, _, files in sorted(os.walk(os.path.join(static_dir, directory))):
+            for file in sorted(files):
+                source = os.path.join(root, file)
+                name = os.path.relpath(source, static_dir).replace(os.sep, "/")
+                with open(source, "rb") as f:
+                    body = f.read()
+                stem, ext = os.path.splitext(name)
+                fingerprinted = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+                target = os.path.join(dist, fingerprinted)
+                _write(target, body)
+                if ext in COMPRESSIBLE:
+                    # mtime=0 keeps the .gz byte-identical across builds
+                    _write(target + ".gz", gzip.compress(body, 9, mtime=0))
+                    if brotli:
+                        _write(target + ".br", brotli.compress(body, quality=11))
+                manifest[name] = fingerprinted
+    _write(os.path.join(dist, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def load_manifest(static_dir):
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+class Assets:
+    """Resolves asset_url() in templates against the build manifest"""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+        app.add_template_global(asset_url)
+
+
+def asset_url(name):
+    """URL of a static asset by its path under static/, e.g. 'js/app.js'"""
+    fingerprinted = current_app.extensions['asset_manifest'].get(name)
+    # Debug serves files as they are edited, not as they were last built
+    if fingerprinted and not current_app.debug:
+        return url_for('main.serve_asset', filename=fingerprinted)
+    if name in VENDOR and not os.path.isfile(os.path.join(current_app.static_folder, name)):
+        return VENDOR[name]
+    return url_for('static', filename=name)
+
+
+def send_asset(filename):
+    """Serve a fingerprinted file from static/dist in the best encoding the client accepts"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    path = safe_join(dist, filename)
+    if path is None or filename == MANIFEST or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if request.accept_encodings[candidate] and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+    # conditional=True answers If-None-Match with 304 and Range with 206
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=31536000)
+    response.headers["Cache-Control"] = IMMUTABLE
+    response.vary.add("Accept-Encoding")
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    static = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "static")
+    built = build(static)
+    print(f"Built {len(built)} assets into {os.path.join(static, DIST_DIR)}")
@@ -0,0 +1,205 @@
+"""Per-user response cache for the read-only JSON endpoints.
+
+Cached responses are keyed by user, request path/query and that user's data
+version. The version is an opaque token stored in the cache backend itself and
+replaced whenever the user's transactions change, so stale entries simply stop
+being addressed and age out of the LRU. The same token feeds the ETag, which
+lets a client revalidate with If-None-Match and get a 304 without MongoDB being
+touched at all.
+
+Version tokens expire after CACHE_TTL like the responses themselves, so data
+changed behind the app's back (a `flask` command, a direct import) is served
+stale for at most that long. Commands that rewrite data call bump() or
+bump_all() as well, which takes effect immediately on a shared backend.
+
+The in-process backend is per worker; deployments running several workers
+should point CACHE_BACKEND at a shared store (redis) so a write on one worker
+invalidates the others. It is bounded by total bytes as well as entry count,
+and bodies over CACHE_MAX_ITEM_BYTES are never stored (their ETag still
+works), so one heavy user's full history cannot crowd out everyone else.
+"""
+from collections import OrderedDict
+from functools import wraps
+from hashlib import sha1
+from threading import Lock
+import logging
+import time
+import uuid
+
+from flask import current_app, has_app_context, make_response, request, session
+
+logger = logging.getLogger(__name__)
+
+
+def _size(value):
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    # Objects holding arrays (see app/analytics.py) report their own size
+    return getattr(value, 'nbytes', 0)
+
+
+class MemoryBackend:
+    """Thread-safe LRU cache with per-entry TTL, bounded by count and bytes"""
+
+    def __init__(self, max_entries=1024, max_bytes=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, expires_at)
+            self._bytes += _size(value)
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= _size(entry[0])
+
+
+class RedisBackend:
+    """Shared backend on top of a redis-py compatible client"""
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def from_url(cls, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package") from e
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, value, ex=ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+
+class ResponseCache:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_TTL', 300)
+        app.config.setdefault('CACHE_MAX_ENTRIES', 1024)
+        app.config.setdefault('CACHE_MAX_BYTES', 64 * 1024 * 1024)
+        app.config.setdefault('CACHE_MAX_ITEM_BYTES', 1024 * 1024)
+        app.config.setdefault('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+        backend = app.config['CACHE_BACKEND']
+        if backend == 'memory':
+            app.extensions['response_cache'] = MemoryBackend(app.config['CACHE_MAX_ENTRIES'], app.config['CACHE_MAX_BYTES'])
+        elif backend == 'redis':
+            app.extensions['response_cache'] = RedisBackend.from_url(app.config['CACHE_REDIS_URL'])
+        elif backend == 'none':
+            app.extensions['response_cache'] = None
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+    @property
+    def backend(self):
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('response_cache')
+
+    def _token(self, key):
+        """Read a version token, creating one that expires after CACHE_TTL"""
+        token = self.backend.get(key)
+        if token is None:
+            token = uuid.uuid4().hex
+            self.backend.set(key, token, current_app.config['CACHE_TTL'])
+        return token.decode() if isinstance(token, bytes) else token
+
+    def data_version(self, user_id):
+        """Current version token for a user's data, created on first use"""
+        return f"{self._token('version:*')}.{self._token(f'version:{user_id}')}"
+
+    def _replace(self, key):
+        backend = self.backend
+        if backend is None:
+            return
+        try:
+            backend.set(key, uuid.uuid4().hex, current_app.config['CACHE_TTL'])
+        except Exception as e:
+            # The write itself succeeded; stale entries still expire after CACHE_TTL
+            logger.error(f"Error bumping cache version {key}: {str(e)}")
+
+    def bump(self, user_id):
+        """Invalidate everything cached for a user; no-op outside an app"""
+        self._replace(f"version:{user_id}")
+
+    def bump_all(self):
+        """Invalidate everything cached for every user; no-op outside an app"""
+        self._replace("version:*")
+
+    def cached(self, view):
+        """Cache a GET view's JSON response per user and data version"""
+        @wraps(view)
+        def decorated_function(*args, **kwargs):
+            backend = self.backend
+            if request.method != 'GET' or backend is None:
+                return view(*args, **kwargs)
+
+            user_id = session['user_id']
+            try:
+                version = self.data_version(user_id)
+            except Exception as e:
+                logger.error(f"Cache unavailable: {str(e)}")
+                return view(*args, **kwargs)
+
+            # Views may pick a representation by Accept (see /api/transactions)
+            key = f"response:{user_id}:{version}:{request.full_path}:{request.headers.get('Accept', '')}"
+            etag = sha1(key.encode()).hexdigest()[:20]
+            # Weak comparison: compressed responses carry the tag as W/ (app/compression.py)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                cached = backend.get(key)
+                if cached is not None:
+                    # Stored as b"<content type>\n<body>"
+                    content_type, _, body = cached.partition(b"\n")
+                    response = current_app.response_class(body, content_type=content_type.decode())
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    if len(body) <= current_app.config['CACHE_MAX_ITEM_BYTES']:
+                        cached = response.content_type.encode() + b"\n" + body
+                        backend.set(key, cached, current_app.config['CACHE_TTL'])
+            response.set_etag(etag)
+            response.vary.add('Accept')
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
@@ -0,0 +1,81 @@
+"""Chart-ready series shaped from the analytics aggregations.
+
+The dashboard draws these as they are, so a chart costs a few hundred bytes
+however long the ledger is:
+
+- monthly: one "YYYY-MM" label per month from the first to the last, gaps
+  filled with zeros (and stretched to the from/to filter when one is given),
+  with income and expense as separate positive series.
+- categories: the top N categories of one type by total, with the rest
+  summed into an "other" bucket.
+
+The pipelines producing the rows are TransactionRollup.chart_pipeline.
+"""
+from datetime import timedelta
+
+# Past this many months the gaps are left unfilled rather than padding
+# the response with zeros
+MAX_FILLED_MONTHS = 600
+
+
+def month_label(year, month):
+    return f"{year:04d}-{month:02d}"
+
+
+def month_range(start, end):
+    """Every (year, month) from start to end inclusive"""
+    year, month = start
+    while (year, month) <= end:
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def monthly_series(rows, filters=None):
+    """Shape monthly [{_id: {period, type}, total}] rows into {labels, income, expense}"""
+    totals = {}
+    for row in rows:
+        period = row["_id"]["period"]
+        key = (int(period[:4]), int(period[5:7]))
+        month = totals.setdefault(key, {"income": 0.0, "expense": 0.0})
+        if row["_id"]["type"] in month:
+            month[row["_id"]["type"]] += abs(row["total"])
+
+    months = set(totals)
+    filters = filters or {}
+    if filters.get("date_from"):
+        months.add((filters["date_from"].year, filters["date_from"].month))
+    if filters.get("date_to"):
+        # date_to is exclusive
+        last = filters["date_to"] - timedelta(microseconds=1)
+        months.add((last.year, last.month))
+    if not months:
+        return {"labels": [], "income": [], "expense": []}
+
+    first, last = min(months), max(months)
+    span = (last[0] - first[0]) * 12 + last[1] - first[1] + 1
+    keys = list(month_range(first, last)) if span <= MAX_FILLED_MONTHS else sorted(totals)
+    empty = {"income": 0.0, "expense": 0.0}
+    return {
+        "labels": [month_label(*key) for key in keys],
+        "income": [round(totals.get(key, empty)["income"], 2) for key in keys],
+        "expense": [round(totals.get(key, empty)["expense"], 2) for key in keys],
+    }
+
+
+def category_series(rows, top):
+    """Shape the $facet {top, other} result into {labels, values, other, other_count, top}"""
+    facet = rows[0] if rows else {"top": [], "other": []}
+    other = facet["other"][0] if facet["other"] else {"total": 0.0, "count": 0}
+    return {
+        "labels": [row["_id"] for row in facet["top"]],
+        "values": [round(row["total"], 2) for row in facet["top"]],
+        "other": round(other["total"], 2),
+        "other_count": other["count"],
+        "top": top,
+    }
+
+
+def shape(chart, rows, filters=None, top=None):
+    if chart == "monthly":
+        return monthly_series(rows, filters)
+    return category_series(rows, top)
@@ -0,0 +1,112 @@
+"""Columnar encodings of a user's transactions, for clients charting them.
+
+GET /api/transactions normally returns one JSON object per row. A client
+sending one of the Accept types below gets the same rows, newest first,
+reduced to the four fields charts need and laid out as parallel arrays:
+
+    {"count": 3,
+     "columns": {"date": [19783, 19781, 19772],       # days since 1970-01-01 (UTC)
+                 "amount": [-12.5, 1200.0, -40.0],
+                 "type": [0, 1, 0],                    # indexes into dictionaries.type
+                 "category": [0, 1, 2]},
+     "dictionaries": {"type": ["expense", "income"],
+                      "category": ["Food", "Salary", "Books"]}}
+
+Keys and category strings are sent once instead of once per row, and a
+date is a small integer rather than a 19 character string, so a long
+history shrinks to a fraction of its row form and parses without building
+an object per row.
+
+- application/vnd.finance-tracker.columns+json: the document above
+- application/msgpack: the same document in MessagePack (needs msgpack)
+- application/vnd.apache.arrow.stream: an Arrow IPC stream with date32,
+  float64 and dictionary-encoded columns (needs pyarrow)
+
+Types whose package is missing are not offered. A date the server cannot
+read as a date (a malformed legacy string) is null.
+"""
+import io
+
+from app.serializers import TRANSACTION_SORT, encode
+
+try:
+    import msgpack
+except ImportError:  # optional: MessagePack isn't offered without it
+    msgpack = None
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # optional: Arrow isn't offered without it
+    pyarrow = None
+
+COLUMNS_JSON = 'application/vnd.finance-tracker.columns+json'
+MSGPACK = 'application/msgpack'
+ARROW = 'application/vnd.apache.arrow.stream'
+
+MS_PER_DAY = 86400000
+
+COLUMNAR_PROJECT_STAGE = {'$project': {
+    '_id': 0,
+    # Days since the epoch; legacy string dates are parsed, unreadable ones become null
+    'date': {'$toInt': {'$floor': {'$divide': [
+        {'$toLong': {'$convert': {'input': '$date', 'to': 'date', 'onError': None, 'onNull': None}}},
+        MS_PER_DAY
+    ]}}},
+    'amount': 1,
+    'type': 1,
+    'category': 1,
+}}
+
+
+def columnar_pipeline(match):
+    """Build the pipeline returning the charted fields of matching transactions, newest first"""
+    return [{'$match': match}, {'$sort': TRANSACTION_SORT}, COLUMNAR_PROJECT_STAGE]
+
+
+def to_columns(rows):
+    """Lay out rows from columnar_pipeline as parallel arrays with dictionary-encoded strings"""
+    dates, amounts, types, categories = [], [], [], []
+    type_codes, category_codes = {}, {}
+    for row in rows:
+        dates.append(row.get('date'))
+        amounts.append(row.get('amount'))
+        # setdefault hands out codes in order of first appearance
+        types.append(type_codes.setdefault(row.get('type'), len(type_codes)))
+        categories.append(category_codes.setdefault(row.get('category'), len(category_codes)))
+    return {
+        'count': len(dates),
+        'columns': {'date': dates, 'amount': amounts, 'type': types, 'category': categories},
+        'dictionaries': {'type': list(type_codes), 'category': list(category_codes)},
+    }
+
+
+def encode_msgpack(columns):
+    return msgpack.packb(columns, use_bin_type=True)
+
+
+def encode_arrow(columns):
+    data, dictionaries = columns['columns'], columns['dictionaries']
+
+    def dictionary(name):
+        return pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(data[name], pyarrow.int32()), pyarrow.array(dictionaries[name], pyarrow.string())
+        )
+
+    table = pyarrow.table({
+        'date': pyarrow.array(data['date'], pyarrow.date32()),
+        'amount': pyarrow.array(data['amount'], pyarrow.float64()),
+        'type': dictionary('type'),
+        'category': dictionary('category'),
+    })
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+# Accept type: encoder, for the formats whose package is installed
+ENCODERS = {COLUMNS_JSON: encode}
+if msgpack is not None:
+    ENCODERS[MSGPACK] = encode_msgpack
+if pyarrow is not None:
+    ENCODERS[ARROW] = encode_arrow
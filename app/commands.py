@@ -0,0 +1,48 @@
+import click
+from bson import ObjectId
+
+
+def register_commands(app):
+    """Attach maintenance commands to the `flask` CLI"""
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--user-id', default=None, help='Only rebuild rollups for this user.')
+    @click.option('--pending', is_flag=True, help='Only rebuild users queued after a failed rollup update.')
+    def rebuild_rollups(user_id, pending):
+        """Recompute monthly/category rollups from existing transactions."""
+        from app.models import TransactionRollup
+        if pending:
+            click.echo(f'Rebuilt rollups for {TransactionRollup.repair_pending()} queued users.')
+            return
+        TransactionRollup.rebuild(ObjectId(user_id) if user_id else None)
+        click.echo('Rollups rebuilt.')
+
+    @app.cli.command('check-indexes')
+    def check_indexes():
+        """Ensure indexes, then fail if any model query plans a collection scan."""
+        from app import mongo
+        from app.indexes import ensure_indexes, find_collscans
+        ensure_indexes(mongo.db)
+        failures = find_collscans(mongo.db)
+        for name, stages in failures:
+            click.echo(f'COLLSCAN in {name}: {" <- ".join(stages)}', err=True)
+        if failures:
+            raise click.ClickException(f'{len(failures)} queries would scan a whole collection')
+        click.echo('All queries use an index.')
+
+    @app.cli.command('slow-queries')
+    @click.option('--enable', is_flag=True, help='First turn on the profiler for commands over SLOW_QUERY_MS.')
+    @click.option('--limit', default=20, show_default=True, help='How many of the slowest entries to list.')
+    def slow_queries(enable, limit):
+        """List the slowest profiled queries with the documents they examined."""
+        from app import mongo
+        if enable:
+            mongo.db.command('profile', 1, slowms=int(app.config['SLOW_QUERY_MS']))
+            click.echo(f'Profiling commands over {app.config["SLOW_QUERY_MS"]:g} ms.')
+        entries = mongo.db.system.profile.find().sort('millis', -1).limit(limit)
+        for entry in entries:
+            click.echo(
+                f'{entry.get("millis")} ms {entry.get("op")} {entry.get("ns")}: '
+                f'examined {entry.get("docsExamined", 0)} docs and {entry.get("keysExamined", 0)} keys, '
+                f'returned {entry.get("nreturned", 0)}, plan {entry.get("planSummary", "-")}'
+            )
@@ -0,0 +1,67 @@
+"""gunicorn settings for production serving.
+
+    gunicorn -c python:app.gunicorn_conf app.wsgi:app
+
+Every setting can be overridden from the environment:
+
+- WEB_WORKERS: worker processes, default 2 x cores + 1
+- WEB_WORKER_CLASS: gthread by default. Threads suit this app, whose
+  requests mostly wait on MongoDB or the password-hash pool.
+- WEB_THREADS: threads per gthread worker, default 4. Keep
+  MONGO_MAX_POOL_SIZE at least this high.
+- WEB_PRELOAD: load the app once in the master and fork it, default on.
+  Workers then share the imported code copy-on-write. post_fork gives
+  each worker its own MongoDB client, because clients are not fork-safe.
+
+The response cache and analytics ledgers are invalidated through the data
+version held by CACHE_BACKEND. The in-process memory backend is per
+worker, so a write would leave the other workers serving stale responses
+for up to CACHE_TTL. With more than one worker CACHE_BACKEND therefore
+defaults to none; set it to redis (docker-compose.yml does) to cache
+across workers.
+
+Reloads are graceful: on SIGHUP gunicorn starts new workers and lets old
+ones finish in-flight requests for up to graceful_timeout. With preload
+on, SIGHUP does not pick up new code, because the master already holds
+it. Ship code with a restart or a USR2 binary upgrade, or set
+WEB_PRELOAD=0 to reload code on HUP.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("WEB_THREADS", 4))
+preload_app = os.environ.get("WEB_PRELOAD", "1") != "0"
+# Set in the environment before the app loads; a per-worker memory cache can't
+# see other workers' writes
+raw_env = ["CACHE_BACKEND=none"] if workers > 1 and "CACHE_BACKEND" not in os.environ else []
+
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+# Recycle workers now and then so slow leaks can't grow unbounded
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 10000))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 1000))
+
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def on_starting(server):
+    if workers > 1 and os.environ.get("CACHE_BACKEND") == "memory":
+        server.log.warning(
+            "CACHE_BACKEND=memory with several workers: writes only invalidate "
+            "their own worker's cache; use redis or none"
+        )
+
+
+def post_fork(server, worker):
+    """Give each forked worker its own MongoDB client and pool"""
+    if not preload_app:
+        return
+    from app import init_mongo
+    from app.wsgi import app
+    init_mongo(app)
+    server.log.info(f"Worker {worker.pid}: MongoDB client initialised")
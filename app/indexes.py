@@ -0,0 +1,145 @@
+"""Indexes the application's queries rely on, and a check that they are used.
+
+create_app ensures these at startup on a background thread, so a deployment
+never depends on database/init_db.py having been run and startup is not held
+up by index builds. create_index is idempotent, so this is cheap when the
+indexes already exist. database/init_db.py keeps its own copy for the
+standalone database image; keep the two in step.
+
+query_shapes() lists every query the models issue and find_collscans() runs
+explain() on each, so `flask check-indexes` fails when one of them would scan
+a whole collection.
+"""
+from datetime import datetime
+import logging
+import threading
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options)
+INDEXES = [
+    # Registration relies on these to reject duplicates in a single write
+    ("users", [("username", 1)], {"unique": True}),
+    ("users", [("email", 1)], {"unique": True}),
+    ("transactions", [("user_id", 1), ("date", -1), ("_id", -1)], {}),
+    # Filtered views: equality on category/type, then the date range and sort
+    ("transactions", [("user_id", 1), ("category", 1), ("date", -1)], {}),
+    ("transactions", [("user_id", 1), ("type", 1), ("date", -1)], {}),
+    # Also the $merge key for TransactionRollup.rebuild, which needs it unique
+    ("transaction_rollups", [("user_id", 1), ("year", 1), ("month", 1), ("category", 1), ("type", 1)], {"unique": True}),
+    # Change feed for client sync, kept for a week
+    ("transaction_changes", [("user_id", 1), ("version", 1)], {"unique": True}),
+    ("transaction_changes", [("at", 1)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    ("categories", [("user_id", 1), ("name", 1)], {}),
+    ("budgets", [("user_id", 1), ("category_id", 1)], {}),
+]
+
+
+def ensure_indexes(db):
+    """Create any missing index; returns the names of all ensured indexes"""
+    names = []
+    for collection, keys, options in INDEXES:
+        names.append(db[collection].create_index(keys, **options))
+    logger.info(f"Ensured {len(names)} indexes")
+    return names
+
+
+def ensure_indexes_in_background(db):
+    """Start ensure_indexes on a daemon thread; errors are logged, not raised"""
+    def run():
+        try:
+            ensure_indexes(db)
+        except Exception as e:
+            logger.error(f"Error ensuring indexes: {str(e)}")
+
+    thread = threading.Thread(target=run, name="ensure-indexes", daemon=True)
+    thread.start()
+    return thread
+
+
+def query_shapes():
+    """(name, collection, find filter and sort, or aggregation pipeline) for each model query"""
+    from app.models import Transaction, TransactionRollup
+    from app.serializers import transaction_pipeline, TRANSACTION_SORT
+    from app.analytics import ledger_pipeline
+    from app.columnar import columnar_pipeline
+
+    user_id = ObjectId()
+    after = (datetime(2024, 1, 1), ObjectId())
+    filtered = {
+        "date_from": datetime(2024, 1, 1),
+        "date_to": datetime(2024, 2, 1),
+        "categories": ["Food"],
+        "type": "expense",
+        "min_amount": 1.0,
+    }
+    return [
+        ("users by email", "users", {"filter": {"email": "user@example.com"}}),
+        ("transactions by user", "transactions",
+         {"filter": {"user_id": user_id}, "sort": list(TRANSACTION_SORT.items())}),
+        ("transaction list", "transactions",
+         {"pipeline": transaction_pipeline(Transaction.build_query(user_id))}),
+        ("transaction page after cursor", "transactions",
+         {"pipeline": transaction_pipeline(Transaction.page_query(user_id, after), 51)}),
+        ("filtered transactions", "transactions",
+         {"pipeline": transaction_pipeline(Transaction.build_query(user_id, filtered))}),
+        ("transactions by category", "transactions",
+         {"pipeline": transaction_pipeline(Transaction.build_query(user_id, {"categories": ["Food", "Bills"]}))}),
+        ("transaction columns", "transactions",
+         {"pipeline": columnar_pipeline(Transaction.build_query(user_id))}),
+        ("analytics ledger", "transactions", {"pipeline": ledger_pipeline(user_id)}),
+        ("transactions by type", "transactions",
+         {"pipeline": transaction_pipeline(Transaction.build_query(user_id, {"type": "income"}))}),
+        ("delete transaction", "transactions", {"filter": {"_id": ObjectId(), "user_id": user_id}}),
+        ("monthly rollups", "transaction_rollups",
+         {"pipeline": [{"$match": TransactionRollup.build_query(user_id)}]}),
+        ("monthly totals from transactions", "transactions",
+         {"pipeline": Transaction.monthly_pipeline(user_id, filtered)}),
+        ("daily balance from transactions", "transactions",
+         {"pipeline": Transaction.balance_pipeline(user_id, {"date_to": datetime(2024, 2, 1)})}),
+        ("daily totals from transactions", "transactions",
+         {"pipeline": Transaction.monthly_pipeline(user_id, {}, "day", "Europe/Paris")}),
+        ("transaction changes since version", "transaction_changes",
+         {"filter": {"user_id": user_id, "version": {"$gt": 0}}, "sort": [("version", 1)]}),
+        ("categories by user", "categories", {"filter": {"user_id": user_id}}),
+    ]
+
+
+def plan_stages(explain):
+    """Every stage name in the winning plans of an explain() result"""
+    stages = []
+
+    def walk(node, in_plan):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "stage" and in_plan and isinstance(value, str):
+                    stages.append(value)
+                walk(value, in_plan or key == "winningPlan")
+        elif isinstance(node, list):
+            for item in node:
+                walk(item, in_plan)
+
+    walk(explain, False)
+    return stages
+
+
+def explain(db, collection, shape):
+    if "pipeline" in shape:
+        return db.command("aggregate", collection, pipeline=shape["pipeline"], explain=True)
+    cursor = db[collection].find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    return cursor.explain()
+
+
+def find_collscans(db):
+    """Run explain() on every query shape; returns [(name, stages)] for those that scan"""
+    failures = []
+    for name, collection, shape in query_shapes():
+        stages = plan_stages(explain(db, collection, shape))
+        logger.info(f"{name}: {' <- '.join(stages)}")
+        if "COLLSCAN" in stages:
+            failures.append((name, stages))
+    return failures
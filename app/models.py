@@ -1,17 +1,34 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
 from bson import ObjectId
-from app import mongo
-from werkzeug.security import generate_password_hash, check_password_hash
+from bson.errors import InvalidId
+from app import mongo, cache, hasher
+from app.serializers import transaction_pipeline, format_date, serialize_transaction
+from app.columnar import columnar_pipeline, to_columns
+from app import charts
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import base64
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+class BulkImportError(Exception):
+    """A bulk import stopped part way; `inserted` rows were already committed"""
+    def __init__(self, message, inserted):
+        super().__init__(message)
+        self.inserted = inserted
+
 class User:
     def __init__(self, username, email, password=None, password_hash=None):
         self.username = username
         self.email = email
         if password:
-            self.password_hash = generate_password_hash(password)
+            self.password_hash = hasher.hash(password)
         else:
             self.password_hash = password_hash
         self.created_at = datetime.now()
@@ -35,26 +52,51 @@ class User:
         return mongo.db.users.find_one({"_id": user_id})
 
     def save(self):
-        result = mongo.db.users.insert_one(self.to_dict())
+        """Insert the user and return the stored document without reading it back"""
+        document = self.to_dict()
+        result = mongo.db.users.insert_one(document)
         if result.inserted_id:
-            return mongo.db.users.find_one({"_id": result.inserted_id})
+            return {**document, "_id": result.inserted_id}
         return None
 
     @staticmethod
     def create(username, email, password):
-        # Check if email already exists
-        if User.get_by_email(email):
-            return None
+        """Register a user in one write; returns None if the email is taken.
+
+        Uniqueness comes from the unique email/username indexes rather than a
+        lookup first, which also closes the race between two signups. A taken
+        username raises ValueError.
+        """
         user = User(username=username, email=email, password=password)
-        return user.save()
+        try:
+            return user.save()
+        except DuplicateKeyError as e:
+            if "username" in (e.details or {}).get("keyPattern", {}):
+                raise ValueError("Username already taken") from e
+            return None
 
     @staticmethod
     def login(email, password):
         user = mongo.db.users.find_one({"email": email})
-        if user and check_password_hash(user['password_hash'], password):
+        if user and hasher.verify(user['password_hash'], password):
+            if hasher.needs_rehash(user['password_hash']):
+                User.rehash(user, password)
             return user
         return None
 
+    @staticmethod
+    def rehash(user, password):
+        """Store a hash made with the current parameters; failures only cost a retry next login"""
+        try:
+            password_hash = hasher.hash(password)
+            mongo.db.users.update_one(
+                {"_id": user["_id"], "password_hash": user["password_hash"]},
+                {"$set": {"password_hash": password_hash}}
+            )
+            user["password_hash"] = password_hash
+        except Exception as e:
+            logger.error(f"Error rehashing password for user {user['_id']}: {str(e)}")
+
 class Transaction:
     def __init__(self, amount, category, description, date=None, user_id=None, type=None):
         # Convert amount to float and make it positive for income, negative for expense
@@ -94,6 +136,7 @@ class Transaction:
 
     @staticmethod
     def create(data):
+        """Insert a transaction; returns its _id, API row, analytics deltas and sync version"""
         try:
             transaction = Transaction(
                 amount=data['amount'],
@@ -104,11 +147,68 @@ class Transaction:
                 date=data.get('date', datetime.now())
             )
             transaction_id = transaction.save()
-            return {"_id": transaction_id}
+            document = {**transaction.to_dict(), "_id": transaction_id}
+            row = serialize_transaction(document)
+            deltas = TransactionRollup.deltas(document)
+            try:
+                try:
+                    TransactionRollup.apply(document)
+                except Exception as e:
+                    TransactionRollup.reconcile(transaction.user_id, e)
+                version = TransactionChange.record(transaction.user_id, "insert", row, deltas)
+            finally:
+                cache.bump(transaction.user_id)
+            return {"_id": transaction_id, "transaction": row, "deltas": deltas, "version": version}
         except Exception as e:
             logger.error(f"Error creating transaction: {str(e)}")
             raise
 
+    @staticmethod
+    def bulk_create(transactions, batch_size=1000):
+        """Insert many transaction documents with unordered insert_many batches.
+
+        Rollups are updated and the cache invalidated once per batch rather than
+        once per row. Returns (inserted_count, errors) where errors is a list of
+        (index, message) for documents the server rejected. Any other failure
+        raises BulkImportError carrying the count of rows already inserted.
+        """
+        inserted = 0
+        errors = []
+        for start in range(0, len(transactions), batch_size):
+            batch = transactions[start:start + batch_size]
+            failed = set()
+            try:
+                result = mongo.db.transactions.insert_many(batch, ordered=False)
+                inserted += len(result.inserted_ids)
+            except BulkWriteError as e:
+                inserted += e.details.get('nInserted', 0)
+                for write_error in e.details.get('writeErrors', []):
+                    failed.add(write_error['index'])
+                    errors.append((start + write_error['index'], write_error['errmsg']))
+            except Exception as e:
+                logger.error(f"Error importing transactions after {inserted} rows: {str(e)}")
+                # Part of this batch may have landed; resync whatever did
+                for user_id in {doc['user_id'] for doc in batch}:
+                    TransactionRollup.reconcile(user_id, e)
+                    cache.bump(user_id)
+                for user_id in {doc['user_id'] for doc in transactions[:start + batch_size]}:
+                    TransactionChange.record(user_id, "reset")
+                raise BulkImportError(str(e), inserted) from e
+            user_ids = {doc['user_id'] for doc in batch}
+            try:
+                TransactionRollup.apply_many([doc for i, doc in enumerate(batch) if i not in failed])
+            except Exception as e:
+                for user_id in user_ids:
+                    TransactionRollup.reconcile(user_id, e)
+            finally:
+                for user_id in user_ids:
+                    cache.bump(user_id)
+        if inserted:
+            # Too many rows to replay one by one; synced clients reload instead
+            for user_id in {doc['user_id'] for doc in transactions}:
+                TransactionChange.record(user_id, "reset")
+        return inserted, errors
+
     @staticmethod
     def get_by_user(user_id):
         try:
@@ -117,18 +217,316 @@ class Transaction:
             logger.error(f"Error getting transactions for user {user_id}: {str(e)}")
             raise
 
+    @staticmethod
+    def build_query(user_id, filters=None):
+        """Translate API filters into a MongoDB predicate for a user's transactions.
+
+        Supported keys: date_from (inclusive), date_to (exclusive), categories,
+        type, min_amount and max_amount. Amount bounds apply to the magnitude,
+        since expenses are stored as negative amounts.
+        """
+        query = {"user_id": user_id}
+        filters = filters or {}
+        date_range = {}
+        if filters.get("date_from"):
+            date_range["$gte"] = filters["date_from"]
+        if filters.get("date_to"):
+            date_range["$lt"] = filters["date_to"]
+        if date_range:
+            query["date"] = date_range
+        categories = filters.get("categories")
+        if categories:
+            query["category"] = categories[0] if len(categories) == 1 else {"$in": categories}
+        if filters.get("type"):
+            query["type"] = filters["type"]
+        if filters.get("min_amount") is not None or filters.get("max_amount") is not None:
+            low = filters.get("min_amount") or 0
+            high = filters.get("max_amount")
+            income_range = {"$gte": low}
+            expense_range = {"$lte": -low}
+            if high is not None:
+                income_range["$lte"] = high
+                expense_range["$gte"] = -high
+            query["$and"] = [{"$or": [{"amount": income_range}, {"amount": expense_range}]}]
+        return query
+
+    @staticmethod
+    def get_serialized_by_user(user_id, filters=None):
+        """Return a user's transactions, newest first, already in API shape"""
+        try:
+            return list(mongo.db.transactions.aggregate(transaction_pipeline(Transaction.build_query(user_id, filters))))
+        except Exception as e:
+            logger.error(f"Error getting transactions for user {user_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def get_columns(user_id, filters=None):
+        """Return a user's transactions, newest first, as columns (see app/columnar.py)"""
+        try:
+            pipeline = columnar_pipeline(Transaction.build_query(user_id, filters))
+            return to_columns(mongo.db.transactions.aggregate(pipeline))
+        except Exception as e:
+            logger.error(f"Error getting transaction columns for user {user_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def iter_by_user(user_id, batch_size=1000, filters=None):
+        """Return a lazy cursor over all of a user's serialized transactions.
+
+        Documents are pulled from the server batch_size at a time, so callers
+        that stream the cursor only ever hold one batch in memory.
+        """
+        try:
+            return mongo.db.transactions.aggregate(
+                transaction_pipeline(Transaction.build_query(user_id, filters)),
+                batchSize=batch_size
+            )
+        except Exception as e:
+            logger.error(f"Error exporting transactions for user {user_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def encode_cursor(transaction):
+        """Build an opaque cursor pointing just past the given transaction"""
+        date = transaction['date']
+        if isinstance(date, datetime):
+            date = format_date(date)
+        raw = f"{date}|{transaction['_id']}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Turn a cursor back into (date, _id); raises ValueError if malformed"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+            date, transaction_id = raw.split('|')
+            return datetime.fromisoformat(date), ObjectId(transaction_id)
+        except (ValueError, InvalidId, UnicodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+
+    @staticmethod
+    def page_query(user_id, after=None, filters=None):
+        """The $match for a keyset page starting just past `after` = (date, _id)"""
+        query = Transaction.build_query(user_id, filters)
+        query["date"] = {**query.get("date", {}), "$type": "date"}
+        if after:
+            date, last_id = after
+            query["date"] = {**query.get("date", {}), "$lte": date}
+            query["$or"] = [{"date": {"$lt": date}}, {"_id": {"$lt": last_id}}]
+        return query
+
+    @staticmethod
+    def split_page(transactions, limit):
+        """Trim a limit + 1 row fetch to (page, next_cursor or None)"""
+        if len(transactions) <= limit:
+            return transactions, None
+        transactions = transactions[:limit]
+        return transactions, Transaction.encode_cursor(transactions[-1])
+
+    @staticmethod
+    def get_page(user_id, limit, after=None, filters=None):
+        """Fetch one page of a user's serialized transactions, newest first.
+
+        Uses keyset pagination on (date, _id) so each page is a bounded scan of
+        the (user_id, date, _id) index regardless of how deep the page is.
+        Only rows with a real date are paged: legacy rows holding the date as a
+        string have no cursor position, and are still returned by the unpaged
+        list and the export. Returns (transactions, next_cursor); next_cursor
+        is None on the last page.
+        """
+        try:
+            query = Transaction.page_query(user_id, after, filters)
+            # Fetch one extra row to know whether another page exists
+            transactions = list(mongo.db.transactions.aggregate(transaction_pipeline(query, limit + 1)))
+            return Transaction.split_page(transactions, limit)
+        except Exception as e:
+            logger.error(f"Error getting transaction page for user {user_id}: {str(e)}")
+            raise
+
     @staticmethod
     def delete(transaction_id, user_id):
+        """Delete a user's transaction; returns its _id, analytics deltas and sync version, or None if not found"""
         try:
-            result = mongo.db.transactions.delete_one({
-                "_id": transaction_id,
-                "user_id": user_id
-            })
-            return result.deleted_count > 0
+            deleted = mongo.db.transactions.find_one_and_delete(
+                {"_id": transaction_id, "user_id": user_id},
+                projection=TransactionRollup.SOURCE_FIELDS
+            )
+            if deleted is None:
+                return None
+            row = {"_id": str(transaction_id)}
+            deltas = TransactionRollup.deltas(deleted, sign=-1)
+            try:
+                try:
+                    TransactionRollup.apply(deleted, sign=-1)
+                except Exception as e:
+                    TransactionRollup.reconcile(user_id, e)
+                version = TransactionChange.record(user_id, "delete", row, deltas)
+            finally:
+                cache.bump(user_id)
+            return {**row, "deltas": deltas, "version": version}
         except Exception as e:
             logger.error(f"Error deleting transaction {transaction_id}: {str(e)}")
             raise
 
+    @staticmethod
+    def monthly_totals(user_id, filters=None, bucket="month", tz="UTC"):
+        """Totals per bucket and type as [{_id: {period, type}, total, count}] straight from transactions"""
+        return Transaction.aggregate(Transaction.monthly_pipeline(user_id, filters, bucket, tz))
+
+    @staticmethod
+    def category_totals(user_id, filters=None):
+        """Category totals as [{_id: category, total}] straight from transactions"""
+        return Transaction.aggregate(Transaction.category_pipeline(user_id, filters))
+
+    # $dateTrunc units the bucketed analytics accept, with roughly how long each is
+    BUCKETS = {
+        "day": timedelta(days=1),
+        "week": timedelta(weeks=1),
+        "month": timedelta(days=31),
+        "quarter": timedelta(days=92),
+        "year": timedelta(days=366),
+    }
+    # Most buckets one aggregation over raw transactions may span
+    MAX_BUCKETS = 400
+
+    @staticmethod
+    def bucket_filters(filters, bucket, tz="UTC"):
+        """Filters for a bucketed aggregation over raw transactions.
+
+        from/to are local times in tz. The scanned range is capped at
+        MAX_BUCKETS buckets: without a start it begins that far before the
+        end (or now), and a longer explicit range raises ValueError.
+        """
+        filters = dict(filters or {})
+        if tz != "UTC":
+            zone = ZoneInfo(tz)
+            for key in ("date_from", "date_to"):
+                if filters.get(key):
+                    local = filters[key].replace(tzinfo=zone)
+                    filters[key] = local.astimezone(timezone.utc).replace(tzinfo=None)
+        span = Transaction.BUCKETS[bucket] * Transaction.MAX_BUCKETS
+        end = filters.get("date_to") or datetime.now()
+        if not filters.get("date_from"):
+            filters["date_from"] = end - span
+        elif end - filters["date_from"] > span:
+            raise ValueError(
+                f"Date range too long for bucket={bucket}: at most {Transaction.MAX_BUCKETS} buckets"
+            )
+        return filters
+
+    @staticmethod
+    def monthly_pipeline(user_id, filters=None, bucket="month", tz="UTC"):
+        """Totals per bucket and type, cut with $dateTrunc in tz (weeks start on Monday).
+
+        Rows are {_id: {period: "YYYY-MM-DD", type}, total, count}, the period
+        being the bucket's first day, oldest first.
+        """
+        truncate = {"date": "$date", "unit": bucket, "timezone": tz}
+        if bucket == "week":
+            truncate["startOfWeek"] = "monday"
+        return [
+            {"$match": Transaction.dated_query(user_id, Transaction.bucket_filters(filters, bucket, tz))},
+            {"$group": {
+                "_id": {"period": {"$dateTrunc": truncate}, "type": "$type"},
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id.period": 1, "_id.type": 1}},
+            {"$set": {"_id.period": {"$dateToString": {
+                "date": "$_id.period", "format": "%Y-%m-%d", "timezone": tz
+            }}}}
+        ]
+
+    @staticmethod
+    def balance_pipeline(user_id, filters=None, bucket="day", tz="UTC"):
+        """Running balance per bucket, cut with $dateTrunc in tz like monthly_pipeline.
+
+        Everything matching the filters before `from` counts towards the
+        balance, so the history up to `to` is read once and grouped into the
+        range's buckets plus a single opening group (_id null) for the rest;
+        $setWindowFields then sums the groups in date order. Rows are
+        {_id: "YYYY-MM-DD" or None, income, expense, net, count, balance},
+        oldest first, see balance_rows().
+        """
+        filters = Transaction.bucket_filters(filters, bucket, tz)
+        truncate = {"date": "$date", "unit": bucket, "timezone": tz}
+        if bucket == "week":
+            truncate["startOfWeek"] = "monday"
+        period = {"$dateTrunc": truncate}
+        # The range starts with the whole bucket `from` falls in
+        start = {"$dateTrunc": {**truncate, "date": filters["date_from"]}}
+        history = {key: value for key, value in filters.items() if key != "date_from"}
+        return [
+            {"$match": Transaction.dated_query(user_id, history)},
+            {"$group": {
+                "_id": {"$cond": [{"$lt": [period, start]}, None, period]},
+                "income": {"$sum": {"$cond": [{"$gt": ["$amount", 0]}, "$amount", 0]}},
+                "expense": {"$sum": {"$cond": [{"$lt": ["$amount", 0]}, "$amount", 0]}},
+                "net": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }},
+            # null sorts first, so the opening group leads the running sum
+            {"$setWindowFields": {
+                "sortBy": {"_id": 1},
+                "output": {"balance": {"$sum": "$net", "window": {"documents": ["unbounded", "current"]}}}
+            }},
+            {"$set": {"_id": {"$cond": [
+                {"$eq": ["$_id", None]},
+                None,
+                {"$dateToString": {"date": "$_id", "format": "%Y-%m-%d", "timezone": tz}}
+            ]}}}
+        ]
+
+    @staticmethod
+    def balance_rows(rows, bucket="day"):
+        """Shape balance_pipeline output as {bucket, opening, points: [{period, income, expense, net, count, balance}]}.
+
+        Buckets without transactions have no point; the balance carries over.
+        """
+        opening, points = 0, []
+        for row in rows:
+            if row["_id"] is None:
+                opening = row["balance"]
+                continue
+            points.append({
+                "period": row["_id"],
+                **{key: row[key] for key in ("income", "expense", "net", "count", "balance")}
+            })
+        return {"bucket": bucket, "opening": opening, "points": points}
+
+    @staticmethod
+    def balance(user_id, filters=None, bucket="day", tz="UTC"):
+        """Running balance over time; raises ValueError when the range is too long, see bucket_filters"""
+        return Transaction.balance_rows(
+            Transaction.aggregate(Transaction.balance_pipeline(user_id, filters, bucket, tz)), bucket
+        )
+
+    @staticmethod
+    def category_pipeline(user_id, filters=None):
+        return [
+            {"$match": Transaction.build_query(user_id, filters)},
+            {"$group": {
+                "_id": "$category",
+                "total": {"$sum": "$amount"}
+            }},
+            {"$sort": {"total": -1}}
+        ]
+
+    @staticmethod
+    def dated_query(user_id, filters=None):
+        """build_query limited to real dates, which $year/$month (and the rollups) need"""
+        query = Transaction.build_query(user_id, filters)
+        query["date"] = {**query.get("date", {}), "$type": "date"}
+        return query
+
+    @staticmethod
+    def top_categories_pipeline(user_id, filters=None, top=6):
+        return [
+            {"$match": Transaction.dated_query(user_id, filters)},
+            {"$group": {"_id": "$category", "total": {"$sum": "$amount"}}},
+            *TransactionRollup.top_stages(top)
+        ]
+
     @staticmethod
     def aggregate(pipeline):
         try:
@@ -137,6 +535,468 @@ class Transaction:
             logger.error(f"Error running aggregation: {str(e)}")
             raise
 
+class TransactionRollup:
+    """Per-user monthly totals by category and type, kept in step with transactions.
+
+    Each rollup document covers one (user_id, year, month, category, type)
+    and is adjusted with $inc whenever a transaction is created or deleted,
+    so the analytics endpoints read O(months x categories) documents instead
+    of re-aggregating the whole transaction history.
+    """
+    SOURCE_FIELDS = {"user_id": 1, "date": 1, "category": 1, "type": 1, "amount": 1}
+    KEY_FIELDS = ["user_id", "year", "month", "category", "type"]
+
+    @staticmethod
+    def apply(transaction, sign=1):
+        """Add (sign=1) or remove (sign=-1) a transaction from its rollup"""
+        date = transaction["date"]
+        if not isinstance(date, datetime):
+            # Same as $year/$month in the rebuild pipeline: only real dates are rolled up
+            return
+        try:
+            mongo.db.transaction_rollups.update_one(
+                {
+                    "user_id": transaction["user_id"],
+                    "year": date.year,
+                    "month": date.month,
+                    "category": transaction["category"],
+                    "type": transaction["type"]
+                },
+                {"$inc": {"total": sign * transaction["amount"], "count": sign}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Error updating rollup for user {transaction['user_id']}: {str(e)}")
+            raise
+
+    @staticmethod
+    def deltas(transaction, sign=1):
+        """How adding (sign=1) or removing (sign=-1) a transaction moves the unfiltered
+        monthly and category analytics rows; None for rows rollups skip.
+
+        The monthly delta has the shape of a monthly_pipeline row:
+        {_id: {period: "YYYY-MM-01", type}, total, count}.
+        """
+        date = transaction["date"]
+        if not isinstance(date, datetime):
+            return None
+        amount = sign * transaction["amount"]
+        return {
+            "type": transaction["type"],
+            "monthly": {
+                "_id": {"period": f"{date.year:04d}-{date.month:02d}-01", "type": transaction["type"]},
+                "total": amount,
+                "count": sign
+            },
+            "categories": {"_id": transaction["category"], "total": amount}
+        }
+
+    @staticmethod
+    def apply_many(transactions):
+        """Add many transactions to their rollups with one bulk write"""
+        deltas = defaultdict(lambda: [0, 0])
+        for transaction in transactions:
+            date = transaction["date"]
+            if not isinstance(date, datetime):
+                continue
+            key = (transaction["user_id"], date.year, date.month, transaction["category"], transaction["type"])
+            deltas[key][0] += transaction["amount"]
+            deltas[key][1] += 1
+        if not deltas:
+            return
+        try:
+            mongo.db.transaction_rollups.bulk_write([
+                UpdateOne(
+                    dict(zip(TransactionRollup.KEY_FIELDS, key)),
+                    {"$inc": {"total": total, "count": count}},
+                    upsert=True
+                )
+                for key, (total, count) in deltas.items()
+            ], ordered=False)
+        except Exception as e:
+            logger.error(f"Error updating rollups: {str(e)}")
+            raise
+
+    @staticmethod
+    def reconcile(user_id, error):
+        """Recover from a rollup write that failed after its transaction was written.
+
+        The transaction itself is stored, so callers still report success (a
+        client retry would otherwise duplicate it). The user's rollups are
+        rebuilt straight away; if that fails too, the user is queued in
+        rollup_repairs for `flask rebuild-rollups --pending`.
+        """
+        logger.error(f"Rollup update failed for user {user_id}, rebuilding: {str(error)}")
+        try:
+            TransactionRollup.rebuild(user_id)
+        except Exception:
+            try:
+                mongo.db.rollup_repairs.update_one(
+                    {"_id": user_id},
+                    {"$set": {"queued_at": datetime.now()}},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.error(f"Could not queue rollup repair for user {user_id}: {str(e)}")
+
+    @staticmethod
+    def repair_pending():
+        """Rebuild rollups for every user queued by reconcile; returns how many"""
+        repaired = 0
+        for repair in mongo.db.rollup_repairs.find({}, {"_id": 1}):
+            TransactionRollup.rebuild(repair["_id"])
+            repaired += 1
+        return repaired
+
+    @staticmethod
+    def aggregate(pipeline):
+        try:
+            return mongo.db.transaction_rollups.aggregate(pipeline)
+        except Exception as e:
+            logger.error(f"Error running rollup aggregation: {str(e)}")
+            raise
+
+    # Filters the rollups can answer; date and amount ranges need raw transactions
+    FILTERABLE = {"categories", "type"}
+
+    @staticmethod
+    def covers(filters):
+        """Whether a filter set can be answered from rollups alone"""
+        return all(key in TransactionRollup.FILTERABLE for key, value in (filters or {}).items() if value is not None)
+
+    @staticmethod
+    def build_query(user_id, filters=None):
+        query = {"user_id": user_id, "count": {"$gt": 0}}
+        filters = filters or {}
+        categories = filters.get("categories")
+        if categories:
+            query["category"] = categories[0] if len(categories) == 1 else {"$in": categories}
+        if filters.get("type"):
+            query["type"] = filters["type"]
+        return query
+
+    @staticmethod
+    def monthly(user_id, filters=None, bucket="month"):
+        """Totals per bucket and type as [{_id: {period, type}, total, count}], oldest first"""
+        return TransactionRollup.aggregate(TransactionRollup.monthly_pipeline(user_id, filters, bucket))
+
+    @staticmethod
+    def by_category(user_id, filters=None):
+        """Category totals as [{_id: category, total}], largest first"""
+        return TransactionRollup.aggregate(TransactionRollup.by_category_pipeline(user_id, filters))
+
+    # Buckets made of whole UTC months, which the rollups can answer
+    BUCKETS = ("month", "quarter", "year")
+
+    @staticmethod
+    def monthly_pipeline(user_id, filters=None, bucket="month"):
+        """Transaction.monthly_pipeline's rows for a UTC month, quarter or year bucket"""
+        first_month = {
+            "month": "$month",
+            "quarter": {"$subtract": ["$month", {"$mod": [{"$subtract": ["$month", 1]}, 3]}]},
+            "year": {"$literal": 1},
+        }[bucket]
+        return [
+            {"$match": TransactionRollup.build_query(user_id, filters)},
+            {"$group": {
+                "_id": {"year": "$year", "month": first_month, "type": "$type"},
+                "total": {"$sum": "$total"},
+                "count": {"$sum": "$count"}
+            }},
+            {"$sort": {"_id.year": 1, "_id.month": 1, "_id.type": 1}},
+            {"$project": {
+                "_id": {
+                    "period": {"$dateToString": {
+                        "date": {"$dateFromParts": {"year": "$_id.year", "month": "$_id.month"}},
+                        "format": "%Y-%m-%d"
+                    }},
+                    "type": "$_id.type"
+                },
+                "total": 1,
+                "count": 1
+            }}
+        ]
+
+    @staticmethod
+    def by_category_pipeline(user_id, filters=None):
+        return [
+            {"$match": TransactionRollup.build_query(user_id, filters)},
+            {"$group": {
+                "_id": "$category",
+                "total": {"$sum": "$total"}
+            }},
+            {"$sort": {"total": -1}}
+        ]
+
+    @staticmethod
+    def analytics(metric, user_id, filters=None, bucket="month", tz="UTC"):
+        """Answer a monthly/categories request from rollups when they cover it.
+
+        Raises ValueError when a bucketed range is too long, see Transaction.bucket_filters.
+        """
+        collection, pipeline = TransactionRollup.analytics_pipeline(metric, user_id, filters, bucket, tz)
+        source = TransactionRollup if collection == "transaction_rollups" else Transaction
+        return list(source.aggregate(pipeline))
+
+    @staticmethod
+    def top_categories_pipeline(user_id, filters=None, top=6):
+        return [
+            {"$match": TransactionRollup.build_query(user_id, filters)},
+            {"$group": {"_id": "$category", "total": {"$sum": "$total"}}},
+            *TransactionRollup.top_stages(top)
+        ]
+
+    @staticmethod
+    def top_stages(top):
+        """Rank per-category totals by size and split them into the top N and the rest"""
+        return [
+            {"$project": {"total": {"$abs": "$total"}}},
+            {"$sort": {"total": -1, "_id": 1}},
+            {"$facet": {
+                "top": [{"$limit": top}],
+                "other": [
+                    {"$skip": top},
+                    {"$group": {"_id": None, "total": {"$sum": "$total"}, "count": {"$sum": 1}}}
+                ]
+            }}
+        ]
+
+    @staticmethod
+    def chart_pipeline(chart, user_id, filters=None, top=6):
+        """(collection, pipeline) for a monthly/categories chart, see app.charts.
+
+        The category chart shows one type at a time: spending, unless the
+        filters ask for income.
+        """
+        if chart == "categories":
+            filters = {**(filters or {}), "type": (filters or {}).get("type") or "expense"}
+        if TransactionRollup.covers(filters):
+            source, collection = TransactionRollup, "transaction_rollups"
+        else:
+            source, collection = Transaction, "transactions"
+        if chart == "monthly":
+            return collection, source.monthly_pipeline(user_id, filters)
+        return collection, source.top_categories_pipeline(user_id, filters, top)
+
+    @staticmethod
+    def chart(chart, user_id, filters=None, top=6):
+        """Chart-ready series for the dashboard's monthly or categories chart"""
+        collection, pipeline = TransactionRollup.chart_pipeline(chart, user_id, filters, top)
+        source = TransactionRollup if collection == "transaction_rollups" else Transaction
+        return charts.shape(chart, list(source.aggregate(pipeline)), filters, top)
+
+    @staticmethod
+    def analytics_pipeline(metric, user_id, filters=None, bucket="month", tz="UTC"):
+        """(collection, pipeline) answering a monthly/categories request.
+
+        Reads the rollups when they cover the filters (and, for monthly, the
+        bucket is whole UTC months), the raw transactions otherwise; also for
+        callers running the pipeline on another driver.
+        """
+        covered = TransactionRollup.covers(filters)
+        if metric == "monthly":
+            if covered and tz == "UTC" and bucket in TransactionRollup.BUCKETS:
+                return "transaction_rollups", TransactionRollup.monthly_pipeline(user_id, filters, bucket)
+            return "transactions", Transaction.monthly_pipeline(user_id, filters, bucket, tz)
+        if covered:
+            return "transaction_rollups", TransactionRollup.by_category_pipeline(user_id, filters)
+        return "transactions", Transaction.category_pipeline(user_id, filters)
+
+    @staticmethod
+    def rebuild(user_id=None):
+        """Recompute rollups from the transactions collection.
+
+        Used to backfill existing data; run it while writes are quiet, since
+        transactions created mid-rebuild can be counted twice. Fresh totals are
+        merged over the old ones first and only keys the rebuild did not touch
+        are deleted afterwards, so analytics never read an empty collection.
+        """
+        scope = {} if user_id is None else {"user_id": user_id}
+        rebuild_id = ObjectId()
+        try:
+            mongo.db.transactions.aggregate([
+                {"$match": {**scope, "date": {"$type": "date"}}},
+                {"$group": {
+                    "_id": {
+                        "user_id": "$user_id",
+                        "year": {"$year": "$date"},
+                        "month": {"$month": "$date"},
+                        "category": "$category",
+                        "type": "$type"
+                    },
+                    "total": {"$sum": "$amount"},
+                    "count": {"$sum": 1}
+                }},
+                {"$replaceWith": {"$mergeObjects": [
+                    "$_id",
+                    {"total": "$total", "count": "$count", "rebuild_id": rebuild_id}
+                ]}},
+                {"$merge": {
+                    "into": "transaction_rollups",
+                    "on": TransactionRollup.KEY_FIELDS,
+                    "whenMatched": "replace",
+                    "whenNotMatched": "insert"
+                }}
+            ])
+            mongo.db.transaction_rollups.delete_many({**scope, "rebuild_id": {"$ne": rebuild_id}})
+            mongo.db.rollup_repairs.delete_many({} if user_id is None else {"_id": user_id})
+            if user_id is None:
+                cache.bump_all()
+            else:
+                cache.bump(user_id)
+        except Exception as e:
+            logger.error(f"Error rebuilding rollups: {str(e)}")
+            raise
+
+class TransactionChange:
+    """Per-user log of transaction writes, so clients can sync without reloading.
+
+    Each write takes the next value of the user's sync_version counter (kept
+    on the user document) and is logged under it with the API row (just the
+    _id for a delete) and its analytics deltas. A client holding version N
+    asks for everything after N and patches its table and charts in place.
+    Entries expire after a week (see app/indexes.py); a client further behind
+    than the log, or than FEED_LIMIT changes, is told to reload instead.
+
+    Versions are taken after the write lands, so a dashboard read racing a
+    write may see it both in its data and in the feed; delivery is at least
+    once.
+    """
+    FEED_LIMIT = 500
+    # A missing version younger than this is taken to be a write still in flight
+    GAP_SECONDS = 30
+
+    @staticmethod
+    def current_version(user_id):
+        try:
+            user = mongo.db.users.find_one({"_id": user_id}, {"sync_version": 1})
+            return (user or {}).get("sync_version", 0)
+        except Exception as e:
+            logger.error(f"Error reading sync version for user {user_id}: {str(e)}")
+            raise
+
+    @staticmethod
+    def record(user_id, op, transaction=None, deltas=None):
+        """Log an insert, delete or reset under the user's next version and return it.
+
+        The write itself has already succeeded, so a failure here is logged and
+        returns None instead of raising; clients treat that as a cue to reload.
+        """
+        try:
+            now = datetime.now()
+            user = mongo.db.users.find_one_and_update(
+                {"_id": user_id},
+                {"$inc": {"sync_version": 1}, "$set": {"synced_at": now}},
+                projection={"sync_version": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if user is None:
+                return None
+            version = user["sync_version"]
+            mongo.db.transaction_changes.insert_one({
+                "user_id": user_id,
+                "version": version,
+                "op": op,
+                "transaction": transaction,
+                "deltas": deltas,
+                "at": now
+            })
+            return version
+        except Exception as e:
+            logger.error(f"Error recording {op} change for user {user_id}: {str(e)}")
+            return None
+
+    @staticmethod
+    def since(user_id, version):
+        """Changes after `version`, oldest first, as {version, changes, reset}.
+
+        Stops short of a missing version that may still be in flight, so the
+        returned version is always safe to resume from. reset=True means the
+        log can't bring the client up to date and it should reload.
+        """
+        try:
+            changes = list(mongo.db.transaction_changes.find(
+                {"user_id": user_id, "version": {"$gt": version}}
+            ).sort("version", 1).limit(TransactionChange.FEED_LIMIT + 1))
+            user = mongo.db.users.find_one({"_id": user_id}, {"sync_version": 1, "synced_at": 1}) or {}
+        except Exception as e:
+            logger.error(f"Error reading changes for user {user_id}: {str(e)}")
+            raise
+
+        current = user.get("sync_version", 0)
+        reset = {"version": current, "changes": [], "reset": True}
+        if version > current or len(changes) > TransactionChange.FEED_LIMIT:
+            return reset
+
+        now = datetime.now()
+
+        def in_flight(at):
+            return at is not None and (now - at).total_seconds() < TransactionChange.GAP_SECONDS
+
+        result = []
+        for change in changes:
+            if change["version"] != version + 1:
+                if not in_flight(change["at"]):
+                    return reset
+                break
+            if change["op"] == "reset":
+                return reset
+            result.append({key: change[key] for key in ("version", "op", "transaction", "deltas")})
+            version = change["version"]
+        else:
+            # Versions handed out but not logged: either still being written or lost
+            if version < current and not in_flight(user.get("synced_at")):
+                return reset
+        return {"version": version, "changes": result, "reset": False}
+
+class Dashboard:
+    """Everything the dashboard renders on load, in one response.
+
+    The first transaction page and the monthly and category charts are
+    independent reads, so the charts run on a small per-process thread pool
+    while the request thread fetches the page: the request costs the slowest
+    of the three queries rather than their sum.
+    """
+    THREADS = 8
+    _executor = None
+    _pid = None
+    _lock = Lock()
+
+    @staticmethod
+    def _get_executor():
+        with Dashboard._lock:
+            # Threads don't survive a fork (e.g. gunicorn --preload)
+            if Dashboard._executor is None or Dashboard._pid != os.getpid():
+                Dashboard._executor = ThreadPoolExecutor(Dashboard.THREADS, thread_name_prefix="dashboard")
+                Dashboard._pid = os.getpid()
+            return Dashboard._executor
+
+    @staticmethod
+    def load(user_id, limit, filters=None, top=6):
+        """Returns {transactions, next_cursor, charts: {monthly, categories}, version}.
+
+        version is the user's sync version read before the data, for the
+        client to follow TransactionChange.since from.
+        """
+        try:
+            version = TransactionChange.current_version(user_id)
+            executor = Dashboard._get_executor()
+            monthly = executor.submit(TransactionRollup.chart, "monthly", user_id, filters)
+            categories = executor.submit(TransactionRollup.chart, "categories", user_id, filters, top)
+            transactions, next_cursor = Transaction.get_page(user_id, limit, None, filters)
+            return {
+                "transactions": transactions,
+                "next_cursor": next_cursor,
+                "charts": {
+                    "monthly": monthly.result(),
+                    "categories": categories.result()
+                },
+                "version": version
+            }
+        except Exception as e:
+            logger.error(f"Error loading dashboard for user {user_id}: {str(e)}")
+            raise
+
 class Category:
     def __init__(self, user_id, name, type):
         self.user_id = user_id
@@ -0,0 +1,365 @@
+"""Request, MongoDB command and connection-pool metrics.
+
+PoolMetrics and CommandMetrics are registered as pymongo event listeners in
+create_app; RequestTiming hooks into Flask's request cycle.
+
+- PoolMetrics times how long request threads wait to check a connection out
+  of the pool, which is the number to watch when sizing MONGO_MAX_POOL_SIZE
+  against the gunicorn worker/thread count: steady waits mean the pool is too
+  small, timeouts mean requests are failing fast instead of hanging.
+- CommandMetrics records the duration and documents returned of every
+  command per (command, collection), and logs commands slower than
+  SLOW_QUERY_MS with the shape of their filter or pipeline.
+- RequestTiming times each request per endpoint, adds a Server-Timing header
+  splitting it into handler and MongoDB time, and logs requests slower than
+  SLOW_REQUEST_MS with the commands they ran.
+
+All three are per worker process and are served in Prometheus' text format
+by GET /metrics.
+"""
+from bisect import bisect_left
+from threading import Lock, local
+import logging
+import time
+
+from flask import current_app, g, request
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the checkout-wait histogram buckets
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000)
+# Upper bounds (seconds) of the request and command duration histograms
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _labels(pairs):
+    """Prometheus label set, e.g. {command="find",collection="users"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in pairs]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _histogram_lines(name, label_names, bounds, series):
+    """Exposition lines for {labels: [count per bucket..., overflow, sum]}"""
+    lines = []
+    for labels, counts in sorted(series.items()):
+        pairs = list(zip(label_names, labels))
+        cumulative = 0
+        for bound, count in zip(bounds, counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(pairs + [('le', bound)])} {cumulative}")
+        cumulative += counts[len(bounds)]
+        lines.append(f"{name}_bucket{_labels(pairs + [('le', '+Inf')])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(pairs)} {counts[-1]:.6f}")
+        lines.append(f"{name}_count{_labels(pairs)} {cumulative}")
+    return lines
+
+
+def _observe(series, labels, bounds, value):
+    counts = series.setdefault(labels, [0] * (len(bounds) + 1) + [0.0])
+    counts[bisect_left(bounds, value)] += 1
+    counts[-1] += value
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = Lock()
+        # A checkout starts and finishes on the thread that asked for it
+        self._started = local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.wait_total_ms = 0.0
+            self.wait_max_ms = 0.0
+            self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+            self.timeouts = 0
+            self.failures = 0
+            self.in_use = 0
+            self.open = 0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_avg_ms": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+                "wait_buckets_ms": {
+                    **{f"le_{bound}": count for bound, count in zip(WAIT_BUCKETS_MS, self.wait_buckets)},
+                    "inf": self.wait_buckets[-1]
+                },
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+                "in_use": self.in_use,
+                "open": self.open
+            }
+
+    def prometheus_lines(self):
+        with self._lock:
+            buckets = [bound / 1000 for bound in WAIT_BUCKETS_MS]
+            series = {(): self.wait_buckets + [self.wait_total_ms / 1000]}
+            lines = [
+                "# HELP mongodb_pool_checkout_wait_seconds Time waited for a pooled connection.",
+                "# TYPE mongodb_pool_checkout_wait_seconds histogram",
+                *_histogram_lines("mongodb_pool_checkout_wait_seconds", (), buckets, series),
+                "# HELP mongodb_pool_checkout_timeouts_total Checkouts that hit waitQueueTimeoutMS.",
+                "# TYPE mongodb_pool_checkout_timeouts_total counter",
+                f"mongodb_pool_checkout_timeouts_total {self.timeouts}",
+                "# HELP mongodb_pool_checkout_failures_total Checkouts failed for other reasons.",
+                "# TYPE mongodb_pool_checkout_failures_total counter",
+                f"mongodb_pool_checkout_failures_total {self.failures}",
+                "# HELP mongodb_pool_connections Pooled connections by state.",
+                "# TYPE mongodb_pool_connections gauge",
+                f'mongodb_pool_connections{{state="in_use"}} {self.in_use}',
+                f'mongodb_pool_connections{{state="open"}} {self.open}',
+            ]
+        return lines
+
+    def _elapsed_ms(self):
+        started = getattr(self._started, "value", None)
+        self._started.value = None
+        return (time.perf_counter() - started) * 1000 if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._started.value = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._elapsed_ms()
+        bucket = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited <= bound), len(WAIT_BUCKETS_MS))
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_total_ms += waited
+            self.wait_max_ms = max(self.wait_max_ms, waited)
+            self.wait_buckets[bucket] += 1
+
+    def connection_check_out_failed(self, event):
+        self._elapsed_ms()
+        with self._lock:
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.timeouts += 1
+            else:
+                self.failures += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+
+def _collection(command, name):
+    """The collection a command targets, or "" for database-level commands"""
+    if name == "getMore":
+        return command.get("collection", "")
+    target = command.get(name)
+    return target if isinstance(target, str) else ""
+
+
+def _shape(command, name):
+    """Field names and stages of a command's filter or pipeline, without values"""
+    if name == "aggregate":
+        stages = []
+        for stage in command.get("pipeline", []):
+            operator = next(iter(stage), "")
+            if operator == "$match":
+                operator += "{" + ",".join(stage[operator]) + "}"
+            stages.append(operator)
+        return f"pipeline=[{', '.join(stages)}]"
+    parts = []
+    for key in ("filter", "q", "query", "sort"):
+        if isinstance(command.get(key), dict):
+            parts.append(f"{key}={{{','.join(command[key])}}}")
+    for statement in command.get("updates", command.get("deletes", []))[:1]:
+        parts.append(f"q={{{','.join(statement.get('q', {}))}}}")
+    return " ".join(parts)
+
+
+def _returned(reply):
+    """Documents a command returned (cursor batches) or wrote/counted (n)"""
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    n = reply.get("n", 0)
+    return n if isinstance(n, int) else 0
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Per (command, collection) durations and documents returned.
+
+    The driver publishes started/succeeded on the thread running the command,
+    so commands are also summed per thread: RequestTiming reads that to split
+    a request's time between the handler and MongoDB. Commands a request
+    hands to another thread (the dashboard's chart pool) count here but not
+    towards the request.
+    """
+    # Connection and session housekeeping, not application queries
+    IGNORED = {"hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue"}
+
+    def __init__(self, slow_ms=100):
+        self.slow_ms = slow_ms
+        self._lock = Lock()
+        self._pending = {}
+        self._request = local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations = {}
+            self.returned = {}
+            self.failures = {}
+            self.slow = {}
+
+    def begin_request(self):
+        self._request.commands = 0
+        self._request.ms = 0.0
+
+    def request_totals(self):
+        """(commands, milliseconds) run on this thread since begin_request"""
+        return getattr(self._request, "commands", 0), getattr(self._request, "ms", 0.0)
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = event.command
+
+    def _finish(self, event, returned=0, failed=False):
+        with self._lock:
+            command = self._pending.pop((event.connection_id, event.request_id), None)
+            if command is None:
+                return
+            name = event.command_name
+            key = (name, _collection(command, name))
+            ms = event.duration_micros / 1000
+            _observe(self.durations, key, DURATION_BUCKETS, ms / 1000)
+            self.returned[key] = self.returned.get(key, 0) + returned
+            if failed:
+                self.failures[key] = self.failures.get(key, 0) + 1
+            slow = ms >= self.slow_ms
+            if slow:
+                self.slow[key] = self.slow.get(key, 0) + 1
+        if hasattr(self._request, "commands"):
+            self._request.commands += 1
+            self._request.ms += ms
+        if slow:
+            logger.warning(
+                f"Slow MongoDB {name} on {key[1] or event.database_name}: {ms:.1f} ms, "
+                f"{returned} docs returned, {_shape(command, name)}"
+            )
+
+    def succeeded(self, event):
+        self._finish(event, returned=_returned(event.reply))
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def prometheus_lines(self):
+        with self._lock:
+            label_names = ("command", "collection")
+            lines = [
+                "# HELP mongodb_command_duration_seconds MongoDB command round-trip time.",
+                "# TYPE mongodb_command_duration_seconds histogram",
+                *_histogram_lines("mongodb_command_duration_seconds", label_names, DURATION_BUCKETS, self.durations),
+            ]
+            for name, help_text, counter in (
+                ("mongodb_command_documents_returned_total", "Documents returned, or written for writes.", self.returned),
+                ("mongodb_command_failures_total", "Commands the server or network failed.", self.failures),
+                ("mongodb_slow_commands_total", "Commands slower than SLOW_QUERY_MS.", self.slow),
+            ):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(zip(label_names, key))} {value}" for key, value in sorted(counter.items())]
+        return lines
+
+
+class RequestMetrics:
+    """Request counts and durations per (method, endpoint, status)"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.durations = {}
+
+    def observe(self, method, endpoint, status, seconds):
+        with self._lock:
+            _observe(self.durations, (method, endpoint, str(status)), DURATION_BUCKETS, seconds)
+
+    def prometheus_lines(self):
+        with self._lock:
+            return [
+                "# HELP http_request_duration_seconds Time from request start to the response object.",
+                "# TYPE http_request_duration_seconds histogram",
+                *_histogram_lines(
+                    "http_request_duration_seconds", ("method", "endpoint", "status"), DURATION_BUCKETS, self.durations
+                ),
+            ]
+
+
+class RequestTiming:
+    """Flask hooks timing every request and attributing its MongoDB time.
+
+    Streamed responses (the export) are timed up to the first byte, since
+    after_request runs before the body is generated.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', 1000)
+        app.extensions['request_metrics'] = RequestMetrics()
+        app.before_request(self._before)
+        app.after_request(self._after)
+
+    @staticmethod
+    def _before():
+        g.request_started = time.perf_counter()
+        current_app.extensions['mongo_command_metrics'].begin_request()
+
+    @staticmethod
+    def _after(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        commands, db_ms = current_app.extensions['mongo_command_metrics'].request_totals()
+        # Unmatched URLs share one label so 404 scans can't grow the series
+        endpoint = request.endpoint or "unmatched"
+        current_app.extensions['request_metrics'].observe(
+            request.method, endpoint, response.status_code, elapsed_ms / 1000
+        )
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed_ms - db_ms:.1f}, db;dur={db_ms:.1f};desc="{commands} commands"'
+        )
+        if elapsed_ms >= current_app.config['SLOW_REQUEST_MS']:
+            logger.warning(
+                f"Slow request {request.method} {request.path} ({endpoint}): {elapsed_ms:.1f} ms, "
+                f"{commands} MongoDB commands taking {db_ms:.1f} ms"
+            )
+        return response
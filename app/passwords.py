@@ -0,0 +1,137 @@
+"""Password hashing with a configurable cost, run off the request thread.
+
+Hashes are produced by Werkzeug with PASSWORD_HASH_METHOD and
+PASSWORD_SALT_LENGTH. Both hashing and verification are CPU-bound, so they run
+in a pool of PASSWORD_HASH_WORKERS processes: a burst of sign-ins occupies
+those cores while request threads wait on the result without holding the GIL,
+and the rest of the API keeps being served. At most PASSWORD_HASH_QUEUE hashes
+wait for a free worker; past that (or after PASSWORD_HASH_TIMEOUT seconds)
+HasherBusy is raised so a login storm sheds load instead of piling up. A slot
+is only freed once its hash leaves the pool: a timed-out hash still queued is
+cancelled, and one already running holds its slot until it finishes.
+PASSWORD_HASH_WORKERS=0 hashes inline on the request thread.
+
+Stored hashes made with other parameters still verify; needs_rehash() lets
+User.login replace them with one made with the current parameters.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from threading import BoundedSemaphore, Lock
+import multiprocessing
+import os
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Every hashing slot is taken; the caller should ask the client to retry"""
+
+
+class HashPool:
+    """Bounded process pool for hash calls, created lazily in each process"""
+
+    def __init__(self, workers, queue=0, timeout=None):
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(workers + queue)
+        self._executor = None
+        self._pid = None
+        self._lock = Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            # A pool inherited through fork (e.g. gunicorn --preload) is unusable
+            if self._executor is None or self._pid != os.getpid():
+                # Forking a multithreaded process (gthread workers) can copy held locks
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context("forkserver")
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, func, *args):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy("Too many password hashes in flight")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(self.timeout)
+        except FutureTimeoutError as e:
+            future.cancel()
+            raise HasherBusy("Timed out waiting for a password hash") from e
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class _HasherState:
+    def __init__(self, method, salt_length, pool):
+        self.method = method
+        self.salt_length = salt_length
+        self.pool = pool
+        self.prefix = None
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        app.config.setdefault('PASSWORD_HASH_WORKERS', 2)
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 64)
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+
+        workers = app.config['PASSWORD_HASH_WORKERS']
+        if workers < 0:
+            raise ValueError("PASSWORD_HASH_WORKERS must not be negative")
+        pool = HashPool(workers, app.config['PASSWORD_HASH_QUEUE'], app.config['PASSWORD_HASH_TIMEOUT']) if workers else None
+        app.extensions['password_hasher'] = _HasherState(
+            app.config['PASSWORD_HASH_METHOD'],
+            app.config['PASSWORD_SALT_LENGTH'],
+            pool
+        )
+
+    @property
+    def state(self):
+        if not has_app_context():
+            return None
+        return current_app.extensions.get('password_hasher')
+
+    def _run(self, func, *args):
+        state = self.state
+        if state is None or state.pool is None:
+            return func(*args)
+        return state.pool.run(func, *args)
+
+    def hash(self, password):
+        """Hash a password with the configured method; Werkzeug defaults outside an app"""
+        state = self.state
+        if state is None:
+            return generate_password_hash(password)
+        return self._run(generate_password_hash, password, state.method, state.salt_length)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made with other parameters than the configured ones"""
+        state = self.state
+        if state is None or password_hash.count('$') < 2:
+            return False
+        if state.prefix is None:
+            # Werkzeug expands short names ("scrypt", "pbkdf2") in the stored hash;
+            # hash once inline to learn the exact prefix it writes
+            state.prefix = generate_password_hash('', state.method, 1).split('$', 1)[0]
+        method, salt, _ = password_hash.split('$', 2)
+        return method != state.prefix or len(salt) != state.salt_length
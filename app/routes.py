@@ -1,12 +1,21 @@
-from flask import Blueprint, request, jsonify, current_app, render_template, send_from_directory, redirect, url_for, session
-from app.models import User, Transaction
-from app import mongo
+from flask import Blueprint, request, jsonify, current_app, render_template, redirect, url_for, session, Response, stream_with_context
+from app.models import User, Transaction, TransactionRollup, TransactionChange, Dashboard, BulkImportError
+from app.passwords import HasherBusy
+from app import mongo, cache, columnar, analytics
+from app.assets import send_asset
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
+import csv
+import io
 import logging
+import math
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from functools import wraps
+from itertools import islice
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 logger = logging.getLogger(__name__)
 
@@ -55,6 +64,9 @@ def login():
                 session['username'] = user.get('name', email.split('@')[0])
                 return redirect(url_for('main.dashboard'))
             return render_template('login.html', error="Invalid email or password")
+        except HasherBusy as e:
+            logger.warning(f"Login shed under load: {str(e)}")
+            return render_template('login.html', error="Too many sign-ins right now. Please try again in a moment."), 503
         except Exception as e:
             return render_template('login.html', error="An error occurred. Please try again.")
     
@@ -79,15 +91,17 @@ def register():
             return render_template('register.html', error="Passwords do not match")
         
         try:
-            if User.get_by_email(email):
-                return render_template('register.html', error="Email already registered")
-            
             user = User.create(username, email, password)
             if user:
                 session['user_id'] = str(user['_id'])
                 session['username'] = username
                 return redirect(url_for('main.dashboard'))
-            return render_template('register.html', error="Failed to create account")
+            return render_template('register.html', error="Email already registered")
+        except ValueError as e:
+            return render_template('register.html', error=str(e))
+        except HasherBusy as e:
+            logger.warning(f"Registration shed under load: {str(e)}")
+            return render_template('register.html', error="Too many sign-ins right now. Please try again in a moment."), 503
         except Exception as e:
             logger.error(f"Registration error: {str(e)}")
             return render_template('register.html', error="An error occurred. Please try again.")
@@ -119,28 +133,135 @@ def health_check():
             "database": "disconnected"
         })
 
+@main_bp.route('/api/health/pool')
+def pool_metrics():
+    """Connection-pool checkout waits for this worker process"""
+    return jsonify(current_app.extensions['mongo_pool_metrics'].snapshot())
+
+@main_bp.route('/metrics')
+def metrics():
+    """This worker's request, MongoDB command and pool metrics for Prometheus"""
+    extensions = current_app.extensions
+    lines = []
+    for name in ('request_metrics', 'mongo_command_metrics', 'mongo_pool_metrics'):
+        lines += extensions[name].prometheus_lines()
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+def parse_filter_date(value, end=False, tz='UTC'):
+    """Parse YYYY-MM-DD or a full ISO timestamp; a bare `to` date covers that whole day.
+
+    Returns a naive local time in tz (UTC, like the stored dates, unless a
+    bucketed route passes its tz); a timestamp with an offset is converted.
+    """
+    date = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        date += timedelta(days=1)
+    if date.tzinfo is not None:
+        date = date.astimezone(ZoneInfo(tz)).replace(tzinfo=None)
+    return date
+
+def parse_transaction_filters(args, tz='UTC'):
+    """Read from/to/category/type/min_amount/max_amount query parameters"""
+    filters = {}
+    if args.get('from'):
+        filters['date_from'] = parse_filter_date(args['from'], tz=tz)
+    if args.get('to'):
+        filters['date_to'] = parse_filter_date(args['to'], end=True, tz=tz)
+    categories = [category for category in args.getlist('category') if category]
+    if categories:
+        filters['categories'] = categories
+    if args.get('type'):
+        if args['type'] not in TRANSACTION_TYPES:
+            raise ValueError(f"Invalid type: {args['type']}")
+        filters['type'] = args['type']
+    for key in ('min_amount', 'max_amount'):
+        if args.get(key) not in (None, ''):
+            amount = float(args[key])
+            if not math.isfinite(amount):
+                raise ValueError(f"{key} must be a finite number")
+            filters[key] = abs(amount)
+    return filters
+
+def parse_page_args(args, config):
+    """Read limit/after query parameters as (limit, decoded cursor or None)"""
+    limit = int(args.get('limit', config['TRANSACTIONS_PAGE_SIZE']))
+    if limit < 1:
+        raise ValueError("limit must be a positive integer")
+    limit = min(limit, config['TRANSACTIONS_PAGE_MAX'])
+    after = args.get('after')
+    return limit, Transaction.decode_cursor(after) if after else None
+
+CHARTS = ('monthly', 'categories')
+# Upper bound for ?top=, so a chart stays a chart
+CHART_TOP_MAX = 50
+
+def parse_chart_top(args, config):
+    """Read the top query parameter: how many categories get their own slice"""
+    top = int(args.get('top', config['CHART_TOP_CATEGORIES']))
+    if top < 1:
+        raise ValueError("top must be a positive integer")
+    return min(top, CHART_TOP_MAX)
+
+def parse_bucket_args(args, default='month'):
+    """Read bucket/tz query parameters for the monthly and balance analytics"""
+    bucket = args.get('bucket') or default
+    if bucket not in Transaction.BUCKETS:
+        raise ValueError(f"Invalid bucket: {bucket}")
+    tz = args.get('tz') or 'UTC'
+    try:
+        ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {tz}")
+    return bucket, tz
+
+def get_transactions_page():
+    """Serve GET /api/transactions?limit=&after= as a keyset-paginated page"""
+    try:
+        limit, after = parse_page_args(request.args, current_app.config)
+        filters = parse_transaction_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        transactions, next_cursor = Transaction.get_page(ObjectId(session['user_id']), limit, after, filters)
+        return jsonify({
+            'transactions': transactions,
+            'next_cursor': next_cursor
+        })
+    except Exception as e:
+        logger.error(f"Error fetching transaction page: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def parse_columnar_format(accept):
+    """The columnar type an Accept header prefers over plain JSON, or None for rows"""
+    offers = ['application/json', *columnar.ENCODERS]
+    best = parse_accept_header(accept, MIMEAccept).best_match(offers)
+    return best if best in columnar.ENCODERS else None
+
 @main_bp.route('/api/transactions', methods=['GET', 'POST'])
 @login_required
+@cache.cached
 def handle_transactions():
     if request.method == 'GET':
+        if 'limit' in request.args or 'after' in request.args:
+            return get_transactions_page()
+        try:
+            filters = parse_transaction_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        columnar_format = parse_columnar_format(request.headers.get('Accept'))
         try:
             logger.info(f"Fetching transactions for user {session['user_id']}")
-            transactions = Transaction.get_by_user(ObjectId(session['user_id']))
-            logger.info(f"Found {len(transactions)} transactions")
-            
-            formatted_transactions = []
-            for transaction in transactions:
-                formatted_transaction = {
-                    '_id': str(transaction['_id']),
-                    'description': transaction['description'],
-                    'amount': transaction['amount'],
-                    'category': transaction['category'],
-                    'type': transaction['type'],
-                    'date': transaction['date'].isoformat() if isinstance(transaction['date'], datetime) else transaction['date']
-                }
-                formatted_transactions.append(formatted_transaction)
-            
-            return jsonify(formatted_transactions)
+            if columnar_format:
+                columns = Transaction.get_columns(ObjectId(session['user_id']), filters)
+                logger.info(f"Found {columns['count']} transactions")
+                response = Response(columnar.ENCODERS[columnar_format](columns), mimetype=columnar_format)
+            else:
+                transactions = Transaction.get_serialized_by_user(ObjectId(session['user_id']), filters)
+                logger.info(f"Found {len(transactions)} transactions")
+                response = jsonify(transactions)
+            response.vary.add('Accept')
+            return response
         except Exception as e:
             logger.error(f"Error fetching transactions: {str(e)}")
             return jsonify({'error': str(e)}), 500
@@ -177,56 +298,268 @@ def handle_transactions():
             logger.error(f"Error creating transaction: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
+IMPORT_FIELDS = ['description', 'amount', 'category', 'type', 'date']
+TRANSACTION_TYPES = ('income', 'expense')
+
+def parse_import_row(row, user_id):
+    """Validate one imported row and build its transaction document"""
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object")
+    missing = [field for field in IMPORT_FIELDS if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    if row['type'] not in TRANSACTION_TYPES:
+        raise ValueError(f"Invalid type: {row['type']}")
+    for field in ('description', 'category'):
+        if not isinstance(row[field], str):
+            raise ValueError(f"{field} must be a string")
+    document = Transaction(
+        amount=row['amount'],
+        category=row['category'],
+        description=row['description'],
+        date=datetime.strptime(row['date'], '%Y-%m-%d'),
+        user_id=user_id,
+        type=row['type']
+    ).to_dict()
+    # NaN or inf would poison every rollup total it is added to
+    if not math.isfinite(document['amount']):
+        raise ValueError("amount must be a finite number")
+    return document
+
+@main_bp.route('/api/transactions/import', methods=['POST'])
+@login_required
+def import_transactions():
+    """Bulk import from a JSON array or an uploaded CSV file (field `file`)"""
+    if 'file' in request.files:
+        rows = csv.DictReader(io.TextIOWrapper(request.files['file'].stream, encoding='utf-8-sig'))
+    else:
+        rows = request.get_json(silent=True)
+        if isinstance(rows, dict):
+            rows = rows.get('transactions')
+        if not isinstance(rows, list):
+            return jsonify({'error': 'Expected a JSON array of transactions or a CSV file'}), 400
+
+    user_id = ObjectId(session['user_id'])
+    max_rows = current_app.config['IMPORT_MAX_ROWS']
+    documents = []
+    row_numbers = []
+    errors = []
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            if row_number > max_rows:
+                return jsonify({'error': f'Imports are limited to {max_rows} rows'}), 413
+            try:
+                documents.append(parse_import_row(row, user_id))
+                row_numbers.append(row_number)
+            except (ValueError, TypeError) as e:
+                errors.append({'row': row_number, 'error': str(e)})
+    except (csv.Error, UnicodeDecodeError) as e:
+        return jsonify({'error': f'Invalid CSV file: {str(e)}'}), 400
+
+    try:
+        inserted, write_errors = Transaction.bulk_create(documents, current_app.config['IMPORT_BATCH_SIZE'])
+    except BulkImportError as e:
+        # Earlier batches are committed; tell the client so it doesn't re-import them
+        response, status = handle_db_error(e.__cause__ or e)
+        return jsonify({**response.get_json(), 'inserted': e.inserted}), status
+    except Exception as e:
+        return handle_db_error(e)
+    errors.extend({'row': row_numbers[index], 'error': message} for index, message in write_errors)
+    errors.sort(key=lambda error: error['row'])
+    logger.info(f"Imported {inserted} transactions with {len(errors)} errors")
+
+    # An empty import is not a failure; only rows that all failed are
+    status = 201 if inserted else 400 if errors else 200
+    return jsonify({'inserted': inserted, 'errors': errors}), status
+
+def stream_transactions(cursor, ndjson, chunk_size):
+    """Yield a cursor as a JSON array (or NDJSON) in chunks of chunk_size rows"""
+    rows = (current_app.json.dumps(transaction) for transaction in cursor)
+    try:
+        if ndjson:
+            while chunk := list(islice(rows, chunk_size)):
+                yield '\n'.join(chunk) + '\n'
+            return
+        yield '['
+        separator = ''
+        while chunk := list(islice(rows, chunk_size)):
+            yield separator + ','.join(chunk)
+            separator = ','
+        yield ']'
+    except Exception as e:
+        # Headers are already sent, so all we can do is log and cut the stream short
+        logger.error(f"Error streaming transactions: {str(e)}")
+        raise
+
+@main_bp.route('/api/transactions/export')
+@login_required
+def export_transactions():
+    export_format = request.args.get('format', 'json')
+    if export_format not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson'}), 400
+
+    try:
+        filters = parse_transaction_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+    try:
+        cursor = Transaction.iter_by_user(ObjectId(session['user_id']), batch_size, filters)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    ndjson = export_format == 'ndjson'
+    return Response(
+        stream_with_context(stream_transactions(cursor, ndjson, batch_size)),
+        mimetype='application/x-ndjson' if ndjson else 'application/json',
+        headers={'Content-Disposition': f'attachment; filename=transactions.{export_format}'}
+    )
+
+@main_bp.route('/api/transactions/changes')
+@login_required
+def get_transaction_changes():
+    """Writes after ?since=<version>, for clients patching their view in place"""
+    try:
+        since = int(request.args.get('since', ''))
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return jsonify({'error': 'since must be a non-negative integer version'}), 400
+    try:
+        return jsonify(TransactionChange.since(ObjectId(session['user_id']), since))
+    except Exception as e:
+        return handle_db_error(e)
+
 @main_bp.route('/api/transactions/<transaction_id>', methods=['DELETE'])
 @login_required
 def delete_transaction(transaction_id):
     try:
         result = Transaction.delete(ObjectId(transaction_id), ObjectId(session['user_id']))
         if result:
-            return '', 204
+            return jsonify(result)
         return jsonify({'error': 'Transaction not found'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @main_bp.route('/api/analytics/monthly')
 @login_required
+@cache.cached
 def get_monthly_analytics():
+    """Income and expense totals per day/week/month/quarter/year, cut in the tz time zone"""
     try:
-        pipeline = [
-            {'$match': {'user_id': ObjectId(session['user_id'])}},
-            {'$group': {
-                '_id': {
-                    'year': {'$year': '$date'},
-                    'month': {'$month': '$date'}
-                },
-                'total': {'$sum': '$amount'}
-            }},
-            {'$sort': {'_id.year': 1, '_id.month': 1}}
-        ]
-        
-        result = Transaction.aggregate(pipeline)
-        return jsonify(list(result))
+        bucket, tz = parse_bucket_args(request.args)
+        filters = parse_transaction_filters(request.args, tz)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(TransactionRollup.analytics('monthly', ObjectId(session['user_id']), filters, bucket, tz))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @main_bp.route('/api/analytics/categories')
 @login_required
+@cache.cached
 def get_category_analytics():
     try:
-        pipeline = [
-            {'$match': {'user_id': ObjectId(session['user_id'])}},
-            {'$group': {
-                '_id': '$category',
-                'total': {'$sum': '$amount'}
-            }},
-            {'$sort': {'total': -1}}
-        ]
-        
-        result = Transaction.aggregate(pipeline)
-        return jsonify(list(result))
+        filters = parse_transaction_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(TransactionRollup.analytics('categories', ObjectId(session['user_id']), filters))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main_bp.route('/api/analytics/balance')
+@login_required
+@cache.cached
+def get_balance_analytics():
+    """Running balance per day (or ?bucket=), at most Transaction.MAX_BUCKETS points"""
+    try:
+        bucket, tz = parse_bucket_args(request.args, default='day')
+        filters = parse_transaction_filters(request.args, tz)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(Transaction.balance(ObjectId(session['user_id']), filters, bucket, tz))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_metric_args(args):
+    """Read window/p query parameters for the numpy analytics"""
+    params = {}
+    if args.get('window'):
+        window = int(args['window'])
+        if not 1 <= window <= 365:
+            raise ValueError("window must be between 1 and 365 days")
+        params['window'] = window
+    if args.getlist('p'):
+        points = [float(value) for value in args.getlist('p')]
+        if not all(0 <= point <= 100 for point in points):
+            raise ValueError("p must be between 0 and 100")
+        params['p'] = points
+    return params
+
+@main_bp.route('/api/analytics/<metric>')
+@login_required
+@cache.cached
+def get_metric(metric):
+    """Metrics computed over the in-memory ledger, see app/analytics.py"""
+    if metric not in analytics.METRICS:
+        return jsonify({'error': f'Unknown metric: {metric}'}), 404
+    try:
+        filters = parse_transaction_filters(request.args)
+        params = parse_metric_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(analytics.compute(metric, ObjectId(session['user_id']), filters, **params))
     except Exception as e:
+        logger.error(f"Error computing {metric}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-@main_bp.route('/<path:filename>')
-def serve_static(filename):
-    return send_from_directory('static', filename)
\ No newline at end of file
+@main_bp.route('/api/dashboard')
+@login_required
+@cache.cached
+def get_dashboard():
+    """First transaction page plus both dashboard charts in one round trip"""
+    try:
+        limit, _ = parse_page_args(request.args, current_app.config)
+        top = parse_chart_top(request.args, current_app.config)
+        filters = parse_transaction_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(Dashboard.load(ObjectId(session['user_id']), limit, filters, top))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return handle_db_error(e)
+
+@main_bp.route('/api/charts/<chart>')
+@login_required
+@cache.cached
+def get_chart(chart):
+    """Chart-ready monthly (income/expense per month) or top-N category series"""
+    if chart not in CHARTS:
+        return jsonify({'error': f'Unknown chart: {chart}'}), 404
+    try:
+        top = parse_chart_top(request.args, current_app.config)
+        filters = parse_transaction_filters(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify(TransactionRollup.chart(chart, ObjectId(session['user_id']), filters, top))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return handle_db_error(e)
+
+@main_bp.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Fingerprinted static files from the asset build, cached by browsers for good"""
+    return send_asset(filename)
\ No newline at end of file
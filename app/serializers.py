@@ -0,0 +1,125 @@
+"""Serialization of transaction documents for the JSON API.
+
+Reads go through an aggregation pipeline whose final $project stage returns
+rows already in their API shape: _id and date are converted to strings by
+MongoDB and user_id is never sent over the wire, so the routes can hand the
+rows straight to jsonify without walking them in Python.
+
+JSONProvider is the app's JSON encoder. It writes compact JSON with orjson
+when it is installed (the stdlib json module otherwise) and encodes any
+ObjectId or datetime that reaches a response the same way the pipeline
+does, so nothing needs converting by hand before jsonify.
+"""
+from datetime import date, datetime
+import json
+
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional: falls back to the json module
+    orjson = None
+
+# Same output as datetime.isoformat(), which is what the API always returned:
+# no fraction on whole seconds, otherwise microseconds (BSON keeps milliseconds)
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+DATE_FORMAT_MS = '%Y-%m-%dT%H:%M:%S.%L000'
+
+# Newest first, with _id as a tie-breaker so keyset pages are stable
+TRANSACTION_SORT = {'date': -1, '_id': -1}
+
+TRANSACTION_PROJECT_STAGE = {'$project': {
+    '_id': {'$toString': '$_id'},
+    'description': 1,
+    'amount': 1,
+    'category': 1,
+    'type': 1,
+    # Older documents may hold the date as a plain string; pass those through
+    'date': {'$cond': [
+        {'$eq': [{'$type': '$date'}, 'date']},
+        {'$cond': [
+            {'$eq': [{'$millisecond': '$date'}, 0]},
+            {'$dateToString': {'date': '$date', 'format': DATE_FORMAT}},
+            {'$dateToString': {'date': '$date', 'format': DATE_FORMAT_MS}}
+        ]},
+        '$date'
+    ]}
+}}
+
+
+def transaction_pipeline(match, limit=None):
+    """Build the pipeline returning serialized transactions matching a filter"""
+    pipeline = [{'$match': match}, {'$sort': TRANSACTION_SORT}]
+    if limit is not None:
+        pipeline.append({'$limit': limit})
+    pipeline.append(TRANSACTION_PROJECT_STAGE)
+    return pipeline
+
+
+def format_date(date):
+    """Format a datetime the same way the pipeline's $dateToString does"""
+    return date.replace(microsecond=date.microsecond // 1000 * 1000).isoformat()
+
+
+def serialize_transaction(document):
+    """Python-side equivalent of TRANSACTION_PROJECT_STAGE for a document already in hand"""
+    date = document.get('date')
+    return {
+        '_id': str(document['_id']),
+        'description': document.get('description'),
+        'amount': document.get('amount'),
+        'category': document.get('category'),
+        'type': document.get('type'),
+        'date': format_date(date) if isinstance(date, datetime) else date
+    }
+
+
+def _default(value):
+    """Encode the types JSON has no notation for"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return format_date(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    return DefaultJSONProvider.default(value)
+
+
+if orjson is not None:
+    # Datetimes go through _default so they match format_date exactly
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj, **kwargs):
+    """Compact JSON text; kwargs (indent, separators...) are those of json.dumps"""
+    # Callers asking for specific formatting (e.g. the session serializer) get the json module
+    if orjson is not None and not kwargs:
+        return encode(obj).decode()
+    kwargs.setdefault("default", _default)
+    kwargs.setdefault("separators", (",", ":"))
+    return json.dumps(obj, **kwargs)
+
+
+def encode(obj):
+    """Compact UTF-8 encoded JSON, without a round trip through str"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=ORJSON_OPTIONS)
+    return dumps(obj).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    """The app's JSON: see encode(). Keys keep their insertion order and output
+    is never indented, debug or not, since API bodies are read by the dashboard."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(encode(obj), mimetype=self.mimetype)
@@ -1,112 +1,398 @@
-// Global variables for charts
-let monthlyChart;
-let categoryChart;
-
-// Initialize the page
-document.addEventListener('DOMContentLoaded', () => {
-    // Set up event listeners
-    document.getElementById('transactionForm').addEventListener('submit', handleTransactionSubmit);
-    document.getElementById('logoutBtn').addEventListener('click', handleLogout);
-
-    // Initialize charts
-    initializeCharts();
-    
-    // Load initial data
-    loadTransactions();
+// Dashboard client. Everything is loaded with one request to /api/dashboard;
+// after that, writes are patched into the table and charts in place from the
+// POST/DELETE responses and the /api/transactions/changes feed, so an edit
+// costs one small response instead of a full reload.
+
+// Chart instances and the server-built series they draw (see app/charts.py)
+let monthlyChart = null;
+let categoryChart = null;
+let monthlySeries = { labels: [], income: [], expense: [] };
+let categorySeries = { labels: [], values: [], other: 0, other_count: 0, top: 6 };
+// The category chart shows spending; income deltas don't touch it
+const CATEGORY_CHART_TYPE = 'expense';
+
+// Every transaction loaded so far, newest first. Only the rows in view are
+// in the DOM: a pool of <tr>s is refilled as the window moves, and two spacer
+// rows stand in for everything above and below it.
+let transactions = [];
+// Cursor for the next page, null once everything is loaded
+let nextCursor = null;
+let pageLoading = null;
+// Bumped on every full reload so a page fetched for the old list is dropped
+let listGeneration = 0;
+
+// Rows rendered beyond the visible ones, so fast scrolling doesn't show gaps
+const OVERSCAN = 10;
+// Row height in px, measured from the first rendered row
+let rowHeight = 0;
+const rowPool = [];
+let topSpacer = null;
+let bottomSpacer = null;
+let renderQueued = false;
+
+// Sync version the view reflects, and the in-flight sync if there is one
+let syncVersion = null;
+let syncInFlight = null;
+
+const currency = new Intl.NumberFormat('en-US', {
+    style: 'currency',
+    currency: 'USD'
 });
 
-// Handle transaction form submission
-async function handleTransactionSubmit(event) {
-    event.preventDefault();
-    
-    const transaction = {
+// Utility functions
+function showAlert(message, type = 'success') {
+    const alertDiv = document.createElement('div');
+    alertDiv.className = `alert alert-${type} alert-dismissible fade show`;
+    alertDiv.innerHTML = `
+        ${message}
+        <button type="button" class="btn-close" data-bs-dismiss="alert"></button>
+    `;
+    document.getElementById('alertContainer').appendChild(alertDiv);
+    setTimeout(() => alertDiv.remove(), 5000);
+}
+
+function formatDate(dateString) {
+    return new Date(dateString).toLocaleDateString();
+}
+
+// Load the table and both charts with a single request
+async function loadDashboard() {
+    try {
+        const response = await fetch('/api/dashboard');
+        if (!response.ok) throw new Error('Failed to load dashboard');
+        const data = await response.json();
+        syncVersion = data.version;
+        renderTransactions(data.transactions, data.next_cursor);
+        renderCharts(data.charts);
+    } catch (error) {
+        showAlert(error.message, 'danger');
+    }
+}
+
+// Fetch the next page and append it to the list; one request at a time
+function loadMoreTransactions() {
+    if (!pageLoading) {
+        const generation = listGeneration;
+        pageLoading = (async () => {
+            try {
+                const params = new URLSearchParams({ after: nextCursor });
+                const response = await fetch(`/api/transactions?${params}`);
+                if (!response.ok) throw new Error('Failed to load transactions');
+                const page = await response.json();
+                if (generation !== listGeneration) return;
+                transactions.push(...page.transactions);
+                nextCursor = page.next_cursor;
+                scheduleRender();
+            } catch (error) {
+                showAlert(error.message, 'danger');
+            } finally {
+                pageLoading = null;
+            }
+        })();
+    }
+    return pageLoading;
+}
+
+function createSpacer() {
+    const tr = document.createElement('tr');
+    tr.className = 'spacer';
+    const td = document.createElement('td');
+    td.colSpan = 6;
+    tr.appendChild(td);
+    return tr;
+}
+
+// Write one transaction into a pooled row
+function fillRow(tr, transaction) {
+    const [date, description, category, type, amount, actions] = tr.cells;
+    date.textContent = formatDate(transaction.date);
+    description.textContent = transaction.description;
+    description.title = transaction.description;
+    category.textContent = transaction.category;
+    type.textContent = transaction.type;
+    amount.className = transaction.type === 'income' ? 'text-success' : 'text-danger';
+    amount.textContent = `${transaction.type === 'income' ? '+' : '-'}${currency.format(Math.abs(transaction.amount))}`;
+    actions.firstElementChild.dataset.delete = transaction._id;
+}
+
+function showEmptyState() {
+    document.getElementById('transactionsList').innerHTML = `
+        <tr class="empty-state">
+            <td colspan="6" class="text-center text-muted py-4">
+                No transactions found. Add your first transaction above!
+            </td>
+        </tr>
+    `;
+}
+
+// Replace the whole list, e.g. after loading the dashboard
+function renderTransactions(list, cursor) {
+    transactions = list;
+    nextCursor = cursor;
+    listGeneration++;
+    document.getElementById('transactionsViewport').scrollTop = 0;
+    renderWindow();
+}
+
+function scheduleRender() {
+    if (renderQueued) return;
+    renderQueued = true;
+    requestAnimationFrame(renderWindow);
+}
+
+// Render the rows in and around the viewport, and nothing else
+function renderWindow() {
+    renderQueued = false;
+    if (transactions.length === 0) {
+        if (nextCursor) {
+            loadMoreTransactions();
+        } else {
+            showEmptyState();
+        }
+        return;
+    }
+
+    const viewport = document.getElementById('transactionsViewport');
+    const template = document.getElementById('transactionRowTemplate');
+    topSpacer ||= createSpacer();
+    bottomSpacer ||= createSpacer();
+
+    // Until a row has been measured, estimate; the first render corrects it
+    const height = rowHeight || 50;
+    const viewportHeight = parseFloat(getComputedStyle(viewport).maxHeight) || viewport.clientHeight;
+    const first = Math.max(0, Math.floor(viewport.scrollTop / height) - OVERSCAN);
+    const last = Math.min(transactions.length, first + Math.ceil(viewportHeight / height) + 2 * OVERSCAN);
+
+    const fragment = document.createDocumentFragment();
+    topSpacer.firstChild.style.height = `${first * height}px`;
+    fragment.appendChild(topSpacer);
+    for (let i = first; i < last; i++) {
+        const tr = rowPool[i - first] ||= template.content.firstElementChild.cloneNode(true);
+        fillRow(tr, transactions[i]);
+        fragment.appendChild(tr);
+    }
+    bottomSpacer.firstChild.style.height = `${(transactions.length - last) * height}px`;
+    fragment.appendChild(bottomSpacer);
+    document.getElementById('transactionsList').replaceChildren(fragment);
+
+    if (!rowHeight && rowPool[0].offsetHeight) {
+        rowHeight = rowPool[0].offsetHeight;
+        scheduleRender();
+    }
+    // Fetch the next page before the user scrolls to the end of what's loaded
+    if (nextCursor && last + OVERSCAN >= transactions.length) loadMoreTransactions();
+}
+
+// Whether transaction a sorts after b (newest first, _id breaking ties)
+function sortsAfter(a, b) {
+    return a.date < b.date || (a.date === b.date && a._id < b._id);
+}
+
+// Put a new transaction at its place in the list; false if it was already there
+function insertTransaction(transaction) {
+    if (transactions.some(item => item._id === transaction._id)) return false;
+    const index = transactions.findIndex(item => sortsAfter(item, transaction));
+    if (index !== -1) {
+        transactions.splice(index, 0, transaction);
+    } else if (!nextCursor) {
+        transactions.push(transaction);
+    }
+    // Otherwise it belongs to a page not loaded yet and arrives with that page
+    scheduleRender();
+    return true;
+}
+
+function removeTransaction(id) {
+    const index = transactions.findIndex(item => item._id === id);
+    if (index !== -1) transactions.splice(index, 1);
+    scheduleRender();
+}
+
+function roundCents(value) {
+    return Math.round(value * 100) / 100;
+}
+
+function nextMonth(label) {
+    const [year, month] = label.split('-').map(Number);
+    return month === 12
+        ? `${String(year + 1).padStart(4, '0')}-01`
+        : `${String(year).padStart(4, '0')}-${String(month + 1).padStart(2, '0')}`;
+}
+
+// Index of a month in the monthly series, adding it (and any months between
+// it and the current range, as zeros) if it isn't there yet
+function monthIndex(label) {
+    const { labels } = monthlySeries;
+    const existing = labels.indexOf(label);
+    if (existing !== -1) return existing;
+
+    let at = labels.findIndex(item => item > label);
+    const added = [label];
+    if (labels.length && at === -1) {
+        added.length = 0;
+        for (let month = nextMonth(labels[labels.length - 1]); month <= label; month = nextMonth(month)) {
+            added.push(month);
+        }
+        at = labels.length;
+    } else if (at === 0) {
+        for (let month = nextMonth(label); month < labels[0]; month = nextMonth(month)) added.push(month);
+    } else if (at === -1) {
+        at = 0;
+    }
+    labels.splice(at, 0, ...added);
+    monthlySeries.income.splice(at, 0, ...added.map(() => 0));
+    monthlySeries.expense.splice(at, 0, ...added.map(() => 0));
+    return labels.indexOf(label);
+}
+
+// Move both charts by a write's deltas. Amounts are signed (expenses are
+// negative); the series hold magnitudes.
+function applyDeltas(deltas) {
+    if (!deltas) return;
+    const magnitude = total => (deltas.type === 'expense' ? -total : total);
+
+    const { period, year, month } = deltas.monthly._id;
+    // Changes logged before deltas carried the period name the year and month
+    const index = monthIndex(period
+        ? period.slice(0, 7)
+        : `${String(year).padStart(4, '0')}-${String(month).padStart(2, '0')}`);
+    const series = deltas.type === 'income' ? monthlySeries.income : monthlySeries.expense;
+    series[index] = roundCents(series[index] + magnitude(deltas.monthly.total));
+
+    if (deltas.type !== CATEGORY_CHART_TYPE) return;
+    const name = deltas.categories._id;
+    const change = magnitude(deltas.categories.total);
+    const { labels, values } = categorySeries;
+    const at = labels.indexOf(name);
+    if (at !== -1) {
+        values[at] = roundCents(values[at] + change);
+    } else if (categorySeries.other_count === 0 && labels.length < categorySeries.top) {
+        labels.push(name);
+        values.push(roundCents(change));
+    } else {
+        // Re-ranking waits for the next full load
+        categorySeries.other = roundCents(categorySeries.other + change);
+        categorySeries.other_count = Math.max(categorySeries.other_count, 1);
+    }
+    const slices = labels.map((label, i) => [label, values[i]])
+        .filter(([, value]) => Math.abs(value) >= 0.005)
+        .sort((a, b) => b[1] - a[1]);
+    categorySeries.labels = slices.map(([label]) => label);
+    categorySeries.values = slices.map(([, value]) => value);
+}
+
+// Patch one change (from a write response or the feed) into the view
+function applyChange(change) {
+    if (change.op === 'insert') {
+        // Already shown means the dashboard load already counted it
+        if (insertTransaction(change.transaction)) applyDeltas(change.deltas);
+    } else if (change.op === 'delete') {
+        removeTransaction(change.transaction._id);
+        applyDeltas(change.deltas);
+    }
+}
+
+// Apply the response to our own write, or catch up through the feed if
+// another tab or device wrote in between
+function applyOwnChange(op, result) {
+    if (result.version === null || syncVersion === null) {
+        return loadDashboard();
+    }
+    if (result.version !== syncVersion + 1) {
+        return syncChanges();
+    }
+    applyChange({ op, transaction: result.transaction || { _id: result._id }, deltas: result.deltas });
+    syncVersion = result.version;
+    updateCharts();
+}
+
+// Fetch and apply every change since syncVersion
+function syncChanges() {
+    if (syncVersion === null) return Promise.resolve();
+    if (!syncInFlight) {
+        syncInFlight = (async () => {
+            try {
+                const response = await fetch(`/api/transactions/changes?since=${syncVersion}`);
+                if (!response.ok) throw new Error('Failed to sync transactions');
+                const data = await response.json();
+                if (data.reset) {
+                    await loadDashboard();
+                    return;
+                }
+                data.changes.forEach(applyChange);
+                syncVersion = data.version;
+                updateCharts();
+            } catch (error) {
+                showAlert(error.message, 'danger');
+            } finally {
+                syncInFlight = null;
+            }
+        })();
+    }
+    return syncInFlight;
+}
+
+// Add new transaction
+async function handleTransactionSubmit(e) {
+    e.preventDefault();
+    const formData = {
+        description: document.getElementById('description').value,
         amount: parseFloat(document.getElementById('amount').value),
         category: document.getElementById('category').value,
-        description: document.getElementById('description').value,
         type: document.getElementById('type').value,
-        user_id: sessionStorage.getItem('user_id')
+        date: document.getElementById('date').value
     };
 
     try {
         const response = await fetch('/api/transactions', {
             method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify(transaction)
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(formData)
         });
 
-        if (!response.ok) {
-            throw new Error('Failed to add transaction');
-        }
+        if (!response.ok) throw new Error('Failed to add transaction');
 
-        // Reset form and reload data
-        event.target.reset();
-        await loadTransactions();
-        showAlert('Transaction added successfully!', 'success');
+        showAlert('Transaction added successfully');
+        e.target.reset();
+        await applyOwnChange('insert', await response.json());
     } catch (error) {
         showAlert(error.message, 'danger');
     }
 }
 
-// Load transactions from the server
-async function loadTransactions() {
+// Delete transaction
+async function deleteTransaction(id) {
+    if (!confirm('Are you sure you want to delete this transaction?')) return;
+
     try {
-        const response = await fetch(`/api/transactions/user/${sessionStorage.getItem('user_id')}`);
-        if (!response.ok) {
-            throw new Error('Failed to load transactions');
-        }
+        const response = await fetch(`/api/transactions/${id}`, {
+            method: 'DELETE'
+        });
 
-        const transactions = await response.json();
-        displayTransactions(transactions);
-        updateCharts(transactions);
+        if (!response.ok) throw new Error('Failed to delete transaction');
+
+        showAlert('Transaction deleted successfully');
+        await applyOwnChange('delete', await response.json());
     } catch (error) {
         showAlert(error.message, 'danger');
     }
 }
 
-// Display transactions in the table
-function displayTransactions(transactions) {
-    const tbody = document.getElementById('transactionsList');
-    tbody.innerHTML = '';
-
-    transactions.forEach(transaction => {
-        const row = document.createElement('tr');
-        row.innerHTML = `
-            <td>${new Date(transaction.date).toLocaleDateString()}</td>
-            <td>${transaction.category}</td>
-            <td>${transaction.description}</td>
-            <td class="${transaction.type === 'income' ? 'text-success' : 'text-danger'}">
-                ${transaction.type === 'income' ? '+' : '-'}$${Math.abs(transaction.amount).toFixed(2)}
-            </td>
-            <td>
-                <button class="btn btn-sm btn-danger" onclick="deleteTransaction('${transaction._id}')">
-                    Delete
-                </button>
-            </td>
-        `;
-        tbody.appendChild(row);
-    });
-}
-
-// Initialize charts
+// Create both charts once; later updates only swap their data
 function initializeCharts() {
-    const monthlyCtx = document.getElementById('monthlyChart').getContext('2d');
-    const categoryCtx = document.getElementById('categoryChart').getContext('2d');
-
-    monthlyChart = new Chart(monthlyCtx, {
+    monthlyChart = new Chart(document.getElementById('monthlyChart'), {
         type: 'line',
         data: {
             labels: [],
             datasets: [{
-                label: 'Expenses',
+                label: 'Income',
                 data: [],
-                borderColor: 'rgb(255, 99, 132)',
+                borderColor: 'rgb(75, 192, 192)',
                 tension: 0.1
             }, {
-                label: 'Income',
+                label: 'Expenses',
                 data: [],
-                borderColor: 'rgb(75, 192, 192)',
+                borderColor: 'rgb(255, 99, 132)',
                 tension: 0.1
             }]
         },
@@ -114,13 +400,23 @@ function initializeCharts() {
             responsive: true,
             scales: {
                 y: {
-                    beginAtZero: true
+                    beginAtZero: true,
+                    ticks: {
+                        callback: value => currency.format(value)
+                    }
+                }
+            },
+            plugins: {
+                tooltip: {
+                    callbacks: {
+                        label: context => `${context.dataset.label}: ${currency.format(context.raw)}`
+                    }
                 }
             }
         }
     });
 
-    categoryChart = new Chart(categoryCtx, {
+    categoryChart = new Chart(document.getElementById('categoryChart'), {
         type: 'doughnut',
         data: {
             labels: [],
@@ -133,114 +429,57 @@ function initializeCharts() {
                     '#4BC0C0',
                     '#9966FF',
                     '#FF9F40',
-                    '#FF6384'
+                    '#C9CBCF'
                 ]
             }]
         },
         options: {
-            responsive: true
-        }
-    });
-}
-
-// Update charts with transaction data
-function updateCharts(transactions) {
-    // Process data for monthly chart
-    const monthlyData = processMonthlyData(transactions);
-    monthlyChart.data.labels = monthlyData.labels;
-    monthlyChart.data.datasets[0].data = monthlyData.expenses;
-    monthlyChart.data.datasets[1].data = monthlyData.income;
-    monthlyChart.update();
-
-    // Process data for category chart
-    const categoryData = processCategoryData(transactions);
-    categoryChart.data.labels = categoryData.labels;
-    categoryChart.data.datasets[0].data = categoryData.values;
-    categoryChart.update();
-}
-
-// Process transaction data for monthly chart
-function processMonthlyData(transactions) {
-    const months = {};
-    const labels = [];
-    const expenses = [];
-    const income = [];
-
-    transactions.forEach(transaction => {
-        const date = new Date(transaction.date);
-        const monthYear = date.toLocaleString('default', { month: 'short', year: 'numeric' });
-        
-        if (!months[monthYear]) {
-            months[monthYear] = { expenses: 0, income: 0 };
-            labels.push(monthYear);
-        }
-
-        if (transaction.type === 'expense') {
-            months[monthYear].expenses += transaction.amount;
-        } else {
-            months[monthYear].income += transaction.amount;
-        }
-    });
-
-    labels.forEach(month => {
-        expenses.push(months[month].expenses);
-        income.push(months[month].income);
-    });
-
-    return { labels, expenses, income };
-}
-
-// Process transaction data for category chart
-function processCategoryData(transactions) {
-    const categories = {};
-    
-    transactions.forEach(transaction => {
-        if (transaction.type === 'expense') {
-            if (!categories[transaction.category]) {
-                categories[transaction.category] = 0;
+            responsive: true,
+            plugins: {
+                legend: {
+                    position: 'right'
+                },
+                tooltip: {
+                    callbacks: {
+                        label: context => `${context.label}: ${currency.format(context.raw)}`
+                    }
+                }
             }
-            categories[transaction.category] += transaction.amount;
         }
     });
-
-    return {
-        labels: Object.keys(categories),
-        values: Object.values(categories)
-    };
 }
 
-// Delete a transaction
-async function deleteTransaction(transactionId) {
-    try {
-        const response = await fetch(`/api/transactions/${transactionId}`, {
-            method: 'DELETE'
-        });
+// Draw both charts from the dashboard's series
+function renderCharts(charts) {
+    monthlySeries = charts.monthly;
+    categorySeries = charts.categories;
+    updateCharts();
+}
 
-        if (!response.ok) {
-            throw new Error('Failed to delete transaction');
-        }
+function updateCharts() {
+    if (!monthlyChart) initializeCharts();
 
-        await loadTransactions();
-        showAlert('Transaction deleted successfully!', 'success');
-    } catch (error) {
-        showAlert(error.message, 'danger');
-    }
-}
+    monthlyChart.data.labels = monthlySeries.labels;
+    monthlyChart.data.datasets[0].data = monthlySeries.income;
+    monthlyChart.data.datasets[1].data = monthlySeries.expense;
+    monthlyChart.update();
 
-// Handle logout
-function handleLogout() {
-    sessionStorage.removeItem('user_id');
-    window.location.href = '/login';
+    const hasOther = categorySeries.other_count > 0 && categorySeries.other > 0;
+    categoryChart.data.labels = hasOther ? [...categorySeries.labels, 'Other'] : categorySeries.labels;
+    categoryChart.data.datasets[0].data = hasOther ? [...categorySeries.values, categorySeries.other] : categorySeries.values;
+    categoryChart.update();
 }
 
-// Show alert message
-function showAlert(message, type) {
-    const alertElement = document.getElementById('errorAlert');
-    alertElement.textContent = message;
-    alertElement.className = `alert alert-${type}`;
-    alertElement.classList.remove('d-none');
-
-    setTimeout(() => {
-        alertElement.classList.add('d-none');
-    }, 3000);
-} 
\ No newline at end of file
+// Initialize dashboard
+document.getElementById('transactionForm').addEventListener('submit', handleTransactionSubmit);
+document.getElementById('transactionsViewport').addEventListener('scroll', scheduleRender, { passive: true });
+window.addEventListener('resize', scheduleRender);
+document.getElementById('transactionsList').addEventListener('click', e => {
+    const button = e.target.closest('[data-delete]');
+    if (button) deleteTransaction(button.dataset.delete);
+});
+// Pick up writes made in other tabs or devices when this one comes back into view
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState === 'visible') syncChanges();
+});
+document.addEventListener('DOMContentLoaded', loadDashboard);
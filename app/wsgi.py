@@ -1,8 +1,20 @@
-from app import create_app
+"""WSGI entry point.
+
+Production serves this with gunicorn and app/gunicorn_conf.py:
+
+    gunicorn -c python:app.gunicorn_conf app.wsgi:app
 
-app = create_app()
-app.config['DEBUG'] = True
-app.config['TEMPLATES_AUTO_RELOAD'] = True
+which always runs with debug and template auto-reload off. Running the module
+directly starts Flask's development server instead, with debug on unless
+FLASK_DEBUG=0.
+"""
+import os
+
+from app import create_app
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    debug = os.environ.get("FLASK_DEBUG", "1") != "0"
+    app = create_app(debug=debug)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 8000)), debug=debug)
+else:
+    app = create_app(debug=False)
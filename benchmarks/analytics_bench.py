@@ -0,0 +1,144 @@
+"""The numpy analytics (app/analytics.py) against equivalent aggregation pipelines.
+
+Seeds one user with --transactions expenses and incomes in a scratch
+database, then times every metric three ways, --repeat times each:
+
+- pipeline: the metric as a MongoDB aggregation ($densify/$setWindowFields,
+  $percentile, $group), what each one would cost as a dedicated endpoint
+- cold: reading the ledger into numpy and computing the metric, the first
+  request after the user's data changes
+- warm: computing from a ledger already in memory, every later request
+  until it changes
+
+$densify needs MongoDB 5.1 and $percentile 7.0; pipelines the server
+rejects are reported as unsupported.
+
+    PYTHONPATH=. python benchmarks/analytics_bench.py --mongo mongodb://localhost:27017/analytics_bench \\
+        [--transactions 50000] [--repeat 20] [--window 30]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+from pymongo.uri_parser import parse_uri
+
+from app.analytics import DEFAULT_PERCENTILES, MAX_POINTS, METRICS, Ledger, ledger_pipeline
+
+CATEGORIES = ["Food", "Transportation", "Entertainment", "Shopping", "Bills", "Other"]
+# Seeded dates end here rather than today, so runs are comparable over time
+SEED_END = datetime(2024, 12, 31)
+
+
+def seed(db, user_id, transactions, rng_seed):
+    rng = random.Random(rng_seed)
+    db.transactions.drop()
+    db.transactions.create_index([("user_id", 1), ("date", -1), ("_id", -1)])
+    documents = []
+    for _ in range(transactions):
+        kind = "income" if rng.random() < 0.2 else "expense"
+        amount = round(rng.uniform(5, 500), 2)
+        documents.append({
+            "user_id": user_id,
+            "description": f"Bench {kind}",
+            "amount": amount if kind == "income" else -amount,
+            "category": rng.choice(CATEGORIES),
+            "type": kind,
+            "date": SEED_END - timedelta(minutes=rng.randrange(3 * 365 * 24 * 60)),
+        })
+    db.transactions.insert_many(documents)
+
+
+def pipelines(user_id, window, through):
+    expenses = {"$match": {"user_id": user_id, "type": "expense", "date": {"$type": "date"}}}
+    magnitude = {"$abs": "$amount"}
+    velocity_start = through - timedelta(days=2 * window)
+    boundary = through - timedelta(days=window)
+    return {
+        "rolling_average": [
+            expenses,
+            {"$group": {"_id": {"$dateTrunc": {"date": "$date", "unit": "day"}}, "total": {"$sum": magnitude}}},
+            {"$densify": {"field": "_id", "range": {"step": 1, "unit": "day", "bounds": "full"}}},
+            {"$set": {"total": {"$ifNull": ["$total", 0]}}},
+            {"$setWindowFields": {"sortBy": {"_id": 1}, "output": {
+                "average": {"$avg": "$total", "window": {"range": [-(window - 1), 0], "unit": "day"}}
+            }}},
+            {"$sort": {"_id": -1}},
+            {"$limit": MAX_POINTS},
+        ],
+        "percentiles": [
+            expenses,
+            {"$facet": {
+                "overall": [{"$group": {"_id": None, "count": {"$sum": 1}, "percentiles": {"$percentile": {
+                    "input": magnitude, "p": [p / 100 for p in DEFAULT_PERCENTILES], "method": "approximate"}}}}],
+                "categories": [{"$group": {"_id": "$category", "count": {"$sum": 1}, "percentiles": {"$percentile": {
+                    "input": magnitude, "p": [p / 100 for p in DEFAULT_PERCENTILES], "method": "approximate"}}}}],
+            }},
+        ],
+        "velocity": [
+            {"$match": {"user_id": user_id, "type": "expense", "date": {"$gte": velocity_start, "$lt": through}}},
+            {"$group": {"_id": {"current": {"$gte": ["$date", boundary]}, "category": "$category"},
+                        "total": {"$sum": magnitude}}},
+        ],
+        "weekday": [
+            expenses,
+            {"$group": {"_id": {"$isoDayOfWeek": "$date"}, "total": {"$sum": magnitude}, "count": {"$sum": 1}}},
+        ],
+    }
+
+
+def timed(func, repeat):
+    """Median wall time of func in ms"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo", required=True, help="URI of a scratch database; its transactions are replaced")
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--window", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    if "bench" not in (parse_uri(args.mongo)["database"] or ""):
+        sys.exit("Refusing to seed a database whose name does not contain 'bench'")
+
+    db = MongoClient(args.mongo).get_default_database()
+    user_id = ObjectId()
+    seed(db, user_id, args.transactions, args.seed)
+    through = SEED_END + timedelta(days=1)
+    filters = {"date_to": through}
+    params = {"rolling_average": {"window": args.window}, "velocity": {"window": args.window}}
+
+    def load():
+        return Ledger.from_rows(db.transactions.aggregate(ledger_pipeline(user_id)))
+
+    ledger = load()
+    print(f"{len(ledger)} transactions, ledger {ledger.nbytes / 1024:.0f} KiB, median of {args.repeat} runs (ms)")
+    print(f"{'metric':>16} {'pipeline':>9} {'cold':>8} {'warm':>8}")
+    for name, pipeline in pipelines(user_id, args.window, through).items():
+        metric = METRICS[name]
+        kwargs = params.get(name, {})
+        try:
+            pipeline_ms = f"{timed(lambda: list(db.transactions.aggregate(pipeline)), args.repeat):9.1f}"
+        except OperationFailure as e:
+            pipeline_ms = f"{'unsupported':>9}"
+            print(f"  {name}: {e.details.get('errmsg', e)}", file=sys.stderr)
+        cold = timed(lambda: metric(load().select(filters), filters=filters, **kwargs), args.repeat)
+        warm = timed(lambda: metric(ledger.select(filters), filters=filters, **kwargs), args.repeat)
+        print(f"{name:>16} {pipeline_ms} {cold:8.1f} {warm:8.2f}")
+    print(f"Reading the ledger alone: {timed(load, args.repeat):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Reproducible load benchmark for the Flask API, with JSON results for CI.
+
+Seeds a scratch MongoDB database with --users x --transactions through the
+models, starts the app against it (gunicorn, or uvicorn with --server asgi)
+unless --target points at a running one, logs --concurrency clients in round
+robin over the seeded users, then runs each scenario for --duration seconds:
+
+- login: POST /login
+- list: GET /api/transactions?limit=50
+- monthly, categories: GET /api/analytics/monthly and /categories
+- create: POST /api/transactions
+- delete: DELETE /api/transactions/<id> of the rows create added, which
+  leaves the database as seeded for the next run
+
+Reported per scenario: requests/sec, errors, p50/p95/p99 latency and the
+server's peak resident memory (its whole process tree, sampled from /proc
+on Linux; pass --server-pid with --target). The response cache is off by
+default (--cache-backend none), so reads measure MongoDB work rather than
+cache hits.
+
+--output writes the results as JSON. --baseline compares them with an
+earlier file and exits 1 when a scenario's p95 latency, throughput or peak
+memory is worse by more than --tolerance.
+
+    PYTHONPATH=. python benchmarks/api_bench.py --mongo mongodb://localhost:27017/api_bench \\
+        --users 20 --transactions 2000 --output bench.json [--baseline old.json]
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+from pymongo.uri_parser import parse_uri
+
+from benchmarks.http_load import percentile
+
+PASSWORD = "benchpass"
+CATEGORIES = ["Food", "Transportation", "Entertainment", "Shopping", "Bills", "Other"]
+SCENARIOS = ["login", "list", "monthly", "categories", "create", "delete"]
+# Seeded dates end here rather than today, so runs are comparable over time
+SEED_END = datetime(2024, 12, 31)
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def email(i):
+    return f"bench{i}@example.com"
+
+
+def seed(mongo_uri, users, transactions, rng_seed):
+    """Drop the scratch database and fill it through the models, rollups included"""
+    os.environ["MONGODB_URI"] = mongo_uri
+    from app import create_app, mongo
+    from app.indexes import ensure_indexes
+    from app.models import Transaction, User
+
+    app = create_app(debug=False)
+    rng = random.Random(rng_seed)
+    with app.app_context():
+        mongo.cx.drop_database(mongo.db.name)
+        ensure_indexes(mongo.db)
+        # One real hash, shared: every user signs in with the same password
+        password_hash = User("bench0", email(0), password=PASSWORD).password_hash
+        for i in range(users):
+            user = User(f"bench{i}", email(i), password_hash=password_hash).save()
+            documents = []
+            for _ in range(transactions):
+                kind = "income" if rng.random() < 0.2 else "expense"
+                amount = round(rng.uniform(5, 500), 2)
+                documents.append({
+                    "user_id": user["_id"],
+                    "description": f"Bench {kind}",
+                    "amount": amount if kind == "income" else -amount,
+                    "category": rng.choice(CATEGORIES),
+                    "type": kind,
+                    "date": SEED_END - timedelta(minutes=rng.randrange(2 * 365 * 24 * 60)),
+                })
+            Transaction.bulk_create(documents)
+
+
+def start_server(kind, port, env):
+    if kind == "asgi":
+        command = [sys.executable, "-m", "uvicorn", "--factory", "app.asgi:create_asgi_app",
+                   "--host", "127.0.0.1", "--port", str(port)]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "-c", "python:app.gunicorn_conf", "app.wsgi:app"]
+        env = {**env, "WEB_BIND": f"127.0.0.1:{port}"}
+    return subprocess.Popen(command, env=env)
+
+
+async def wait_ready(base_url, process, timeout=60):
+    deadline = time.perf_counter() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.perf_counter() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"Server exited with {process.returncode}")
+            try:
+                if (await client.get("/api/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{base_url} not ready after {timeout}s")
+
+
+def tree_rss(pid):
+    """Resident memory in bytes of pid and all its descendants, from /proc"""
+    children = defaultdict(list)
+    for path in glob.glob("/proc/[0-9]*/stat"):
+        try:
+            with open(path) as f:
+                # The command name may contain spaces; fields resume after ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[ppid].append(int(path.split("/")[2]))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children[current])
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            pass
+    return total
+
+
+async def sample_rss(pid, samples, interval=0.2):
+    while True:
+        samples.append(tree_rss(pid))
+        await asyncio.sleep(interval)
+
+
+class VirtualUser:
+    """One benchmark client: its own cookie jar, signed in as a seeded user"""
+
+    def __init__(self, client, email):
+        self.client = client
+        self.email = email
+        self.created = []
+
+
+async def login(user):
+    user.client.cookies.clear()
+    response = await user.client.post("/login", data={"email": user.email, "password": PASSWORD})
+    return response.status_code == 302 and response.headers.get("location", "").endswith("/dashboard")
+
+
+async def list_page(user):
+    return (await user.client.get("/api/transactions?limit=50")).status_code == 200
+
+
+async def monthly(user):
+    return (await user.client.get("/api/analytics/monthly")).status_code == 200
+
+
+async def categories(user):
+    return (await user.client.get("/api/analytics/categories")).status_code == 200
+
+
+async def create(user):
+    response = await user.client.post("/api/transactions", json={
+        "description": "Bench write",
+        "amount": -12.5,
+        "category": "Food",
+        "type": "expense",
+        "date": SEED_END.strftime("%Y-%m-%d"),
+    })
+    if response.status_code != 201:
+        return False
+    user.created.append(response.json()["_id"])
+    return True
+
+
+async def delete(user):
+    if not user.created:
+        return None
+    response = await user.client.delete(f"/api/transactions/{user.created.pop()}")
+    return response.status_code == 200
+
+
+STEPS = {
+    "login": login,
+    "list": list_page,
+    "monthly": monthly,
+    "categories": categories,
+    "create": create,
+    "delete": delete,
+}
+
+
+async def drive(step, user, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            ok = await step(user)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        if ok is None:
+            # Nothing left for this client to do (delete ran out of rows)
+            return
+        if ok:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(step.__name__)
+
+
+async def run_scenario(name, users, duration, pid):
+    latencies, errors, rss = [], [], []
+    sampler = asyncio.ensure_future(sample_rss(pid, rss)) if pid else None
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        drive(STEPS[name], user, start + duration, latencies, errors) for user in users
+    ))
+    elapsed = time.perf_counter() - start
+    if sampler:
+        sampler.cancel()
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "rss_peak_mb": round(max(rss) / 2**20, 1) if rss else None,
+    }
+
+
+async def benchmark(base_url, args, pid):
+    # Each client sends one request at a time
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    clients = [
+        httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout)
+        for _ in range(args.concurrency)
+    ]
+    try:
+        users = [VirtualUser(client, email(i % args.users)) for i, client in enumerate(clients)]
+        signed_in = await asyncio.gather(*(login(user) for user in users))
+        if not all(signed_in):
+            raise RuntimeError("Could not sign the benchmark users in; seed the database first")
+        results = {}
+        for name in args.scenario:
+            results[name] = await run_scenario(name, users, args.duration, pid)
+            print(format_row(name, results[name]))
+        # Leave no benchmark writes behind when delete was not run
+        for user in users:
+            while user.created:
+                await user.client.delete(f"/api/transactions/{user.created.pop()}")
+        return results
+    finally:
+        await asyncio.gather(*(client.aclose() for client in clients))
+
+
+def format_row(name, result):
+    rss = "-" if result["rss_peak_mb"] is None else f"{result['rss_peak_mb']:.1f}"
+    return (f"{name:>10} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+            f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {rss:>8}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions against a baseline run as [(scenario, metric, old, new)]"""
+    regressions = []
+    for name, new in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        if new["p95_ms"] > old["p95_ms"] * (1 + tolerance):
+            regressions.append((name, "p95_ms", old["p95_ms"], new["p95_ms"]))
+        if new["rps"] < old["rps"] * (1 - tolerance):
+            regressions.append((name, "rps", old["rps"], new["rps"]))
+        if old.get("rss_peak_mb") and new.get("rss_peak_mb") and new["rss_peak_mb"] > old["rss_peak_mb"] * (1 + tolerance):
+            regressions.append((name, "rss_peak_mb", old["rss_peak_mb"], new["rss_peak_mb"]))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo", required=True, help="URI of a scratch database; it is dropped and reseeded")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--transactions", type=int, default=2000, help="per user")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the generated transactions")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data of an earlier run")
+    parser.add_argument("--target", help="base URL of a running server on the same database")
+    parser.add_argument("--server-pid", type=int, help="with --target, the process to sample memory from")
+    parser.add_argument("--server", choices=["wsgi", "asgi"], default="wsgi")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--cache-backend", default="none", help="CACHE_BACKEND for the started server")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="repeatable, default all")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="earlier --output file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+    args.scenario = args.scenario or SCENARIOS
+    if "bench" not in (parse_uri(args.mongo)["database"] or ""):
+        parser.error("--mongo must name a scratch database with 'bench' in its name, it is dropped")
+    return args
+
+
+async def main(args):
+    if not args.skip_seed:
+        started = time.perf_counter()
+        seed(args.mongo, args.users, args.transactions, args.seed)
+        print(f"Seeded {args.users} users x {args.transactions} transactions in {time.perf_counter() - started:.1f}s")
+
+    process, pid, base_url = None, args.server_pid, args.target
+    if not base_url:
+        env = {**os.environ, "MONGODB_URI": args.mongo, "CACHE_BACKEND": args.cache_backend}
+        process = start_server(args.server, args.port, env)
+        pid, base_url = process.pid, f"http://127.0.0.1:{args.port}"
+    try:
+        await wait_ready(base_url, process)
+        print(f"{args.concurrency} clients, {args.duration:.0f}s per scenario against {base_url}")
+        print(f"{'scenario':>10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>8}")
+        scenarios = await benchmark(base_url, args, pid if sys.platform.startswith("linux") else None)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    results = {
+        "config": {
+            "users": args.users,
+            "transactions": args.transactions,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "server": "external" if args.target else args.server,
+            "cache_backend": None if args.target else args.cache_backend,
+            "python": platform.python_version(),
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "scenarios": scenarios,
+        # ru_maxrss is in KiB on Linux
+        "client_rss_peak_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, metric, old, new in regressions:
+            print(f"REGRESSION {name} {metric}: {old} -> {new}")
+        if regressions:
+            return 1
+        print(f"No regression beyond {args.tolerance:.0%} of {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
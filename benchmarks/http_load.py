@@ -0,0 +1,117 @@
+"""Closed-loop HTTP load test comparing the WSGI and ASGI stacks.
+
+Each of --concurrency clients logs in once (or reuses --cookie), then requests
+the --path list round-robin for --duration seconds. Reported per target:
+requests/sec, error count and p50/p95/p99 latency.
+
+Start the two stacks against the same database, e.g.
+
+    gunicorn -c python:app.gunicorn_conf -b 0.0.0.0:8000 app.wsgi:app
+    uvicorn --factory app.asgi:create_asgi_app --port 8001 --workers 4
+
+then
+
+    PYTHONPATH=. python benchmarks/http_load.py \\
+        --target sync=http://localhost:8000 --target async=http://localhost:8001 \\
+        --email bench@example.com --password benchpass --concurrency 500
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+DEFAULT_PATHS = [
+    "/api/transactions?limit=50",
+    "/api/analytics/monthly",
+    "/api/analytics/categories",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def login(client, email, password):
+    response = await client.post("/login", data={"email": email, "password": password})
+    if response.status_code != 302 or not response.headers.get("location", "").endswith("/dashboard"):
+        raise RuntimeError(f"Login as {email} failed with {response.status_code}")
+
+
+async def worker(client, paths, deadline, latencies, errors, offset):
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+async def run_target(base_url, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as client:
+        if args.cookie:
+            client.cookies.set("session", args.cookie)
+        else:
+            await login(client, args.email, args.password)
+        latencies, errors = [], []
+        # Warm up connections and caches before measuring
+        await asyncio.gather(*(client.get(path) for path in args.path))
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            worker(client, args.path, deadline, latencies, errors, offset)
+            for offset in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", action="append", required=True, help="name=base_url, repeatable")
+    parser.add_argument("--path", action="append", help="path to request, repeatable")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--cookie", help="an existing Flask session cookie instead of logging in")
+    args = parser.parse_args(argv)
+    args.path = args.path or DEFAULT_PATHS
+    if not args.cookie and not (args.email and args.password):
+        parser.error("pass --email and --password, or --cookie")
+    return args
+
+
+async def main(args):
+    print(f"{args.concurrency} clients, {args.duration:.0f}s per target, paths: {', '.join(args.path)}")
+    print(f"{'target':>10} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for target in args.target:
+        name, _, base_url = target.partition("=")
+        result = await run_target(base_url, args)
+        print(f"{name:>10} {result['requests']:>9} {result['errors']:>7} {result['rps']:>9.1f} "
+              f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
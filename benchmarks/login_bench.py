@@ -0,0 +1,68 @@
+"""Password verifications per second, per core, for User.login.
+
+For each hash method this times check_password_hash three ways:
+
+- inline: one thread verifying back to back, i.e. logins/sec for one core
+- threads: THREADS request threads verifying inline, as the login route did
+  before; the GIL keeps this near the single-core rate
+- pool: the same threads going through app.passwords.HashPool with WORKERS
+  processes, as the login route does now
+
+No MongoDB or Flask app is needed.
+
+    PYTHONPATH=. python benchmarks/login_bench.py [--workers N] [--threads N] [--logins N] [method ...]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app.passwords import HashPool
+
+DEFAULT_METHODS = ["pbkdf2:sha256:600000", "pbkdf2:sha256:260000", "scrypt:32768:8:1"]
+
+
+def timed(func, logins):
+    start = time.perf_counter()
+    func(logins)
+    return logins / (time.perf_counter() - start)
+
+
+def inline(password_hash, logins):
+    for _ in range(logins):
+        check_password_hash(password_hash, "password123")
+
+
+def threaded(verify, password_hash, threads, logins):
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda _: verify(password_hash, "password123"), range(logins)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("methods", nargs="*")
+    args = parser.parse_args()
+
+    pool = HashPool(args.workers, queue=args.threads)
+    print(f"{args.workers} pool workers, {args.threads} request threads, {args.logins} logins per run")
+    print(f"{'method':>24} {'inline/s':>9} {'threads/s':>10} {'pool/s':>8} {'pool/s/core':>12}")
+    try:
+        for method in args.methods or DEFAULT_METHODS:
+            password_hash = generate_password_hash("password123", method)
+            # Warm the pool so process start-up is not counted
+            pool.run(check_password_hash, password_hash, "password123")
+            single = timed(lambda n: inline(password_hash, n), max(args.logins // 4, 1))
+            threads = timed(lambda n: threaded(check_password_hash, password_hash, args.threads, n), args.logins)
+            pooled = timed(lambda n: threaded(lambda *a: pool.run(check_password_hash, *a), password_hash, args.threads, n), args.logins)
+            print(f"{method:>24} {single:>9.1f} {threads:>10.1f} {pooled:>8.1f} {pooled / args.workers:>12.1f}")
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
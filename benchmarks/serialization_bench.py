@@ -0,0 +1,129 @@
+"""Cost of serializing transactions for GET /api/transactions.
+
+"before" is the old route behaviour: raw documents (ObjectId, datetime,
+user_id) fetched with find(), walked in Python to stringify _id and
+isoformat() the date, then JSON-encoded. "after" is what the route does now:
+the pipeline from app.serializers formats rows inside MongoDB and Python only
+JSON-encodes them.
+
+By default both sides are timed in-process with no MongoDB. That mode is
+client-side only: the $toString/$dateToString work moved to the server is not
+counted, so it shows how much CPU left the web worker, not an end-to-end
+speedup. Pass --mongo URI to seed a scratch collection and time the full
+find()+loop against aggregate() round trips instead.
+
+    PYTHONPATH=. python benchmarks/serialization_bench.py [--mongo URI] [rows ...]
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.serializers import format_date, transaction_pipeline
+
+
+def make_documents(count):
+    start = datetime(2024, 1, 1)
+    user_id = ObjectId()
+    return [
+        {
+            "_id": ObjectId(),
+            "amount": -12.5,
+            "category": "Food",
+            "description": f"Purchase {i}",
+            "date": start + timedelta(minutes=i),
+            "user_id": user_id,
+            "type": "expense"
+        }
+        for i in range(count)
+    ]
+
+
+def pipeline_rows(documents):
+    """What the $project stage returns for the same documents"""
+    return [
+        {
+            "_id": str(doc["_id"]),
+            "amount": doc["amount"],
+            "category": doc["category"],
+            "description": doc["description"],
+            "date": format_date(doc["date"]),
+            "type": doc["type"]
+        }
+        for doc in documents
+    ]
+
+
+def before(documents):
+    formatted_transactions = []
+    for transaction in documents:
+        formatted_transactions.append({
+            '_id': str(transaction['_id']),
+            'description': transaction['description'],
+            'amount': transaction['amount'],
+            'category': transaction['category'],
+            'type': transaction['type'],
+            'date': transaction['date'].isoformat() if isinstance(transaction['date'], datetime) else transaction['date']
+        })
+    return json.dumps(formatted_transactions)
+
+
+def after(rows):
+    return json.dumps(rows)
+
+
+def best_of(func, arg, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def client_side(sizes):
+    print("client-side only: server-side formatting is not measured")
+    print(f"{'rows':>8} {'before us/row':>14} {'after us/row':>13} {'speedup':>8}")
+    for size in sizes:
+        documents = make_documents(size)
+        rows = pipeline_rows(documents)
+        t_before = best_of(before, documents)
+        t_after = best_of(after, rows)
+        print(f"{size:>8} {t_before / size * 1e6:>14.2f} {t_after / size * 1e6:>13.2f} {t_before / t_after:>7.1f}x")
+
+
+def end_to_end(uri, sizes):
+    from pymongo import MongoClient
+
+    collection = MongoClient(uri).get_database()["serialization_bench"]
+    print(f"end-to-end against {uri}: query, transfer and encoding")
+    print(f"{'rows':>8} {'before us/row':>14} {'after us/row':>13} {'speedup':>8}")
+    try:
+        for size in sizes:
+            collection.drop()
+            documents = make_documents(size)
+            collection.insert_many(documents)
+            user_id = documents[0]["user_id"]
+            t_before = best_of(lambda _: before(collection.find({"user_id": user_id}).sort([("date", -1), ("_id", -1)])), None)
+            t_after = best_of(lambda _: after(list(collection.aggregate(transaction_pipeline({"user_id": user_id})))), None)
+            print(f"{size:>8} {t_before / size * 1e6:>14.2f} {t_after / size * 1e6:>13.2f} {t_before / t_after:>7.1f}x")
+    finally:
+        collection.drop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mongo", help="MongoDB URI for the end-to-end comparison")
+    parser.add_argument("rows", nargs="*", type=int)
+    args = parser.parse_args()
+    sizes = args.rows or [10_000, 100_000]
+    if args.mongo:
+        end_to_end(args.mongo, sizes)
+    else:
+        client_side(sizes)
+
+
+if __name__ == "__main__":
+    main()
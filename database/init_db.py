@@ -16,10 +16,20 @@ client = MongoClient(mongo_uri)
 db = client.get_database()
 
 def setup_indexes():
-    # Create indexes for better query performance
+    # Create indexes for better query performance (the app ensures the same
+    # set at startup, see app/indexes.py; keep the two in step)
     db.users.create_index("username", unique=True)
     db.users.create_index("email", unique=True)
-    db.transactions.create_index([("user_id", 1), ("date", -1)])
+    db.transactions.create_index([("user_id", 1), ("date", -1), ("_id", -1)])
+    # Filtered views: equality on category/type, then the date range and sort
+    db.transactions.create_index([("user_id", 1), ("category", 1), ("date", -1)])
+    db.transactions.create_index([("user_id", 1), ("type", 1), ("date", -1)])
+    db.transaction_rollups.create_index(
+        [("user_id", 1), ("year", 1), ("month", 1), ("category", 1), ("type", 1)],
+        unique=True
+    )
+    db.transaction_changes.create_index([("user_id", 1), ("version", 1)], unique=True)
+    db.transaction_changes.create_index("at", expireAfterSeconds=7 * 24 * 3600)
     db.categories.create_index([("user_id", 1), ("name", 1)])
     db.budgets.create_index([("user_id", 1), ("category_id", 1)])
 
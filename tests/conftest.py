@@ -0,0 +1,15 @@
+import pytest
+from app import create_app
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    app.config['MONGO_URI'] = 'mongodb://localhost:27017/test_db'
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.test_client() as client:
+        with client.session_transaction() as sess:
+            sess['user_id'] = "656f99ab8a5f3c2ef4c50b1a"
+            sess['username'] = "testuser"
+        yield client
@@ -0,0 +1,97 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from bson import ObjectId
+from app import cache
+from app.analytics import Ledger, compute, ledger_pipeline, percentiles, rolling_average, velocity, weekday, to_ms
+
+USER_ID = "656f99ab8a5f3c2ef4c50b1a"
+
+def row(date, amount, category="Food", type="expense"):
+    return {"time": to_ms(date), "amount": amount, "category": category, "type": type}
+
+ROWS = [
+    row(datetime(2024, 1, 3, 12), -30.0),
+    row(datetime(2024, 1, 1, 9), -10.0),
+    row(datetime(2024, 1, 1, 18), -20.0, "Books"),
+    row(datetime(2024, 1, 2), 1000.0, "Salary", "income"),
+    row(datetime(2024, 1, 8), -40.0),
+    {"time": None, "amount": -5.0, "category": "Food", "type": "expense"},
+]
+
+def test_ledger_is_sorted_and_skips_undated_rows():
+    ledger = Ledger.from_rows(ROWS)
+    assert len(ledger) == 5
+    assert ledger.amounts.tolist() == [-10.0, -20.0, 1000.0, -30.0, -40.0]
+    assert ledger.category_names == ["Food", "Books", "Salary"]
+    assert ledger.nbytes > 0
+
+def test_ledger_select_matches_api_filters():
+    ledger = Ledger.from_rows(ROWS)
+    assert ledger.select({"type": "income"}).amounts.tolist() == [1000.0]
+    assert ledger.select({"categories": ["Books", "Salary"]}).amounts.tolist() == [-20.0, 1000.0]
+    assert ledger.select({"min_amount": 25, "max_amount": 100}).amounts.tolist() == [-30.0, -40.0]
+    selected = ledger.select({"date_from": datetime(2024, 1, 1, 12), "date_to": datetime(2024, 1, 3)})
+    assert selected.amounts.tolist() == [-20.0, 1000.0]
+
+def test_to_ms_keeps_offsets():
+    assert to_ms(datetime(2024, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))) == to_ms(datetime(2024, 1, 1))
+
+def test_rolling_average_fills_empty_days():
+    result = rolling_average(Ledger.from_rows(ROWS), window=2)
+    assert result["points"][:3] == [
+        {"date": "2024-01-01", "total": 30.0, "average": 15.0},
+        {"date": "2024-01-02", "total": 0.0, "average": 15.0},
+        {"date": "2024-01-03", "total": 30.0, "average": 15.0},
+    ]
+    assert result["points"][-1] == {"date": "2024-01-08", "total": 40.0, "average": 20.0}
+    assert len(result["points"]) == 8
+
+def test_percentiles_overall_and_by_category():
+    result = percentiles(Ledger.from_rows(ROWS), p=[50, 100])
+    assert result["overall"] == {"count": 4, "percentiles": {"50": 25.0, "100": 40.0}}
+    assert result["categories"]["Books"] == {"count": 1, "percentiles": {"50": 20.0, "100": 20.0}}
+    assert "Salary" not in result["categories"]
+
+def test_velocity_compares_windows():
+    filters = {"date_to": datetime(2024, 1, 9)}
+    result = velocity(Ledger.from_rows(ROWS).select(filters), window=4, filters=filters)
+    # Jan 5-8 against Jan 1-4
+    assert result["through"] == "2024-01-08"
+    assert result["current"] == 10.0
+    assert result["previous"] == 15.0
+    assert result["change"] == pytest.approx(-0.3333, abs=1e-4)
+    assert result["categories"] == {"Food": 10.0}
+
+def test_weekday_totals():
+    result = weekday(Ledger.from_rows(ROWS))
+    # 2024-01-01 and 2024-01-08 were Mondays
+    assert result[0] == {"weekday": "Monday", "total": 70.0, "average": 35.0, "count": 3}
+    assert result[2]["total"] == 30.0
+
+def test_ledger_is_loaded_once_per_data_version(client):
+    with patch('app.models.Transaction.aggregate', return_value=ROWS) as mock_aggregate:
+        with client.application.test_request_context():
+            compute("weekday", ObjectId(USER_ID))
+            compute("percentiles", ObjectId(USER_ID), {"type": "expense"}, window=7)
+            assert mock_aggregate.call_count == 1
+            assert mock_aggregate.call_args[0][0] == ledger_pipeline(ObjectId(USER_ID))
+
+            cache.bump(ObjectId(USER_ID))
+            compute("weekday", ObjectId(USER_ID))
+            assert mock_aggregate.call_count == 2
+
+def test_metric_route(client):
+    with patch('app.models.Transaction.aggregate', return_value=ROWS):
+        response = client.get('/api/analytics/rolling_average?window=2&from=2024-01-01&to=2024-01-03')
+        assert response.status_code == 200
+        assert [point["date"] for point in response.get_json()["points"]] == ["2024-01-01", "2024-01-02", "2024-01-03"]
+
+        assert client.get('/api/analytics/unknown').status_code == 404
+        assert client.get('/api/analytics/velocity?window=0').status_code == 400
+        assert client.get('/api/analytics/percentiles?p=101').status_code == 400
+
+def test_explicit_analytics_routes_take_precedence(client):
+    with patch('app.models.TransactionRollup.aggregate', return_value=[]) as mock_aggregate:
+        assert client.get('/api/analytics/categories').status_code == 200
+        mock_aggregate.assert_called_once()
@@ -4,6 +4,7 @@ from app import create_app
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from flask_cors import CORS
 
+
 def test_create_app_success():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -18,6 +19,7 @@ def test_create_app_success():
         # Check that CORS is initialized
         mock_cors.assert_called_once()
 
+
 def test_create_app_connection_failure():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -28,6 +30,7 @@ def test_create_app_connection_failure():
         mock_init.assert_called_once()
         mock_cors.assert_called_once()
 
+
 def test_create_app_server_selection_timeout():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -38,6 +41,7 @@ def test_create_app_server_selection_timeout():
         mock_init.assert_called_once()
         mock_cors.assert_called_once()
 
+
 def test_create_app_production_mode():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -48,6 +52,7 @@ def test_create_app_production_mode():
             create_app(debug=False)
         mock_cors.assert_called_once()
 
+
 def test_create_app_unexpected_error():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -58,6 +63,7 @@ def test_create_app_unexpected_error():
         mock_init.assert_called_once()
         mock_cors.assert_called_once()
 
+
 def test_create_app_production_unexpected_error():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -68,6 +74,7 @@ def test_create_app_production_unexpected_error():
             create_app(debug=False)
         mock_cors.assert_called_once()
 
+
 def test_create_app_with_custom_config():
     with patch('app.mongo.init_app') as mock_init, \
          patch('app.mongo.db') as mock_db, \
@@ -76,4 +83,22 @@ def test_create_app_with_custom_config():
         app = create_app()
         app.config['MONGO_URI'] = 'mongodb://custom:27017/db'
         assert app.config['MONGO_URI'] == 'mongodb://custom:27017/db'
-        mock_cors.assert_called_once() 
\ No newline at end of file
+        mock_cors.assert_called_once()
+
+
+def test_create_app_rejects_zero_batch_size():
+    with patch('app.mongo.init_app'), \
+         patch('app.mongo.db'), \
+         patch.dict('os.environ', {'IMPORT_BATCH_SIZE': '0'}):
+        with pytest.raises(ValueError):
+            create_app()
+
+
+def test_create_app_ensures_indexes():
+    with patch('app.mongo.init_app'), \
+         patch('app.mongo.db') as mock_db, \
+         patch('app.CORS'):
+        mock_db.command.return_value = True
+        app = create_app()
+        app.extensions['index_bootstrap'].join(5)
+        mock_db.__getitem__.return_value.create_index.assert_any_call([("email", 1)], unique=True)
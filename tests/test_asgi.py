@@ -0,0 +1,131 @@
+import pytest
+from bson import ObjectId
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from starlette.testclient import TestClient
+from app import create_app
+from app.asgi import create_asgi_app
+
+USER_ID = "656f99ab8a5f3c2ef4c50b1a"
+
+@pytest.fixture
+def motor_db():
+    with patch('app.asgi.AsyncIOMotorClient') as mock_client:
+        yield mock_client.return_value.get_default_database.return_value
+
+@pytest.fixture
+def client(motor_db):
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    client = TestClient(create_asgi_app(flask_app))
+    client.cookies.set(flask_app.config['SESSION_COOKIE_NAME'], serializer.dumps({'user_id': USER_ID}))
+    return client
+
+def cursor(rows):
+    mock_cursor = MagicMock()
+    mock_cursor.to_list = AsyncMock(return_value=rows)
+    return mock_cursor
+
+def test_health_check(client, motor_db):
+    motor_db.command = AsyncMock(return_value={"ok": 1})
+    response = client.get('/api/health')
+    assert response.json() == {"status": "healthy", "database": "connected"}
+
+def test_transactions_require_login(motor_db):
+    client = TestClient(create_asgi_app(create_app()))
+    response = client.get('/api/transactions', follow_redirects=False)
+    assert response.status_code == 302
+    assert response.headers['location'] == '/login'
+
+def test_list_transactions(client, motor_db):
+    rows = [{"_id": "656f99ab8a5f3c2ef4c50b1b", "amount": -5.0, "date": "2024-04-01T00:00:00"}]
+    motor_db.transactions.aggregate.return_value = cursor(rows)
+
+    response = client.get('/api/transactions?category=Food')
+
+    assert response.status_code == 200
+    assert response.json() == rows
+    pipeline = motor_db.transactions.aggregate.call_args[0][0]
+    assert pipeline[0]["$match"] == {"user_id": ObjectId(USER_ID), "category": "Food"}
+
+def test_transactions_page(client, motor_db):
+    rows = [
+        {"_id": "656f99ab8a5f3c2ef4c50b1c", "date": "2024-04-02T00:00:00"},
+        {"_id": "656f99ab8a5f3c2ef4c50b1b", "date": "2024-04-01T00:00:00"}
+    ]
+    motor_db.transactions.aggregate.return_value = cursor(rows)
+
+    response = client.get('/api/transactions?limit=1')
+
+    assert response.json()["transactions"] == rows[:1]
+    assert response.json()["next_cursor"] is not None
+    assert motor_db.transactions.aggregate.call_args[0][0][2] == {"$limit": 2}
+
+def test_invalid_filter(client):
+    assert client.get('/api/transactions?type=gift').status_code == 400
+
+def test_analytics_reads_rollups(client, motor_db):
+    rows = [{"_id": "Food", "total": -20.0}]
+    motor_db.__getitem__.return_value.aggregate.return_value = cursor(rows)
+
+    response = client.get('/api/analytics/categories')
+
+    assert response.json() == rows
+    motor_db.__getitem__.assert_called_with("transaction_rollups")
+
+def test_monthly_analytics_in_timezone_reads_transactions(client, motor_db):
+    motor_db.__getitem__.return_value.aggregate.return_value = cursor([])
+
+    response = client.get('/api/analytics/monthly?bucket=day&tz=Europe/Paris')
+
+    assert response.json() == []
+    motor_db.__getitem__.assert_called_with("transactions")
+    assert client.get('/api/analytics/monthly?bucket=hour').status_code == 400
+
+def test_balance(client, motor_db):
+    rows = [{"_id": None, "income": 100.0, "expense": 0, "net": 100.0, "count": 1, "balance": 100.0}]
+    motor_db.transactions.aggregate.return_value = cursor(rows)
+
+    response = client.get('/api/analytics/balance?bucket=week')
+
+    assert response.json() == {"bucket": "week", "opening": 100.0, "points": []}
+    assert "$setWindowFields" in motor_db.transactions.aggregate.call_args[0][0][2]
+
+def test_balance_with_offset_timestamps(client, motor_db):
+    motor_db.transactions.aggregate.return_value = cursor([])
+
+    response = client.get('/api/analytics/balance?from=2024-03-01T00:00:00Z&to=2024-03-31T00:00:00%2B02:00')
+
+    assert response.status_code == 200
+    assert motor_db.transactions.aggregate.call_args[0][0][0]["$match"]["date"]["$lt"] == datetime(2024, 3, 30, 22)
+
+def test_other_routes_fall_through_to_flask(client):
+    response = client.get('/login', follow_redirects=False)
+    # Logged in via the shared Flask session, so Flask redirects to the dashboard
+    assert response.status_code == 302
+    assert response.headers['location'].endswith('/dashboard')
+
+def test_dashboard(client, motor_db):
+    page = [{"_id": "656f99ab8a5f3c2ef4c50b1b", "date": "2024-04-01T00:00:00"}]
+    motor_db.users.find_one = AsyncMock(return_value={"sync_version": 3})
+    motor_db.transactions.aggregate.return_value = cursor(page)
+    motor_db.__getitem__.return_value.aggregate.side_effect = [
+        cursor([{"_id": {"period": "2024-04-01", "type": "expense"}, "total": -5.0}]),
+        cursor([{"top": [{"_id": "Food", "total": 5.0}], "other": []}])
+    ]
+
+    response = client.get('/api/dashboard')
+
+    assert response.json() == {
+        "transactions": page,
+        "next_cursor": None,
+        "charts": {
+            "monthly": {"labels": ["2024-04"], "income": [0.0], "expense": [5.0]},
+            "categories": {"labels": ["Food"], "values": [5.0], "other": 0.0, "other_count": 0, "top": 6}
+        },
+        "version": 3
+    }
+
+def test_unknown_chart(client):
+    assert client.get('/api/charts/pie').status_code == 404
@@ -0,0 +1,70 @@
+import gzip
+import json
+import pytest
+from app import create_app
+from app.assets import build, VENDOR
+
+@pytest.fixture
+def built_app(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "style.css").write_text("body { color: red; }\n" * 50)
+    (tmp_path / "vendor").mkdir()
+    (tmp_path / "vendor" / "bootstrap.min.css").write_text(".btn{}")
+    manifest = build(str(tmp_path), fetch=False)
+
+    app = create_app()
+    app.static_folder = str(tmp_path)
+    app.extensions['asset_manifest'] = manifest
+    app.debug = False
+    return app, manifest
+
+def test_build_fingerprints_and_compresses(tmp_path, built_app):
+    _, manifest = built_app
+    fingerprinted = manifest["css/style.css"]
+    assert fingerprinted.startswith("css/style.") and fingerprinted.endswith(".css")
+
+    dist = tmp_path / "dist"
+    assert gzip.decompress((dist / (fingerprinted + ".gz")).read_bytes()) == (tmp_path / "css" / "style.css").read_bytes()
+    assert json.loads((dist / "manifest.json").read_text()) == manifest
+    # Same content, same name
+    assert build(str(tmp_path), fetch=False) == manifest
+
+def test_asset_url_uses_manifest(built_app):
+    app, manifest = built_app
+    with app.test_request_context():
+        assert app.jinja_env.globals['asset_url']("css/style.css") == "/assets/" + manifest["css/style.css"]
+        # Not built and not downloaded: straight from the CDN
+        assert app.jinja_env.globals['asset_url']("vendor/chart.umd.js") == VENDOR["vendor/chart.umd.js"]
+
+def test_asset_url_in_debug_serves_plain_files(built_app):
+    app, _ = built_app
+    app.debug = True
+    with app.test_request_context():
+        assert app.jinja_env.globals['asset_url']("css/style.css") == "/css/style.css"
+
+def test_serve_asset_is_immutable_and_compressed(built_app):
+    app, manifest = built_app
+    client = app.test_client()
+    url = "/assets/" + manifest["css/style.css"]
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Content-Type"].startswith("text/css")
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+    etag = response.headers["ETag"]
+    assert client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag}).status_code == 304
+
+    identity = client.get(url, headers={"Accept-Encoding": "identity", "Range": "bytes=0-3"})
+    assert identity.status_code == 206
+    assert identity.data == b"body"
+    assert "Content-Encoding" not in identity.headers
+
+def test_serve_asset_unknown_files(built_app):
+    app, _ = built_app
+    client = app.test_client()
+    assert client.get("/assets/css/missing.css").status_code == 404
+    assert client.get("/assets/manifest.json").status_code == 404
+    assert client.get("/assets/../../etc/passwd").status_code == 404
@@ -0,0 +1,101 @@
+from unittest.mock import patch
+from app import create_app, cache
+from app.cache import MemoryBackend
+
+def test_memory_backend_lru_eviction():
+    backend = MemoryBackend(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+
+    assert backend.get("a") == 1
+    assert backend.get("b") is None
+    assert backend.get("c") == 3
+
+def test_memory_backend_ttl():
+    backend = MemoryBackend()
+    with patch('app.cache.time.monotonic', return_value=100.0):
+        backend.set("a", 1, ttl=10)
+    with patch('app.cache.time.monotonic', return_value=105.0):
+        assert backend.get("a") == 1
+    with patch('app.cache.time.monotonic', return_value=111.0):
+        assert backend.get("a") is None
+
+def test_bump_outside_app_context_is_noop():
+    cache.bump("656f99ab8a5f3c2ef4c50b1a")
+
+def test_cached_response_served_without_db(client):
+    mock_data = [{"_id": "Food", "total": -20.0}]
+
+    with patch('app.models.TransactionRollup.aggregate', return_value=mock_data) as mock_aggregate:
+        first = client.get('/api/analytics/categories')
+        second = client.get('/api/analytics/categories')
+
+        assert first.get_json() == second.get_json() == mock_data
+        assert first.headers['ETag'] == second.headers['ETag']
+        mock_aggregate.assert_called_once()
+
+def test_if_none_match_returns_304(client):
+    with patch('app.models.TransactionRollup.aggregate', return_value=[]) as mock_aggregate:
+        etag = client.get('/api/analytics/monthly').headers['ETag']
+        response = client.get('/api/analytics/monthly', headers={'If-None-Match': etag})
+
+        assert response.status_code == 304
+        mock_aggregate.assert_called_once()
+
+def test_bump_invalidates_cached_response(client):
+    with patch('app.models.TransactionRollup.aggregate', return_value=[]) as mock_aggregate:
+        etag = client.get('/api/analytics/monthly').headers['ETag']
+        with client.application.app_context():
+            cache.bump("656f99ab8a5f3c2ef4c50b1a")
+        response = client.get('/api/analytics/monthly', headers={'If-None-Match': etag})
+
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert mock_aggregate.call_count == 2
+
+def test_errors_are_not_cached(client):
+    with patch('app.models.TransactionRollup.aggregate', side_effect=[Exception("DB Error"), []]):
+        assert client.get('/api/analytics/monthly').status_code == 500
+        assert client.get('/api/analytics/monthly').status_code == 200
+
+def test_cache_disabled():
+    with patch.dict('os.environ', {'CACHE_BACKEND': 'none'}):
+        app = create_app()
+    assert app.extensions['response_cache'] is None
+
+def test_memory_backend_byte_limit():
+    backend = MemoryBackend(max_entries=10, max_bytes=10)
+    backend.set("a", b"12345")
+    backend.set("b", b"12345")
+    backend.set("c", b"123")
+
+    assert backend.get("a") is None
+    assert backend.get("b") == b"12345"
+    assert backend.get("c") == b"123"
+
+def test_large_bodies_are_not_stored(client):
+    client.application.config['CACHE_MAX_ITEM_BYTES'] = 10
+    mock_data = [{"_id": "Food", "total": -20.0}]
+
+    with patch('app.models.TransactionRollup.aggregate', return_value=mock_data) as mock_aggregate:
+        etag = client.get('/api/analytics/categories').headers['ETag']
+        client.get('/api/analytics/categories')
+        revalidated = client.get('/api/analytics/categories', headers={'If-None-Match': etag})
+
+        assert mock_aggregate.call_count == 2
+        assert revalidated.status_code == 304
+
+def test_version_tokens_expire(client):
+    with client.application.app_context():
+        with patch('app.cache.time.monotonic', return_value=100.0):
+            version = cache.data_version("656f99ab8a5f3c2ef4c50b1a")
+        with patch('app.cache.time.monotonic', return_value=100.0 + client.application.config['CACHE_TTL'] + 1):
+            assert cache.data_version("656f99ab8a5f3c2ef4c50b1a") != version
+
+def test_bump_all_invalidates_every_user(client):
+    with client.application.app_context():
+        version = cache.data_version("656f99ab8a5f3c2ef4c50b1a")
+        cache.bump_all()
+        assert cache.data_version("656f99ab8a5f3c2ef4c50b1a") != version
@@ -0,0 +1,123 @@
+import pytest
+from bson import ObjectId
+from unittest.mock import MagicMock, patch
+from app.models import Transaction, TransactionChange
+from datetime import datetime, timedelta
+
+USER_ID = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+
+def change(version, op="insert", age=0):
+    return {
+        "_id": ObjectId(),
+        "user_id": USER_ID,
+        "version": version,
+        "op": op,
+        "transaction": {"_id": str(ObjectId())},
+        "deltas": None,
+        "at": datetime.now() - timedelta(seconds=age)
+    }
+
+def feed(mock_mongo, changes, current, synced_age=0):
+    mock_mongo.db.transaction_changes.find.return_value.sort.return_value.limit.return_value = changes
+    mock_mongo.db.users.find_one.return_value = {
+        "sync_version": current,
+        "synced_at": datetime.now() - timedelta(seconds=synced_age)
+    }
+
+def test_record_takes_next_version():
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.users.find_one_and_update.return_value = {"sync_version": 4}
+
+        version = TransactionChange.record(USER_ID, "delete", {"_id": "x"}, None)
+
+        assert version == 4
+        assert mock_mongo.db.users.find_one_and_update.call_args[0][1]["$inc"] == {"sync_version": 1}
+        logged = mock_mongo.db.transaction_changes.insert_one.call_args[0][0]
+        assert logged["version"] == 4
+        assert logged["op"] == "delete"
+        assert logged["user_id"] == USER_ID
+
+def test_record_failure_returns_none():
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.users.find_one_and_update.side_effect = Exception("Database error")
+
+        assert TransactionChange.record(USER_ID, "insert") is None
+
+def test_create_logs_insert_with_deltas():
+    mock_result = MagicMock()
+    mock_result.inserted_id = ObjectId("656f99ab8a5f3c2ef4c50b1b")
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.insert_one.return_value = mock_result
+        mock_mongo.db.users.find_one_and_update.return_value = {"sync_version": 1}
+
+        result = Transaction.create({
+            "user_id": USER_ID,
+            "amount": 40.0,
+            "type": "expense",
+            "category": "Food",
+            "description": "Groceries",
+            "date": datetime(2024, 3, 15)
+        })
+
+        assert result["version"] == 1
+        assert result["deltas"] == {
+            "type": "expense",
+            "monthly": {"_id": {"period": "2024-03-01", "type": "expense"}, "total": -40.0, "count": 1},
+            "categories": {"_id": "Food", "total": -40.0}
+        }
+        logged = mock_mongo.db.transaction_changes.insert_one.call_args[0][0]
+        assert logged["transaction"] == result["transaction"]
+        assert "user_id" not in logged["transaction"]
+
+def test_since_returns_contiguous_changes():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [change(3), change(4)], current=4)
+
+        result = TransactionChange.since(USER_ID, 2)
+
+        assert result["reset"] is False
+        assert result["version"] == 4
+        assert [c["version"] for c in result["changes"]] == [3, 4]
+        assert set(result["changes"][0]) == {"version", "op", "transaction", "deltas"}
+
+def test_since_stops_at_write_in_flight():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [change(3), change(5)], current=5)
+
+        result = TransactionChange.since(USER_ID, 2)
+
+        assert result["reset"] is False
+        assert result["version"] == 3
+
+def test_since_resets_on_lost_change():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [change(3), change(5, age=120)], current=5)
+
+        assert TransactionChange.since(USER_ID, 2)["reset"] is True
+
+def test_since_resets_when_log_expired():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [], current=9, synced_age=3600)
+
+        result = TransactionChange.since(USER_ID, 2)
+
+        assert result == {"version": 9, "changes": [], "reset": True}
+
+def test_since_resets_after_bulk_import():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [change(3), change(4, op="reset")], current=4)
+
+        assert TransactionChange.since(USER_ID, 2)["reset"] is True
+
+def test_since_resets_unknown_version():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [], current=2)
+
+        assert TransactionChange.since(USER_ID, 10)["reset"] is True
+
+def test_since_up_to_date():
+    with patch('app.models.mongo') as mock_mongo:
+        feed(mock_mongo, [], current=2, synced_age=3600)
+
+        assert TransactionChange.since(USER_ID, 2) == {"version": 2, "changes": [], "reset": False}
@@ -0,0 +1,69 @@
+from datetime import datetime
+from app.charts import monthly_series, category_series, month_range
+from app.models import TransactionRollup
+
+def test_month_range_crosses_year():
+    assert list(month_range((2023, 11), (2024, 2))) == [(2023, 11), (2023, 12), (2024, 1), (2024, 2)]
+
+def test_monthly_series_fills_gaps_and_splits_types():
+    rows = [
+        {"_id": {"period": "2023-12-01", "type": "income"}, "total": 500.0},
+        {"_id": {"period": "2023-12-01", "type": "expense"}, "total": -120.456},
+        {"_id": {"period": "2024-02-01", "type": "expense"}, "total": -80.0}
+    ]
+
+    assert monthly_series(rows) == {
+        "labels": ["2023-12", "2024-01", "2024-02"],
+        "income": [500.0, 0.0, 0.0],
+        "expense": [120.46, 0.0, 80.0]
+    }
+
+def test_monthly_series_stretches_to_filter_range():
+    rows = [{"_id": {"period": "2024-02-01", "type": "expense"}, "total": -10.0}]
+    filters = {"date_from": datetime(2024, 1, 15), "date_to": datetime(2024, 4, 1)}
+
+    assert monthly_series(rows, filters)["labels"] == ["2024-01", "2024-02", "2024-03"]
+
+def test_monthly_series_empty():
+    assert monthly_series([]) == {"labels": [], "income": [], "expense": []}
+
+def test_monthly_series_skips_filling_huge_ranges():
+    rows = [{"_id": {"period": "2024-02-01", "type": "expense"}, "total": -10.0}]
+
+    assert monthly_series(rows, {"date_from": datetime(1, 1, 1)})["labels"] == ["2024-02"]
+
+def test_category_series_with_other_bucket():
+    rows = [{
+        "top": [{"_id": "Rent", "total": 900.0}, {"_id": "Food", "total": 250.5}],
+        "other": [{"_id": None, "total": 75.0, "count": 3}]
+    }]
+
+    assert category_series(rows, 2) == {
+        "labels": ["Rent", "Food"],
+        "values": [900.0, 250.5],
+        "other": 75.0,
+        "other_count": 3,
+        "top": 2
+    }
+
+def test_category_series_without_other():
+    assert category_series([{"top": [], "other": []}], 6)["other_count"] == 0
+
+def test_chart_pipeline_uses_rollups_and_defaults_to_expenses():
+    collection, pipeline = TransactionRollup.chart_pipeline("categories", "user", {"categories": ["Food"]}, 3)
+
+    assert collection == "transaction_rollups"
+    assert pipeline[0]["$match"]["type"] == "expense"
+    assert pipeline[-1]["$facet"]["top"] == [{"$limit": 3}]
+    assert pipeline[-1]["$facet"]["other"][0] == {"$skip": 3}
+
+def test_chart_pipeline_income_categories():
+    _, pipeline = TransactionRollup.chart_pipeline("categories", "user", {"type": "income"})
+    assert pipeline[0]["$match"]["type"] == "income"
+
+def test_monthly_chart_pipeline_from_transactions_needs_real_dates():
+    collection, pipeline = TransactionRollup.chart_pipeline("monthly", "user", {"min_amount": 5.0})
+
+    assert collection == "transactions"
+    assert pipeline[0]["$match"]["date"]["$type"] == "date"
+    assert pipeline[1]["$group"]["_id"]["type"] == "$type"
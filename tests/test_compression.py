@@ -0,0 +1,83 @@
+import gzip
+import json
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+from bson import ObjectId
+from app.compression import available_encodings
+from app.serializers import dumps, encode
+
+def rows(count):
+    return [
+        {"_id": str(i), "description": f"Item {i}", "amount": -5.0, "category": "Food",
+         "date": "2024-01-01T00:00:00", "type": "expense"}
+        for i in range(count)
+    ]
+
+def test_json_encodes_object_ids_and_dates():
+    document = {"_id": ObjectId("656f99ab8a5f3c2ef4c50b1a"), "date": datetime(2024, 3, 1, 12, 30, 0, 123456)}
+    expected = '{"_id":"656f99ab8a5f3c2ef4c50b1a","date":"2024-03-01T12:30:00.123000"}'
+    assert dumps(document) == expected
+    assert encode(document) == expected.encode()
+    # The json module path, as used by the session serializer
+    assert json.loads(dumps(document, separators=(",", ":"))) == json.loads(expected)
+
+def test_jsonify_is_compact_in_debug(client):
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=rows(1)):
+        response = client.get('/api/transactions')
+    assert response.get_data(as_text=True).startswith('[{"_id":"0","description"')
+
+def test_available_encodings_skip_missing_packages():
+    with patch.dict('app.compression.ENCODERS', {'br': (None, False)}):
+        assert available_encodings("br, gzip") == ["gzip"]
+    with pytest.raises(ValueError):
+        available_encodings("gzip,lzma")
+
+def test_large_responses_are_compressed(client):
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=rows(100)):
+        response = client.get('/api/transactions', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert int(response.headers['Content-Length']) == len(response.data)
+    assert json.loads(gzip.decompress(response.data)) == rows(100)
+
+    # The compressed representation's tag is weak, and still revalidates
+    etag = response.headers['ETag']
+    assert etag.startswith('W/')
+    response = client.get('/api/transactions', headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+    assert response.status_code == 304
+
+def test_small_or_unaccepted_responses_are_not_compressed(client):
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=rows(1)):
+        response = client.get('/api/transactions', headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=rows(100)):
+        response = client.get('/api/transactions?type=expense', headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_json()) == 100
+
+def test_streamed_export_is_compressed(client):
+    client.application.config['EXPORT_BATCH_SIZE'] = 10
+    with patch('app.models.Transaction.iter_by_user', return_value=iter(rows(50))):
+        response = client.get('/api/transactions/export?format=ndjson', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    lines = gzip.decompress(response.data).decode().splitlines()
+    assert [json.loads(line)["_id"] for line in lines] == [str(i) for i in range(50)]
+
+def test_zstd_when_installed(client):
+    zstandard = pytest.importorskip('zstandard')
+    assert 'zstd' in client.application.extensions['compression_encodings']
+
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=rows(100)):
+        response = client.get('/api/transactions', headers={'Accept-Encoding': 'gzip;q=0.5, zstd'})
+    assert response.headers['Content-Encoding'] == 'zstd'
+    assert json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(response.data)) == rows(100)
+
+    client.application.config['EXPORT_BATCH_SIZE'] = 10
+    with patch('app.models.Transaction.iter_by_user', return_value=iter(rows(50))):
+        response = client.get('/api/transactions/export?format=ndjson', headers={'Accept-Encoding': 'zstd'})
+    assert response.headers['Content-Encoding'] == 'zstd'
+    lines = zstandard.ZstdDecompressor().decompressobj().decompress(response.data).decode().splitlines()
+    assert len(lines) == 50
@@ -0,0 +1,50 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from app import create_app
+from app.indexes import INDEXES, ensure_indexes, plan_stages, find_collscans
+
+def test_ensure_indexes_creates_every_index():
+    db = MagicMock()
+
+    ensure_indexes(db)
+
+    assert db.__getitem__.return_value.create_index.call_count == len(INDEXES)
+    db.__getitem__.assert_any_call("transaction_rollups")
+
+def test_plan_stages_ignores_rejected_plans():
+    explain = {"queryPlanner": {
+        "winningPlan": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}},
+        "rejectedPlans": [{"stage": "COLLSCAN"}]
+    }}
+
+    assert plan_stages(explain) == ["FETCH", "IXSCAN"]
+
+def test_plan_stages_in_aggregate_explain():
+    explain = {"stages": [{"$cursor": {"queryPlanner": {
+        "winningPlan": {"queryPlan": {"stage": "PROJECTION_SIMPLE", "inputStage": {"stage": "COLLSCAN"}}}
+    }}}]}
+
+    assert plan_stages(explain) == ["PROJECTION_SIMPLE", "COLLSCAN"]
+
+def test_find_collscans_reports_scanning_queries():
+    db = MagicMock()
+    db.command.return_value = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+    db.__getitem__.return_value.find.return_value.sort.return_value.explain.return_value = \
+        {"queryPlanner": {"winningPlan": {"stage": "IXSCAN"}}}
+    db.__getitem__.return_value.find.return_value.explain.return_value = \
+        {"queryPlanner": {"winningPlan": {"stage": "IDHACK"}}}
+
+    failures = find_collscans(db)
+
+    # Only the aggregations were given a COLLSCAN plan
+    assert failures and all(stages == ["COLLSCAN"] for _, stages in failures)
+    assert db.command.call_count == len(failures)
+
+def test_check_indexes_command_fails_on_collscan():
+    app = create_app()
+    with patch('app.indexes.ensure_indexes'), \
+         patch('app.indexes.find_collscans', return_value=[("transaction list", ["COLLSCAN"])]):
+        result = app.test_cli_runner().invoke(args=['check-indexes'])
+
+    assert result.exit_code == 1
+    assert "COLLSCAN in transaction list" in result.output
@@ -1,9 +1,10 @@
 import pytest
 from datetime import datetime
-from app.models import User, Transaction, Category
+from app.models import User, Transaction, TransactionRollup, Category
 from unittest.mock import patch, MagicMock
 from bson import ObjectId
 from werkzeug.security import generate_password_hash
+from pymongo.errors import DuplicateKeyError
 import logging
 
 @pytest.fixture
@@ -77,11 +78,10 @@ def test_user_save(mock_db):
         "username": "testuser",
         "email": "test@example.com"
     }
-    mock_db.db.users.find_one.return_value = mock_saved_user
-    
     result = user.save()
     mock_db.db.users.insert_one.assert_called_once_with(user.to_dict())
-    assert result == mock_saved_user
+    assert result == {**user.to_dict(), **mock_saved_user}
+    mock_db.db.users.find_one.assert_not_called()
 
 def test_user_save_error(mock_db):
     user = User(
@@ -299,16 +299,22 @@ def test_category_create_error(mock_db):
     assert str(exc_info.value) == "Database error"
 
 def test_user_create_with_existing_email(mock_db):
-    # Mock find_one to return an existing user
-    mock_db.db.users.find_one.return_value = {
-        "_id": ObjectId("123456789012345678901234"),
-        "email": "test@example.com",
-        "username": "existinguser"
-    }
+    # The unique email index rejects the insert
+    mock_db.db.users.insert_one.side_effect = DuplicateKeyError(
+        "duplicate key", 11000, {"keyPattern": {"email": 1}}
+    )
     
     result = User.create("testuser", "test@example.com", "password123")
     assert result is None
-    mock_db.db.users.find_one.assert_called_once_with({"email": "test@example.com"})
+    mock_db.db.users.find_one.assert_not_called()
+
+def test_user_create_with_existing_username(mock_db):
+    mock_db.db.users.insert_one.side_effect = DuplicateKeyError(
+        "duplicate key", 11000, {"keyPattern": {"username": 1}}
+    )
+    
+    with pytest.raises(ValueError):
+        User.create("existinguser", "new@example.com", "password123")
 
 def test_user_login_valid(mock_db):
     mock_user = {
@@ -342,37 +348,41 @@ def test_user_login_nonexistent(mock_db):
     mock_db.db.users.find_one.assert_called_once_with({"email": "nonexistent@example.com"})
 
 def test_transaction_delete_success(mock_db):
-    mock_result = MagicMock()
-    mock_result.deleted_count = 1
-    mock_db.db.transactions.delete_one.return_value = mock_result
-    
     transaction_id = ObjectId("123456789012345678901234")
     user_id = "123456789012345678901234"
+    mock_db.db.transactions.find_one_and_delete.return_value = {
+        "_id": transaction_id,
+        "user_id": user_id,
+        "amount": -100.0,
+        "category": "Food",
+        "type": "expense",
+        "date": datetime(2024, 4, 22)
+    }
     
     result = Transaction.delete(transaction_id, user_id)
-    assert result is True
-    mock_db.db.transactions.delete_one.assert_called_once_with({
-        "_id": transaction_id,
-        "user_id": user_id
-    })
+    assert result["_id"] == str(transaction_id)
+    assert result["deltas"]["categories"] == {"_id": "Food", "total": 100.0}
+    assert result["deltas"]["monthly"] == {"_id": {"period": "2024-04-01", "type": "expense"}, "total": 100.0, "count": -1}
+    mock_db.db.transactions.find_one_and_delete.assert_called_once_with(
+        {"_id": transaction_id, "user_id": user_id},
+        projection=TransactionRollup.SOURCE_FIELDS
+    )
 
 def test_transaction_delete_not_found(mock_db):
-    mock_result = MagicMock()
-    mock_result.deleted_count = 0
-    mock_db.db.transactions.delete_one.return_value = mock_result
+    mock_db.db.transactions.find_one_and_delete.return_value = None
     
     transaction_id = ObjectId("123456789012345678901234")
     user_id = "123456789012345678901234"
     
     result = Transaction.delete(transaction_id, user_id)
-    assert result is False
-    mock_db.db.transactions.delete_one.assert_called_once_with({
-        "_id": transaction_id,
-        "user_id": user_id
-    })
+    assert result is None
+    mock_db.db.transactions.find_one_and_delete.assert_called_once_with(
+        {"_id": transaction_id, "user_id": user_id},
+        projection=TransactionRollup.SOURCE_FIELDS
+    )
 
 def test_transaction_delete_error(mock_db):
-    mock_db.db.transactions.delete_one.side_effect = Exception("Database error")
+    mock_db.db.transactions.find_one_and_delete.side_effect = Exception("Database error")
     
     transaction_id = ObjectId("123456789012345678901234")
     user_id = "123456789012345678901234"
@@ -432,7 +442,7 @@ def test_user_login_with_invalid_credentials(mock_db):
     mock_db.db.users.find_one.assert_called_once_with({"email": "test@example.com"})
 
 def test_transaction_delete_with_logging(mock_db, caplog):
-    mock_db.db.transactions.delete_one.side_effect = Exception("Database error")
+    mock_db.db.transactions.find_one_and_delete.side_effect = Exception("Database error")
     
     transaction_id = ObjectId("123456789012345678901234")
     user_id = "123456789012345678901234"
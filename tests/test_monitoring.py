@@ -0,0 +1,99 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from pymongo.monitoring import ConnectionCheckOutFailedReason
+from app import create_app, available_compressors
+from app.monitoring import CommandMetrics, PoolMetrics
+
+def test_pool_metrics_records_checkout_wait():
+    metrics = PoolMetrics()
+    with patch('app.monitoring.time.perf_counter', side_effect=[1.0, 1.02]):
+        metrics.connection_check_out_started(MagicMock())
+        metrics.connection_checked_out(MagicMock())
+
+    snapshot = metrics.snapshot()
+    assert snapshot["checkouts"] == 1
+    assert snapshot["wait_max_ms"] == pytest.approx(20.0)
+    assert snapshot["wait_buckets_ms"]["le_50"] == 1
+    assert snapshot["in_use"] == 1
+
+    metrics.connection_checked_in(MagicMock())
+    assert metrics.snapshot()["in_use"] == 0
+
+def test_pool_metrics_counts_timeouts():
+    metrics = PoolMetrics()
+    metrics.connection_check_out_started(MagicMock())
+    metrics.connection_check_out_failed(MagicMock(reason=ConnectionCheckOutFailedReason.TIMEOUT))
+    metrics.connection_check_out_failed(MagicMock(reason=ConnectionCheckOutFailedReason.CONN_ERROR))
+
+    snapshot = metrics.snapshot()
+    assert snapshot["timeouts"] == 1
+    assert snapshot["failures"] == 1
+
+def test_available_compressors_skips_missing_packages():
+    with patch('app.find_spec', side_effect=lambda name: name == 'zlib'):
+        assert available_compressors("zstd, snappy,zlib") == "zlib"
+
+def test_default_compressors_include_zstd():
+    pytest.importorskip('zstandard')
+    with patch('app.mongo.init_app'), patch('app.mongo.db'):
+        app = create_app()
+    assert app.config['MONGO_CLIENT_OPTIONS']['compressors'] == "zstd,zlib"
+
+def test_create_app_passes_pool_options():
+    with patch('app.mongo.init_app') as mock_init, \
+         patch('app.mongo.db'), \
+         patch.dict('os.environ', {'MONGO_MAX_POOL_SIZE': '8', 'MONGO_WRITE_CONCERN': 'majority'}):
+        app = create_app()
+
+    options = mock_init.call_args[1]
+    assert options['maxPoolSize'] == 8
+    assert options['w'] == 'majority'
+    assert options['waitQueueTimeoutMS'] == app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS']
+    assert app.extensions['mongo_pool_metrics'] in options['event_listeners']
+
+def test_pool_metrics_endpoint():
+    app = create_app()
+    response = app.test_client().get('/api/health/pool')
+    assert response.status_code == 200
+    assert response.get_json()["checkouts"] >= 0
+
+def command_events(name, command, reply, micros):
+    started = MagicMock(command_name=name, command=command, connection_id=("localhost", 27017), request_id=1)
+    finished = MagicMock(command_name=name, connection_id=("localhost", 27017), request_id=1,
+                         duration_micros=micros, reply=reply, database_name="finance_tracker")
+    return started, finished
+
+def test_command_metrics_record_and_log_slow_commands(caplog):
+    metrics = CommandMetrics(slow_ms=100)
+    metrics.begin_request()
+    command = {"aggregate": "transactions", "pipeline": [{"$match": {"user_id": 1, "date": {"$gte": 2}}}, {"$group": {}}]}
+    started, succeeded = command_events("aggregate", command, {"cursor": {"firstBatch": [{}, {}, {}]}}, 250000)
+
+    metrics.started(started)
+    metrics.succeeded(succeeded)
+
+    assert metrics.returned[("aggregate", "transactions")] == 3
+    assert metrics.slow[("aggregate", "transactions")] == 1
+    assert metrics.request_totals() == (1, 250.0)
+    # The log names the fields and stages, never the values
+    assert "pipeline=[$match{user_id,date}, $group]" in caplog.text
+    assert "$gte" not in caplog.text
+
+def test_command_metrics_skip_handshakes():
+    metrics = CommandMetrics()
+    started, succeeded = command_events("hello", {"hello": 1}, {"ok": 1}, 500)
+    metrics.started(started)
+    metrics.succeeded(succeeded)
+    assert metrics.durations == {}
+
+def test_requests_are_timed_and_exported():
+    app = create_app()
+    client = app.test_client()
+
+    response = client.get('/api/health/pool')
+    assert response.headers['Server-Timing'].startswith('app;dur=')
+
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",endpoint="main.pool_metrics",status="200"} 1' in body
+    assert 'mongodb_pool_connections{state="in_use"}' in body
+    assert '# TYPE mongodb_command_duration_seconds histogram' in body
@@ -0,0 +1,104 @@
+import pytest
+from bson import ObjectId
+from concurrent.futures import Future
+from unittest.mock import patch
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import create_app, hasher
+from app.models import User
+from app.passwords import HashPool, HasherBusy
+
+@pytest.fixture
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    yield app
+    pool = app.extensions['password_hasher'].pool
+    if pool is not None:
+        pool.shutdown()
+
+def test_hash_uses_configured_method(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    app.config['PASSWORD_SALT_LENGTH'] = 8
+    hasher.init_app(app)
+
+    with app.app_context():
+        password_hash = hasher.hash("password123")
+
+    assert password_hash.startswith('pbkdf2:sha256:1000$')
+    assert len(password_hash.split('$')[1]) == 8
+    assert check_password_hash(password_hash, "password123")
+
+def test_verify_in_process_pool(app):
+    password_hash = generate_password_hash("password123", 'pbkdf2:sha256:1000')
+
+    with app.app_context():
+        assert app.extensions['password_hasher'].pool is not None
+        assert hasher.verify(password_hash, "password123")
+        assert not hasher.verify(password_hash, "wrongpassword")
+
+def test_needs_rehash(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    hasher.init_app(app)
+
+    with app.app_context():
+        assert not hasher.needs_rehash(generate_password_hash("password123", 'pbkdf2:sha256:1000', 16))
+        assert hasher.needs_rehash(generate_password_hash("password123", 'pbkdf2:sha256:2000', 16))
+        assert hasher.needs_rehash(generate_password_hash("password123", 'pbkdf2:sha256:1000', 8))
+        assert not hasher.needs_rehash("invalid_hash_format")
+
+def test_needs_rehash_outside_app_context():
+    assert not hasher.needs_rehash(generate_password_hash("password123", 'pbkdf2:sha256:1000'))
+
+def test_login_rehashes_outdated_hash(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    hasher.init_app(app)
+    old_hash = generate_password_hash("password123", 'pbkdf2:sha256:2000')
+    user = {"_id": ObjectId("656f99ab8a5f3c2ef4c50b1a"), "email": "test@example.com", "password_hash": old_hash}
+
+    with app.app_context(), patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.users.find_one.return_value = user
+
+        assert User.login("test@example.com", "password123") is user
+
+        query, update = mock_mongo.db.users.update_one.call_args[0]
+        assert query == {"_id": user["_id"], "password_hash": old_hash}
+        new_hash = update["$set"]["password_hash"]
+        assert new_hash.startswith('pbkdf2:sha256:1000$')
+        assert check_password_hash(new_hash, "password123")
+
+def test_pool_sheds_load_when_full():
+    pool = HashPool(workers=1, queue=0, timeout=0.01)
+    pool._slots.acquire()
+
+    with pytest.raises(HasherBusy):
+        pool.run(check_password_hash, "hash", "password")
+
+def test_pool_holds_slots_until_hashes_leave_it():
+    pool = HashPool(workers=1, queue=0, timeout=0.01)
+    queued, running = Future(), Future()
+    running.set_running_or_notify_cancel()
+
+    with patch.object(pool, '_get_executor') as mock_executor:
+        # A queued hash that times out is cancelled, freeing its slot
+        mock_executor.return_value.submit.return_value = queued
+        with pytest.raises(HasherBusy):
+            pool.run(check_password_hash, "hash", "password")
+        assert queued.cancelled()
+
+        # A running one keeps its slot until it finishes
+        mock_executor.return_value.submit.return_value = running
+        with pytest.raises(HasherBusy):
+            pool.run(check_password_hash, "hash", "password")
+        assert not pool._slots.acquire(blocking=False)
+        running.set_result(True)
+        assert pool._slots.acquire(blocking=False)
+
+def test_login_route_returns_503_when_busy():
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.test_client() as client, \
+         patch('app.models.User.login', side_effect=HasherBusy("busy")):
+        response = client.post('/login', data={"email": "test@example.com", "password": "password123"})
+        assert response.status_code == 503
@@ -0,0 +1,151 @@
+import pytest
+from bson import ObjectId
+from unittest.mock import MagicMock, patch
+from app.models import Transaction, TransactionRollup
+from datetime import datetime
+
+USER_ID = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+
+def test_create_transaction_updates_rollup():
+    mock_result = MagicMock()
+    mock_result.inserted_id = ObjectId("656f99ab8a5f3c2ef4c50b1b")
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.insert_one.return_value = mock_result
+
+        Transaction.create({
+            "user_id": USER_ID,
+            "amount": 40.0,
+            "type": "expense",
+            "category": "Food",
+            "description": "Groceries",
+            "date": datetime(2024, 3, 15)
+        })
+
+        mock_mongo.db.transaction_rollups.update_one.assert_called_once_with(
+            {"user_id": USER_ID, "year": 2024, "month": 3, "category": "Food", "type": "expense"},
+            {"$inc": {"total": -40.0, "count": 1}},
+            upsert=True
+        )
+
+def test_apply_skips_non_date():
+    with patch('app.models.mongo') as mock_mongo:
+        TransactionRollup.apply({
+            "user_id": USER_ID,
+            "amount": 10.0,
+            "category": "Food",
+            "type": "income",
+            "date": "2024-03-15"
+        })
+
+        mock_mongo.db.transaction_rollups.update_one.assert_not_called()
+
+def test_monthly_reads_rollups():
+    mock_result = [{"_id": {"year": 2024, "month": 3}, "total": -40.0}]
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transaction_rollups.aggregate.return_value = mock_result
+
+        result = TransactionRollup.monthly(USER_ID)
+
+        assert result == mock_result
+        pipeline = mock_mongo.db.transaction_rollups.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"user_id": USER_ID, "count": {"$gt": 0}}}
+        mock_mongo.db.transactions.aggregate.assert_not_called()
+
+def test_by_category_reads_rollups():
+    with patch('app.models.mongo') as mock_mongo:
+        TransactionRollup.by_category(USER_ID)
+
+        pipeline = mock_mongo.db.transaction_rollups.aggregate.call_args[0][0]
+        assert pipeline[1]["$group"]["_id"] == "$category"
+        assert pipeline[2] == {"$sort": {"total": -1}}
+
+def test_rebuild_for_user():
+    with patch('app.models.mongo') as mock_mongo:
+        TransactionRollup.rebuild(USER_ID)
+
+        pipeline = mock_mongo.db.transactions.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {"user_id": USER_ID, "date": {"$type": "date"}}}
+        assert pipeline[-1]["$merge"]["into"] == "transaction_rollups"
+        # Stale keys are only removed once the fresh totals are merged in
+        rebuild_id = pipeline[-2]["$replaceWith"]["$mergeObjects"][1]["rebuild_id"]
+        mock_mongo.db.transaction_rollups.delete_many.assert_called_once_with(
+            {"user_id": USER_ID, "rebuild_id": {"$ne": rebuild_id}}
+        )
+        mock_mongo.db.rollup_repairs.delete_many.assert_called_once_with({"_id": USER_ID})
+
+def test_rebuild_error():
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transaction_rollups.delete_many.side_effect = Exception("Database error")
+
+        with pytest.raises(Exception) as exc_info:
+            TransactionRollup.rebuild()
+        assert str(exc_info.value) == "Database error"
+
+def test_covers_filters():
+    assert TransactionRollup.covers({})
+    assert TransactionRollup.covers({"categories": ["Food"], "type": "expense"})
+    assert not TransactionRollup.covers({"date_from": datetime(2024, 1, 1)})
+    assert not TransactionRollup.covers({"min_amount": 5.0})
+    assert not TransactionRollup.covers({"max_amount": 0.0})
+
+def test_by_category_with_filters():
+    with patch('app.models.mongo') as mock_mongo:
+        TransactionRollup.by_category(USER_ID, {"categories": ["Food", "Bills"], "type": "expense"})
+
+        pipeline = mock_mongo.db.transaction_rollups.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {
+            "user_id": USER_ID,
+            "count": {"$gt": 0},
+            "category": {"$in": ["Food", "Bills"]},
+            "type": "expense"
+        }}
+
+def test_create_survives_rollup_failure():
+    mock_result = MagicMock()
+    mock_result.inserted_id = ObjectId("656f99ab8a5f3c2ef4c50b1b")
+
+    with patch('app.models.mongo') as mock_mongo, \
+         patch('app.models.cache') as mock_cache, \
+         patch('app.models.TransactionRollup.rebuild') as mock_rebuild:
+        mock_mongo.db.transactions.insert_one.return_value = mock_result
+        mock_mongo.db.transaction_rollups.update_one.side_effect = Exception("Database error")
+
+        result = Transaction.create({
+            "user_id": USER_ID,
+            "amount": 40.0,
+            "type": "expense",
+            "category": "Food",
+            "description": "Groceries",
+            "date": datetime(2024, 3, 15)
+        })
+
+        assert result["_id"] == str(mock_result.inserted_id)
+        assert result["transaction"]["date"] == "2024-03-15T00:00:00"
+        mock_rebuild.assert_called_once_with(USER_ID)
+        mock_cache.bump.assert_called_once_with(USER_ID)
+
+def test_reconcile_queues_repair_when_rebuild_fails():
+    with patch('app.models.mongo') as mock_mongo, \
+         patch('app.models.TransactionRollup.rebuild', side_effect=Exception("Database error")):
+        TransactionRollup.reconcile(USER_ID, Exception("Database error"))
+
+        query, update = mock_mongo.db.rollup_repairs.update_one.call_args[0]
+        assert query == {"_id": USER_ID}
+        assert "queued_at" in update["$set"]
+
+def test_repair_pending():
+    with patch('app.models.mongo') as mock_mongo, \
+         patch('app.models.TransactionRollup.rebuild') as mock_rebuild:
+        mock_mongo.db.rollup_repairs.find.return_value = [{"_id": USER_ID}]
+
+        assert TransactionRollup.repair_pending() == 1
+        mock_rebuild.assert_called_once_with(USER_ID)
+
+def test_monthly_pipeline_groups_quarters():
+    pipeline = TransactionRollup.monthly_pipeline(USER_ID, None, "quarter")
+
+    first_month = pipeline[1]["$group"]["_id"]["month"]
+    assert first_month == {"$subtract": ["$month", {"$mod": [{"$subtract": ["$month", 1]}, 3]}]}
+    assert pipeline[-1]["$project"]["_id"]["type"] == "$_id.type"
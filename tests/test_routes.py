@@ -1,4 +1,5 @@
 import pytest
+import io
 from unittest.mock import patch, MagicMock
 from app import create_app
 from datetime import datetime
@@ -6,19 +7,6 @@ from bson import ObjectId
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from flask import session
 
-@pytest.fixture
-def client():
-    app = create_app()
-    app.config['TESTING'] = True
-    app.config['MONGO_URI'] = 'mongodb://localhost:27017/test_db'
-    app.config['WTF_CSRF_ENABLED'] = False
-    
-    with app.test_client() as client:
-        with client.session_transaction() as sess:
-            sess['user_id'] = "656f99ab8a5f3c2ef4c50b1a"
-            sess['username'] = "testuser"
-        yield client
-
 @pytest.fixture
 def unauth_client():
     app = create_app()
@@ -53,8 +41,7 @@ def test_register_success(unauth_client):
         "email": "newuser@example.com"
     }
 
-    with patch('app.models.User.get_by_email', return_value=None), \
-         patch('app.models.User.create', return_value=mock_user):
+    with patch('app.models.User.create', return_value=mock_user):
         response = unauth_client.post('/register', data={
             "username": "newuser",
             "email": "newuser@example.com",
@@ -66,10 +53,8 @@ def test_register_success(unauth_client):
         assert response.headers['Location'].endswith('/dashboard')
 
 def test_register_existing_email(unauth_client):
-    mock_user = {"username": "existinguser"}
-
     with patch('app.routes.render_template', return_value='') as mock_render:
-        with patch('app.models.User.get_by_email', return_value=mock_user):
+        with patch('app.models.User.create', return_value=None) as mock_create:
             response = unauth_client.post('/register', data={
                 "username": "existinguser",
                 "email": "test@example.com",
@@ -79,6 +64,20 @@ def test_register_existing_email(unauth_client):
 
             assert response.status_code == 200
             mock_render.assert_called_with('register.html', error="Email already registered")
+            mock_create.assert_called_once_with("existinguser", "test@example.com", "password123")
+
+def test_register_existing_username(unauth_client):
+    with patch('app.routes.render_template', return_value='') as mock_render:
+        with patch('app.models.User.create', side_effect=ValueError("Username already taken")):
+            response = unauth_client.post('/register', data={
+                "username": "existinguser",
+                "email": "new@example.com",
+                "password": "password123",
+                "confirm_password": "password123"
+            })
+
+            assert response.status_code == 200
+            mock_render.assert_called_with('register.html', error="Username already taken")
 
 def test_register_missing_fields(unauth_client):
     with patch('app.routes.render_template', return_value='') as mock_render:
@@ -90,8 +89,7 @@ def test_register_missing_fields(unauth_client):
 
 def test_register_user_db_error(unauth_client):
     with patch('app.routes.render_template', return_value='') as mock_render:
-        with patch('app.models.User.get_by_email', return_value=None), \
-             patch('app.models.User.create', return_value=None):
+        with patch('app.models.User.create', side_effect=ConnectionFailure("DB Error")):
             response = unauth_client.post('/register', data={
                 "username": "newuser",
                 "email": "test@example.com",
@@ -99,22 +97,21 @@ def test_register_user_db_error(unauth_client):
                 "confirm_password": "password123"
             })
             assert response.status_code == 200
-            mock_render.assert_called_with('register.html', error="Failed to create account")
+            mock_render.assert_called_with('register.html', error="An error occurred. Please try again.")
 
 def test_get_transactions_success(client):
     mock_transactions = [
         {
-            "_id": ObjectId("123456789012345678901234"),
+            "_id": "123456789012345678901234",
             "amount": -100.0,
             "category": "Food",
             "description": "Groceries",
-            "date": datetime.now(),
-            "user_id": "656f99ab8a5f3c2ef4c50b1a",
+            "date": "2024-04-01T00:00:00",
             "type": "expense"
         }
     ]
     
-    with patch('app.models.Transaction.get_by_user', return_value=mock_transactions):
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=mock_transactions):
         response = client.get('/api/transactions')
         assert response.status_code == 200
         data = response.get_json()
@@ -123,8 +120,40 @@ def test_get_transactions_success(client):
         assert data[0]["category"] == "Food"
         assert "_id" in data[0]
 
+def test_get_transactions_columnar(client):
+    columns = {"count": 0, "columns": {"date": [], "amount": [], "type": [], "category": []},
+               "dictionaries": {"type": [], "category": []}}
+    accept = 'application/vnd.finance-tracker.columns+json'
+
+    with patch('app.models.Transaction.get_columns', return_value=columns) as mock_columns:
+        response = client.get('/api/transactions?type=expense', headers={'Accept': accept})
+        assert response.status_code == 200
+        assert response.mimetype == accept
+        assert 'Accept' in response.headers['Vary']
+        assert response.get_json(force=True) == columns
+        assert mock_columns.call_args[0][1]["type"] == "expense"
+
+        # Cached per representation, with its content type
+        again = client.get('/api/transactions?type=expense', headers={'Accept': accept})
+        assert again.mimetype == accept
+        mock_columns.assert_called_once()
+
+    # Rows stay the default, and the fallback for types the server can't produce
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=[]):
+        response = client.get('/api/transactions?type=expense', headers={'Accept': 'application/x-unknown'})
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == []
+
+def test_parse_columnar_format():
+    from app.routes import parse_columnar_format
+    with patch.dict('app.columnar.ENCODERS', {'application/msgpack': lambda columns: b''}):
+        assert parse_columnar_format('application/msgpack, application/json;q=0.5') == 'application/msgpack'
+        assert parse_columnar_format('application/json, application/msgpack') is None
+        assert parse_columnar_format('*/*') is None
+        assert parse_columnar_format(None) is None
+
 def test_get_transactions_db_error(client):
-    with patch('app.models.Transaction.get_by_user', side_effect=ConnectionFailure("DB Error")):
+    with patch('app.models.Transaction.get_serialized_by_user', side_effect=ConnectionFailure("DB Error")):
         response = client.get('/api/transactions')
         assert response.status_code == 500
         assert "error" in response.get_json()
@@ -164,12 +193,14 @@ def test_create_transaction_db_error(client):
         assert "error" in response.get_json()
 
 def test_delete_transaction_success(client):
-    with patch('app.models.Transaction.delete', return_value=True):
+    result = {"_id": "123456789012345678901234", "deltas": None, "version": 3}
+    with patch('app.models.Transaction.delete', return_value=result):
         response = client.delete('/api/transactions/123456789012345678901234')
-        assert response.status_code == 204
+        assert response.status_code == 200
+        assert response.get_json() == result
 
 def test_delete_transaction_not_found(client):
-    with patch('app.models.Transaction.delete', return_value=False):
+    with patch('app.models.Transaction.delete', return_value=None):
         response = client.delete('/api/transactions/123456789012345678901234')
         assert response.status_code == 404
         assert response.get_json() == {"error": "Transaction not found"}
@@ -189,13 +220,13 @@ def test_monthly_analytics(client):
         }
     ]
 
-    with patch('app.models.Transaction.aggregate') as mock_aggregate:
+    with patch('app.models.TransactionRollup.aggregate') as mock_aggregate:
         mock_aggregate.return_value = mock_data
         response = client.get('/api/analytics/monthly')
         assert response.status_code == 200
 
 def test_monthly_analytics_db_error(client):
-    with patch('app.models.Transaction.aggregate') as mock_aggregate:
+    with patch('app.models.TransactionRollup.aggregate') as mock_aggregate:
         mock_aggregate.side_effect = ConnectionFailure("DB Error")
         response = client.get('/api/analytics/monthly')
         assert response.status_code == 500
@@ -210,7 +241,7 @@ def test_category_analytics(client):
         }
     ]
     
-    with patch('app.models.Transaction.aggregate') as mock_aggregate:
+    with patch('app.models.TransactionRollup.aggregate') as mock_aggregate:
         mock_aggregate.return_value = mock_data
         response = client.get('/api/analytics/categories')
         assert response.status_code == 200
@@ -220,7 +251,7 @@ def test_category_analytics(client):
         assert data[0]["total"] == 500.0
 
 def test_category_analytics_db_error(client):
-    with patch('app.models.Transaction.aggregate', side_effect=ConnectionFailure("DB Error")):
+    with patch('app.models.TransactionRollup.aggregate', side_effect=ConnectionFailure("DB Error")):
         response = client.get('/api/analytics/categories')
         assert response.status_code == 500
         assert "error" in response.get_json()
@@ -320,3 +351,321 @@ def test_logout(client):
     with client.session_transaction() as sess:
         assert 'user_id' not in sess
         assert 'username' not in sess
+
+def test_get_transactions_page(client):
+    mock_transactions = [
+        {
+            "_id": "123456789012345678901234",
+            "amount": -100.0,
+            "category": "Food",
+            "description": "Groceries",
+            "date": "2024-04-01T00:00:00",
+            "type": "expense"
+        }
+    ]
+
+    with patch('app.models.Transaction.get_page', return_value=(mock_transactions, "next")) as mock_get_page:
+        response = client.get('/api/transactions?limit=1')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["next_cursor"] == "next"
+        assert data["transactions"] == mock_transactions
+        mock_get_page.assert_called_once_with(ObjectId("656f99ab8a5f3c2ef4c50b1a"), 1, None, {})
+
+def test_get_transactions_page_clamps_limit(client):
+    with patch('app.models.Transaction.get_page', return_value=([], None)) as mock_get_page:
+        response = client.get('/api/transactions?limit=100000')
+        assert response.status_code == 200
+        assert mock_get_page.call_args[0][1] == 500
+
+def test_get_transactions_page_invalid_cursor(client):
+    response = client.get('/api/transactions?after=garbage')
+    assert response.status_code == 400
+    assert "error" in response.get_json()
+
+def export_rows(count):
+    return [
+        {
+            "_id": f"{i:024d}",
+            "amount": -10.0,
+            "category": "Food",
+            "description": f"Item {i}",
+            "date": "2024-04-01T00:00:00",
+            "type": "expense"
+        }
+        for i in range(count)
+    ]
+
+def test_export_transactions_json(client):
+    client.application.config['EXPORT_BATCH_SIZE'] = 2
+    with patch('app.models.Transaction.iter_by_user', return_value=iter(export_rows(5))):
+        response = client.get('/api/transactions/export')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        data = response.get_json()
+        assert len(data) == 5
+        assert data[4]["description"] == "Item 4"
+
+def test_export_transactions_ndjson(client):
+    with patch('app.models.Transaction.iter_by_user', return_value=iter(export_rows(3))):
+        response = client.get('/api/transactions/export?format=ndjson')
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        lines = response.get_data(as_text=True).splitlines()
+        assert len(lines) == 3
+
+def test_export_transactions_empty(client):
+    with patch('app.models.Transaction.iter_by_user', return_value=iter([])):
+        response = client.get('/api/transactions/export')
+        assert response.get_json() == []
+
+def test_export_transactions_invalid_format(client):
+    response = client.get('/api/transactions/export?format=xml')
+    assert response.status_code == 400
+
+def test_import_transactions_json(client):
+    rows = [
+        {"description": "Rent", "amount": "500", "category": "Bills", "type": "expense", "date": "2024-04-01"},
+        {"description": "Pay", "amount": 1200, "category": "Salary", "type": "income", "date": "2024-04-02"},
+        {"description": "Bad", "amount": "abc", "category": "Food", "type": "expense", "date": "2024-04-03"},
+        {"description": "Missing date", "amount": 5, "category": "Food", "type": "expense"}
+    ]
+
+    with patch('app.models.Transaction.bulk_create', return_value=(2, [])) as mock_bulk_create:
+        response = client.post('/api/transactions/import', json=rows)
+        assert response.status_code == 201
+        data = response.get_json()
+        assert data["inserted"] == 2
+        assert [error["row"] for error in data["errors"]] == [3, 4]
+        documents = mock_bulk_create.call_args[0][0]
+        assert documents[0]["amount"] == -500.0
+        assert documents[1]["user_id"] == ObjectId("656f99ab8a5f3c2ef4c50b1a")
+
+def test_import_transactions_rejects_non_finite_amounts_and_non_string_fields(client):
+    row = {"description": "Rent", "amount": "500", "category": "Bills", "type": "expense", "date": "2024-04-01"}
+    rows = [
+        {**row, "amount": "nan"},
+        {**row, "amount": "inf"},
+        {**row, "amount": "1e400"},
+        {**row, "description": {"$gt": ""}},
+        {**row, "category": ["Bills", "Food"]},
+        row
+    ]
+
+    with patch('app.models.Transaction.bulk_create', return_value=(1, [])) as mock_bulk_create:
+        response = client.post('/api/transactions/import', json=rows)
+        assert response.status_code == 201
+        assert [error["row"] for error in response.get_json()["errors"]] == [1, 2, 3, 4, 5]
+        assert len(mock_bulk_create.call_args[0][0]) == 1
+
+def test_import_transactions_csv(client):
+    csv_data = (
+        "description,amount,category,type,date\n"
+        "Coffee,3.50,Food,expense,2024-04-01\n"
+        "Refund,10,Other,income,2024-04-02\n"
+    )
+
+    with patch('app.models.Transaction.bulk_create', return_value=(1, [(1, "duplicate key")])) as mock_bulk_create:
+        response = client.post('/api/transactions/import', data={
+            'file': (io.BytesIO(csv_data.encode()), 'statement.csv')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 201
+        assert response.get_json()["errors"] == [{"row": 2, "error": "duplicate key"}]
+        assert len(mock_bulk_create.call_args[0][0]) == 2
+
+def test_import_transactions_invalid_body(client):
+    response = client.post('/api/transactions/import', json={"description": "Not a list"})
+    assert response.status_code == 400
+
+def test_import_transactions_too_many_rows(client):
+    client.application.config['IMPORT_MAX_ROWS'] = 1
+    row = {"description": "Rent", "amount": 1, "category": "Bills", "type": "expense", "date": "2024-04-01"}
+    response = client.post('/api/transactions/import', json=[row, row])
+    assert response.status_code == 413
+
+def test_import_transactions_empty(client):
+    with patch('app.models.Transaction.bulk_create', return_value=(0, [])):
+        response = client.post('/api/transactions/import', json=[])
+        assert response.status_code == 200
+        assert response.get_json() == {"inserted": 0, "errors": []}
+
+def test_import_transactions_partial_failure(client):
+    from app.models import BulkImportError
+    row = {"description": "Rent", "amount": 1, "category": "Bills", "type": "expense", "date": "2024-04-01"}
+    error = BulkImportError("DB Error", 1000)
+    error.__cause__ = ConnectionFailure("DB Error")
+    with patch('app.models.Transaction.bulk_create', side_effect=error):
+        response = client.post('/api/transactions/import', json=[row])
+        assert response.status_code == 503
+        assert response.get_json()["inserted"] == 1000
+
+def test_get_transactions_with_filters(client):
+    with patch('app.models.Transaction.get_serialized_by_user', return_value=[]) as mock_get:
+        response = client.get('/api/transactions?from=2024-04-01&to=2024-04-30&category=Food&category=Bills'
+                              '&type=expense&min_amount=10&max_amount=-50')
+        assert response.status_code == 200
+        assert mock_get.call_args[0][1] == {
+            'date_from': datetime(2024, 4, 1),
+            'date_to': datetime(2024, 5, 1),
+            'categories': ['Food', 'Bills'],
+            'type': 'expense',
+            'min_amount': 10.0,
+            'max_amount': 50.0
+        }
+
+def test_get_transactions_invalid_filter(client):
+    assert client.get('/api/transactions?from=yesterday').status_code == 400
+    assert client.get('/api/transactions?type=transfer').status_code == 400
+
+def test_monthly_analytics_category_filter_uses_rollups(client):
+    with patch('app.models.TransactionRollup.aggregate', return_value=[]) as mock_rollup, \
+         patch('app.models.Transaction.aggregate') as mock_raw:
+        response = client.get('/api/analytics/monthly?category=Food')
+        assert response.status_code == 200
+        pipeline = mock_rollup.call_args[0][0]
+        assert pipeline[0]["$match"]["category"] == "Food"
+        assert pipeline[1]["$group"]["_id"] == {"year": "$year", "month": "$month", "type": "$type"}
+        mock_raw.assert_not_called()
+
+def test_category_analytics_date_filter_uses_transactions(client):
+    with patch('app.models.TransactionRollup.aggregate') as mock_rollup, \
+         patch('app.models.Transaction.aggregate', return_value=[]) as mock_raw:
+        response = client.get('/api/analytics/categories?from=2024-04-01')
+        assert response.status_code == 200
+        assert mock_raw.call_args[0][0][0]["$match"]["date"] == {"$gte": datetime(2024, 4, 1)}
+        mock_rollup.assert_not_called()
+
+def test_analytics_zero_amount_filter_skips_rollups(client):
+    with patch('app.models.TransactionRollup.aggregate') as mock_rollup, \
+         patch('app.models.Transaction.aggregate', return_value=[]) as mock_raw:
+        response = client.get('/api/analytics/monthly?max_amount=0')
+        assert response.status_code == 200
+        mock_rollup.assert_not_called()
+        assert "$and" in mock_raw.call_args[0][0][0]["$match"]
+
+def test_monthly_analytics_weeks_in_timezone(client):
+    with patch('app.models.Transaction.aggregate', return_value=[]) as mock_raw:
+        response = client.get('/api/analytics/monthly?bucket=week&tz=America/New_York&from=2024-03-01&to=2024-03-31')
+        assert response.status_code == 200
+        pipeline = mock_raw.call_args[0][0]
+        # Local midnights: EST on March 1st, EDT after March 10th
+        assert pipeline[0]["$match"]["date"] == {
+            "$gte": datetime(2024, 3, 1, 5), "$lt": datetime(2024, 4, 1, 4), "$type": "date"
+        }
+        assert pipeline[1]["$group"]["_id"]["period"] == {"$dateTrunc": {
+            "date": "$date", "unit": "week", "timezone": "America/New_York", "startOfWeek": "monday"
+        }}
+
+def test_filters_convert_timestamps_with_offsets(client):
+    with patch('app.models.Transaction.aggregate', return_value=[]) as mock_raw:
+        response = client.get('/api/analytics/monthly?from=2024-01-01T00:00:00Z&to=2024-03-01T00:00:00%2B02:00')
+        assert response.status_code == 200
+        assert mock_raw.call_args[0][0][0]["$match"]["date"] == {
+            "$gte": datetime(2024, 1, 1), "$lt": datetime(2024, 2, 29, 22), "$type": "date"
+        }
+
+        # An explicit offset wins over tz; bare times are still local to tz
+        response = client.get('/api/analytics/monthly?tz=America/New_York&bucket=day'
+                              '&from=2024-03-01T00:00:00%2B02:00&to=2024-03-02T00:00:00')
+        assert response.status_code == 200
+        assert mock_raw.call_args[0][0][0]["$match"]["date"] == {
+            "$gte": datetime(2024, 2, 29, 22), "$lt": datetime(2024, 3, 2, 5), "$type": "date"
+        }
+
+        response = client.get('/api/analytics/balance?from=2024-03-01T00:00:00Z&to=2024-03-31T00:00:00%2B02:00')
+        assert response.status_code == 200
+        assert mock_raw.call_args[0][0][0]["$match"]["date"] == {"$lt": datetime(2024, 3, 30, 22), "$type": "date"}
+
+    with patch('app.models.TransactionRollup.aggregate', return_value=[]), \
+         patch('app.models.Transaction.aggregate', return_value=[]):
+        assert client.get('/api/charts/monthly?from=2024-01-01T00:00:00Z').status_code == 200
+
+def test_monthly_analytics_quarters_read_rollups(client):
+    rows = [{"_id": {"period": "2024-04-01", "type": "expense"}, "total": -40.0, "count": 2}]
+    with patch('app.models.TransactionRollup.aggregate', return_value=rows) as mock_rollup:
+        response = client.get('/api/analytics/monthly?bucket=quarter')
+        assert response.get_json() == rows
+        assert mock_rollup.call_args[0][0][1]["$group"]["_id"]["year"] == "$year"
+
+def test_monthly_analytics_invalid_buckets(client):
+    assert client.get('/api/analytics/monthly?bucket=hour').status_code == 400
+    assert client.get('/api/analytics/monthly?tz=Mars/Olympus').status_code == 400
+    # 400 days at most per daily aggregation
+    response = client.get('/api/analytics/monthly?bucket=day&from=2020-01-01&to=2024-01-01')
+    assert response.status_code == 400
+    assert "bucket=day" in response.get_json()["error"]
+
+def test_balance_analytics(client):
+    rows = [{"_id": "2024-03-01", "income": 0, "expense": -20.0, "net": -20.0, "count": 1, "balance": -20.0}]
+    with patch('app.models.Transaction.aggregate', return_value=rows) as mock_raw:
+        response = client.get('/api/analytics/balance?from=2024-03-01&to=2024-03-31')
+        assert response.status_code == 200
+        assert response.get_json()["points"][0]["balance"] == -20.0
+        # Daily by default
+        assert mock_raw.call_args[0][0][1]["$group"]["_id"]["$cond"][2]["$dateTrunc"]["unit"] == "day"
+
+    assert client.get('/api/analytics/balance?bucket=hour').status_code == 400
+    response = client.get('/api/analytics/balance?from=2020-01-01&to=2024-01-01')
+    assert response.status_code == 400
+    assert "bucket=day" in response.get_json()["error"]
+
+def test_transactions_reject_non_finite_amount(client):
+    for value in ('nan', 'inf', '-inf'):
+        response = client.get(f'/api/transactions?min_amount={value}')
+        assert response.status_code == 400
+
+def test_dashboard(client):
+    payload = {"transactions": [], "next_cursor": None, "charts": {}, "version": 0}
+    with patch('app.models.Dashboard.load', return_value=payload) as mock_load:
+        response = client.get('/api/dashboard?limit=20&type=expense&top=3')
+        assert response.status_code == 200
+        assert response.get_json() == payload
+        mock_load.assert_called_once_with(ObjectId("656f99ab8a5f3c2ef4c50b1a"), 20, {'type': 'expense'}, 3)
+
+def test_dashboard_invalid_limit(client):
+    assert client.get('/api/dashboard?limit=0').status_code == 400
+
+def test_dashboard_db_error(client):
+    with patch('app.models.Dashboard.load', side_effect=ConnectionFailure("DB Error")):
+        response = client.get('/api/dashboard')
+        assert response.status_code == 503
+
+def test_transaction_changes(client):
+    result = {"version": 4, "changes": [], "reset": False}
+    with patch('app.models.TransactionChange.since', return_value=result) as mock_since:
+        response = client.get('/api/transactions/changes?since=4')
+        assert response.status_code == 200
+        assert response.get_json() == result
+        mock_since.assert_called_once_with(ObjectId("656f99ab8a5f3c2ef4c50b1a"), 4)
+
+def test_transaction_changes_invalid_since(client):
+    for since in ('', 'abc', '-1'):
+        assert client.get(f'/api/transactions/changes?since={since}').status_code == 400
+
+def test_monthly_chart(client):
+    rows = [
+        {"_id": {"period": "2024-01-01", "type": "income"}, "total": 100.0},
+        {"_id": {"period": "2024-03-01", "type": "expense"}, "total": -40.0}
+    ]
+    with patch('app.models.TransactionRollup.aggregate', return_value=rows):
+        response = client.get('/api/charts/monthly')
+        assert response.status_code == 200
+        assert response.get_json() == {
+            "labels": ["2024-01", "2024-02", "2024-03"],
+            "income": [100.0, 0.0, 0.0],
+            "expense": [0.0, 0.0, 40.0]
+        }
+
+def test_category_chart_date_filter_uses_transactions(client):
+    with patch('app.models.Transaction.aggregate', return_value=[{"top": [], "other": []}]) as mock_aggregate:
+        response = client.get('/api/charts/categories?from=2024-04-01&top=2')
+        assert response.status_code == 200
+        assert response.get_json()["top"] == 2
+        match = mock_aggregate.call_args[0][0][0]["$match"]
+        assert match["type"] == "expense"
+        assert match["date"] == {"$gte": datetime(2024, 4, 1), "$type": "date"}
+
+def test_chart_errors(client):
+    assert client.get('/api/charts/pie').status_code == 404
+    assert client.get('/api/charts/monthly?from=1900-01-01').status_code == 400
+    assert client.get('/api/charts/categories?top=0').status_code == 400
@@ -1,8 +1,11 @@
 import pytest
 from bson import ObjectId
 from unittest.mock import MagicMock, patch
-from app.models import Transaction
-from datetime import datetime
+from app.models import Transaction, TransactionRollup, BulkImportError
+from app.serializers import transaction_pipeline, format_date
+from app.columnar import columnar_pipeline
+from datetime import datetime, timedelta
+from pymongo.errors import BulkWriteError
 
 def test_create_transaction():
     mock_result = MagicMock()
@@ -77,26 +80,39 @@ def test_delete_transaction():
     user_id = "656f99ab8a5f3c2ef4c50b1b"
 
     with patch('app.models.mongo') as mock_mongo:
-        mock_mongo.db.transactions.delete_one.return_value.deleted_count = 1
+        mock_mongo.db.transactions.find_one_and_delete.return_value = {
+            "_id": transaction_id,
+            "user_id": user_id,
+            "amount": -25.0,
+            "category": "Food",
+            "type": "expense",
+            "date": datetime(2024, 4, 22)
+        }
         
         result = Transaction.delete(transaction_id, user_id)
         
-        assert result is True
-        mock_mongo.db.transactions.delete_one.assert_called_once_with({
-            "_id": transaction_id,
-            "user_id": user_id
-        })
+        assert result["_id"] == str(transaction_id)
+        mock_mongo.db.transactions.find_one_and_delete.assert_called_once_with(
+            {"_id": transaction_id, "user_id": user_id},
+            projection=TransactionRollup.SOURCE_FIELDS
+        )
+        mock_mongo.db.transaction_rollups.update_one.assert_called_once_with(
+            {"user_id": user_id, "year": 2024, "month": 4, "category": "Food", "type": "expense"},
+            {"$inc": {"total": 25.0, "count": -1}},
+            upsert=True
+        )
 
 def test_delete_transaction_not_found():
     transaction_id = ObjectId("656f99ab8a5f3c2ef4c50b1a")
     user_id = "656f99ab8a5f3c2ef4c50b1b"
 
     with patch('app.models.mongo') as mock_mongo:
-        mock_mongo.db.transactions.delete_one.return_value.deleted_count = 0
+        mock_mongo.db.transactions.find_one_and_delete.return_value = None
         
         result = Transaction.delete(transaction_id, user_id)
         
-        assert result is False
+        assert result is None
+        mock_mongo.db.transaction_rollups.update_one.assert_not_called()
 
 def test_get_all_transactions():
     mock_transactions = [
@@ -148,3 +164,295 @@ def test_aggregate_transactions():
         assert list(result) == mock_result
         mock_mongo.db.transactions.aggregate.assert_called_once_with(mock_pipeline)
 
+
+def test_cursor_round_trip():
+    transaction = {
+        "_id": ObjectId("656f99ab8a5f3c2ef4c50b1a"),
+        "date": datetime(2024, 4, 22, 10, 30)
+    }
+
+    cursor = Transaction.encode_cursor(transaction)
+
+    assert Transaction.decode_cursor(cursor) == (transaction["date"], transaction["_id"])
+
+def test_decode_invalid_cursor():
+    with pytest.raises(ValueError):
+        Transaction.decode_cursor("not-a-cursor")
+
+def test_cursor_from_serialized_row():
+    transaction = {"_id": "656f99ab8a5f3c2ef4c50b1a", "date": "2024-04-22T10:30:00.125"}
+
+    cursor = Transaction.encode_cursor(transaction)
+
+    assert Transaction.decode_cursor(cursor) == (
+        datetime(2024, 4, 22, 10, 30, 0, 125000),
+        ObjectId("656f99ab8a5f3c2ef4c50b1a")
+    )
+
+def test_get_serialized_by_user():
+    user_id = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.aggregate.return_value = iter([{"_id": "656f99ab8a5f3c2ef4c50b1b"}])
+
+        transactions = Transaction.get_serialized_by_user(user_id)
+
+        assert transactions == [{"_id": "656f99ab8a5f3c2ef4c50b1b"}]
+        pipeline = mock_mongo.db.transactions.aggregate.call_args[0][0]
+        assert pipeline == transaction_pipeline({"user_id": user_id})
+        assert pipeline[-1]["$project"]["_id"] == {"$toString": "$_id"}
+        assert "user_id" not in pipeline[-1]["$project"]
+
+def test_get_columns():
+    user_id = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+    rows = [
+        {"date": 19783, "amount": -12.5, "type": "expense", "category": "Food"},
+        {"date": 19781, "amount": 1200.0, "type": "income", "category": "Salary"},
+        {"date": None, "amount": -40.0, "type": "expense", "category": "Food"},
+    ]
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.aggregate.return_value = iter(rows)
+
+        columns = Transaction.get_columns(user_id, {"type": "expense"})
+
+        assert columns == {
+            "count": 3,
+            "columns": {
+                "date": [19783, 19781, None],
+                "amount": [-12.5, 1200.0, -40.0],
+                "type": [0, 1, 0],
+                "category": [0, 1, 0],
+            },
+            "dictionaries": {"type": ["expense", "income"], "category": ["Food", "Salary"]},
+        }
+        pipeline = mock_mongo.db.transactions.aggregate.call_args[0][0]
+        assert pipeline == columnar_pipeline({"user_id": user_id, "type": "expense"})
+        assert set(pipeline[-1]["$project"]) == {"_id", "date", "amount", "type", "category"}
+
+def test_get_page_with_next_cursor():
+    mock_transactions = [
+        {"_id": "656f99ab8a5f3c2ef4c50b1c", "date": "2024-04-03T00:00:00"},
+        {"_id": "656f99ab8a5f3c2ef4c50b1b", "date": "2024-04-02T00:00:00"},
+        {"_id": "656f99ab8a5f3c2ef4c50b1a", "date": "2024-04-01T00:00:00"}
+    ]
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.aggregate.return_value = iter(mock_transactions)
+
+        transactions, next_cursor = Transaction.get_page("656f99ab8a5f3c2ef4c50b1a", 2)
+
+        assert len(transactions) == 2
+        assert Transaction.decode_cursor(next_cursor) == (datetime(2024, 4, 2), ObjectId(mock_transactions[1]["_id"]))
+        mock_mongo.db.transactions.aggregate.assert_called_once_with(
+            transaction_pipeline({"user_id": "656f99ab8a5f3c2ef4c50b1a", "date": {"$type": "date"}}, 3)
+        )
+
+def test_get_page_after_cursor():
+    after = (datetime(2024, 4, 2), ObjectId("656f99ab8a5f3c2ef4c50b1b"))
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.aggregate.return_value = iter([])
+
+        transactions, next_cursor = Transaction.get_page("656f99ab8a5f3c2ef4c50b1a", 2, after)
+
+        assert transactions == []
+        assert next_cursor is None
+        pipeline = mock_mongo.db.transactions.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {
+            "user_id": "656f99ab8a5f3c2ef4c50b1a",
+            "date": {"$type": "date", "$lte": after[0]},
+            "$or": [{"date": {"$lt": after[0]}}, {"_id": {"$lt": after[1]}}]
+        }}
+
+def test_iter_by_user():
+    with patch('app.models.mongo') as mock_mongo:
+        Transaction.iter_by_user("656f99ab8a5f3c2ef4c50b1a", batch_size=250)
+
+        mock_mongo.db.transactions.aggregate.assert_called_once_with(
+            transaction_pipeline({"user_id": "656f99ab8a5f3c2ef4c50b1a"}),
+            batchSize=250
+        )
+
+def test_bulk_create_batches_and_rollups():
+    user_id = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+    documents = [
+        Transaction(amount=10, category="Food", description=f"Item {i}",
+                    date=datetime(2024, 4, 1), user_id=user_id, type="expense").to_dict()
+        for i in range(3)
+    ]
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.insert_many.side_effect = [
+            MagicMock(inserted_ids=[1, 2]),
+            MagicMock(inserted_ids=[3])
+        ]
+
+        inserted, errors = Transaction.bulk_create(documents, batch_size=2)
+
+        assert inserted == 3
+        assert errors == []
+        assert mock_mongo.db.transactions.insert_many.call_count == 2
+        assert mock_mongo.db.transactions.insert_many.call_args[1] == {"ordered": False}
+        assert mock_mongo.db.transaction_rollups.bulk_write.call_count == 2
+        update = mock_mongo.db.transaction_rollups.bulk_write.call_args_list[0][0][0][0]
+        assert update._doc == {"$inc": {"total": -20.0, "count": 2}}
+
+def test_bulk_create_reports_write_errors():
+    user_id = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+    documents = [
+        Transaction(amount=10, category="Food", description=f"Item {i}",
+                    date=datetime(2024, 4, 1), user_id=user_id, type="expense").to_dict()
+        for i in range(2)
+    ]
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.insert_many.side_effect = BulkWriteError({
+            "nInserted": 1,
+            "writeErrors": [{"index": 1, "errmsg": "duplicate key"}]
+        })
+
+        inserted, errors = Transaction.bulk_create(documents)
+
+        assert inserted == 1
+        assert errors == [(1, "duplicate key")]
+        update = mock_mongo.db.transaction_rollups.bulk_write.call_args[0][0][0]
+        assert update._doc == {"$inc": {"total": -10.0, "count": 1}}
+
+def test_build_query_filters():
+    query = Transaction.build_query("656f99ab8a5f3c2ef4c50b1a", {
+        "date_from": datetime(2024, 4, 1),
+        "date_to": datetime(2024, 5, 1),
+        "categories": ["Food"],
+        "type": "expense",
+        "min_amount": 10.0,
+        "max_amount": 50.0
+    })
+
+    assert query == {
+        "user_id": "656f99ab8a5f3c2ef4c50b1a",
+        "date": {"$gte": datetime(2024, 4, 1), "$lt": datetime(2024, 5, 1)},
+        "category": "Food",
+        "type": "expense",
+        "$and": [{"$or": [
+            {"amount": {"$gte": 10.0, "$lte": 50.0}},
+            {"amount": {"$lte": -10.0, "$gte": -50.0}}
+        ]}]
+    }
+
+def test_get_page_merges_cursor_with_date_filter():
+    after = (datetime(2024, 4, 2), ObjectId("656f99ab8a5f3c2ef4c50b1b"))
+
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.aggregate.return_value = iter([])
+
+        Transaction.get_page("656f99ab8a5f3c2ef4c50b1a", 2, after, {"date_from": datetime(2024, 1, 1)})
+
+        match = mock_mongo.db.transactions.aggregate.call_args[0][0][0]["$match"]
+        assert match["date"] == {"$gte": datetime(2024, 1, 1), "$type": "date", "$lte": after[0]}
+
+def test_get_page_skips_string_dates():
+    # A legacy string date would end up in a cursor that decode_cursor rejects
+    with patch('app.models.mongo') as mock_mongo:
+        mock_mongo.db.transactions.aggregate.return_value = iter([])
+
+        Transaction.get_page("656f99ab8a5f3c2ef4c50b1a", 2)
+
+        match = mock_mongo.db.transactions.aggregate.call_args[0][0][0]["$match"]
+        assert match["date"] == {"$type": "date"}
+
+def test_monthly_totals_uses_filtered_match():
+    with patch('app.models.mongo') as mock_mongo:
+        Transaction.monthly_totals("656f99ab8a5f3c2ef4c50b1a", {"type": "income", "date_from": datetime(2024, 1, 1)})
+
+        pipeline = mock_mongo.db.transactions.aggregate.call_args[0][0]
+        assert pipeline[0] == {"$match": {
+            "user_id": "656f99ab8a5f3c2ef4c50b1a",
+            "type": "income",
+            "date": {"$gte": datetime(2024, 1, 1), "$type": "date"}
+        }}
+        assert pipeline[1]["$group"]["count"] == {"$sum": 1}
+
+def test_bucket_filters_cap_open_ranges():
+    filters = Transaction.bucket_filters({"date_to": datetime(2024, 1, 1)}, "day")
+    assert filters["date_from"] == datetime(2024, 1, 1) - timedelta(days=Transaction.MAX_BUCKETS)
+
+    with pytest.raises(ValueError):
+        Transaction.bucket_filters({"date_from": datetime(2000, 1, 1), "date_to": datetime(2024, 1, 1)}, "week")
+    # Months reach back far enough for a lifetime of transactions
+    assert Transaction.bucket_filters({"date_from": datetime(2000, 1, 1), "date_to": datetime(2024, 1, 1)}, "month")
+
+def test_balance_pipeline_reads_history_before_range():
+    pipeline = Transaction.balance_pipeline(
+        "656f99ab8a5f3c2ef4c50b1a", {"date_from": datetime(2024, 1, 10), "date_to": datetime(2024, 2, 1)}, "week"
+    )
+    # The history before `from` is read too, and summed into one opening group
+    assert pipeline[0] == {"$match": {
+        "user_id": "656f99ab8a5f3c2ef4c50b1a",
+        "date": {"$lt": datetime(2024, 2, 1), "$type": "date"}
+    }}
+    period = {"$dateTrunc": {"date": "$date", "unit": "week", "timezone": "UTC", "startOfWeek": "monday"}}
+    start = {"$dateTrunc": {"date": datetime(2024, 1, 10), "unit": "week", "timezone": "UTC", "startOfWeek": "monday"}}
+    assert pipeline[1]["$group"]["_id"] == {"$cond": [{"$lt": [period, start]}, None, period]}
+    assert pipeline[2]["$setWindowFields"]["output"]["balance"]["window"] == {"documents": ["unbounded", "current"]}
+
+def test_balance_rows_split_opening_balance():
+    rows = [
+        {"_id": None, "income": 500.0, "expense": -100.0, "net": 400.0, "count": 7, "balance": 400.0},
+        {"_id": "2024-01-08", "income": 0, "expense": -50.0, "net": -50.0, "count": 1, "balance": 350.0},
+    ]
+    with patch('app.models.Transaction.aggregate', return_value=iter(rows)):
+        result = Transaction.balance("656f99ab8a5f3c2ef4c50b1a", {"date_to": datetime(2024, 2, 1)}, "week")
+
+    assert result == {"bucket": "week", "opening": 400.0, "points": [
+        {"period": "2024-01-08", "income": 0, "expense": -50.0, "net": -50.0, "count": 1, "balance": 350.0}
+    ]}
+    assert Transaction.balance_rows([], "day") == {"bucket": "day", "opening": 0, "points": []}
+
+def test_format_date_matches_isoformat():
+    # Serialized dates keep the isoformat() shape the API has always returned
+    assert format_date(datetime(2024, 4, 1)) == "2024-04-01T00:00:00"
+    assert format_date(datetime(2024, 4, 1, 10, 30, 0, 125000)) == "2024-04-01T10:30:00.125000"
+
+def test_bulk_create_reports_rows_inserted_before_failure():
+    documents = [{"user_id": "u1", "amount": -1.0, "category": "Food", "type": "expense", "date": datetime(2024, 1, 1)}] * 3
+
+    with patch('app.models.mongo') as mock_mongo, \
+         patch('app.models.TransactionRollup.reconcile') as mock_reconcile:
+        mock_mongo.db.transactions.insert_many.side_effect = [MagicMock(inserted_ids=[1, 2]), Exception("Database error")]
+
+        with pytest.raises(BulkImportError) as exc_info:
+            Transaction.bulk_create(documents, batch_size=2)
+        assert exc_info.value.inserted == 2
+        mock_reconcile.assert_called_once()
+
+def test_dashboard_load_runs_page_and_charts():
+    from app.models import Dashboard
+    user_id = ObjectId("656f99ab8a5f3c2ef4c50b1a")
+    page = [{"_id": "656f99ab8a5f3c2ef4c50b1b", "date": "2024-04-01T00:00:00"}]
+
+    def chart(name, *args):
+        return {"chart": name}
+
+    with patch('app.models.TransactionChange.current_version', return_value=7), \
+         patch('app.models.Transaction.get_page', return_value=(page, None)) as mock_page, \
+         patch('app.models.TransactionRollup.chart', side_effect=chart) as mock_chart:
+        result = Dashboard.load(user_id, 50, None, 4)
+
+        assert result == {
+            "transactions": page,
+            "next_cursor": None,
+            "charts": {"monthly": {"chart": "monthly"}, "categories": {"chart": "categories"}},
+            "version": 7
+        }
+        mock_page.assert_called_once_with(user_id, 50, None, None)
+        mock_chart.assert_any_call("categories", user_id, None, 4)
+
+def test_dashboard_load_raises_chart_error():
+    from app.models import Dashboard
+
+    with patch('app.models.TransactionChange.current_version', return_value=0), \
+         patch('app.models.Transaction.get_page', return_value=([], None)), \
+         patch('app.models.TransactionRollup.chart', side_effect=Exception("Database error")):
+        with pytest.raises(Exception, match="Database error"):
+            Dashboard.load(ObjectId(), 50)
@@ -14,7 +14,6 @@ def test_create_user():
     }
 
     with patch('app.models.mongo') as mock_mongo:
-        mock_mongo.db.users.find_one.side_effect = [None, mock_user]  # First None for get_by_email, then mock_user for find_one after insert
         mock_mongo.db.users.insert_one.return_value = mock_result
 
         result = User.create(
@@ -24,8 +23,12 @@ def test_create_user():
         )
 
         assert isinstance(result, dict)
-        assert result == mock_user
+        assert result["_id"] == mock_user["_id"]
+        assert result["username"] == mock_user["username"]
+        assert result["email"] == mock_user["email"]
+        # One write, no lookups before or after it
         mock_mongo.db.users.insert_one.assert_called_once()
+        mock_mongo.db.users.find_one.assert_not_called()
 
 def test_save_user():
     user = User(
@@ -48,7 +51,7 @@ def test_save_user():
 
         result = user.save()
 
-        assert result == mock_user
+        assert {key: result[key] for key in mock_user} == mock_user
         mock_mongo.db.users.insert_one.assert_called_once()
         inserted_data = mock_mongo.db.users.insert_one.call_args[0][0]
         assert inserted_data["username"] == "testuser"
@@ -0,0 +1,47 @@
+import importlib
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+from app import create_app
+
+def test_production_app_has_debug_off():
+    with patch('app.mongo.init_app'), \
+         patch('app.mongo.db'):
+        sys.modules.pop('app.wsgi', None)
+        from app.wsgi import app
+    assert app.config['DEBUG'] is False
+    assert app.config['TEMPLATES_AUTO_RELOAD'] is False
+
+def test_post_fork_creates_new_mongo_client():
+    import app.gunicorn_conf as gunicorn_conf
+    wsgi = MagicMock()
+    with patch.dict(sys.modules, {'app.wsgi': wsgi}), \
+         patch.object(gunicorn_conf, 'preload_app', True), \
+         patch('app.init_mongo') as mock_init_mongo:
+        gunicorn_conf.post_fork(MagicMock(), MagicMock(pid=1234))
+    mock_init_mongo.assert_called_once_with(wsgi.app)
+
+def test_several_workers_default_to_no_cache():
+    import app.gunicorn_conf as gunicorn_conf
+    try:
+        with patch.dict(os.environ, {'WEB_WORKERS': '3'}):
+            os.environ.pop('CACHE_BACKEND', None)
+            assert importlib.reload(gunicorn_conf).raw_env == ["CACHE_BACKEND=none"]
+        with patch.dict(os.environ, {'WEB_WORKERS': '3', 'CACHE_BACKEND': 'redis'}):
+            assert importlib.reload(gunicorn_conf).raw_env == []
+        with patch.dict(os.environ, {'WEB_WORKERS': '1'}):
+            os.environ.pop('CACHE_BACKEND', None)
+            assert importlib.reload(gunicorn_conf).raw_env == []
+    finally:
+        importlib.reload(gunicorn_conf)
+
+def test_init_mongo_resets_pool_metrics():
+    app = create_app()
+    metrics = app.extensions['mongo_pool_metrics']
+    metrics.checkouts = 5
+    with patch('app.mongo.init_app') as mock_init:
+        from app import init_mongo
+        init_mongo(app)
+    assert metrics.checkouts == 0
+    assert mock_init.call_args[1] == app.config['MONGO_CLIENT_OPTIONS']